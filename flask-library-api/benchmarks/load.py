@@ -0,0 +1,260 @@
+"""
+Load benchmark of the API on a synthetic dataset: authors and books with
+seeded random names, page counts and descriptions are generated into SQLite
+(the file is reused by later runs with the same sizes and seed), then
+concurrent workers request every endpoint through the Flask test client or
+a local WSGI server (--server). Latency percentiles and throughput of every
+endpoint are printed as JSON, --baseline compares them with a previous report.
+
+Run from the flask-library-api directory:
+python -m benchmarks.load --authors 100000 --books 1000000 --output report.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from threading import Thread
+from typing import Callable, List, Tuple
+from urllib.error import HTTPError
+from urllib.request import urlopen
+from werkzeug.serving import make_server
+
+from config import TestingConfig, config
+from library_app import create_app, db
+from library_app.models import Author, Book
+
+
+SEED = 2020
+CHUNK_SIZE = 10000
+PER_PAGE = 20
+MAX_PAGE = 50
+SYLLABLES = ['ka', 'lo', 'mi', 'ren', 'tor', 'vel', 'sa', 'dun', 'bri', 'os', 'ne', 'gal', 'tha', 'wyn', 'por',
+             'zu', 'fen', 'ria', 'mor', 'del']
+WORDS = [first + second for first in SYLLABLES for second in SYLLABLES]
+FIRST_NAMES = ['Anna', 'Jan', 'Maria', 'Piotr', 'Ewa', 'George', 'Jane', 'Mark', 'Olga', 'Leo', 'Agatha', 'Isaac']
+LAST_NAMES = ['Nowak', 'Kowalski', 'Orwell', 'Austen', 'Twain', 'Tolstoy', 'Christie', 'Asimov', 'Lem', 'Tokarczuk']
+ENDPOINTS = {
+    'books': '/api/v1/books?limit={limit}&page={page}',
+    'books_filtered': '/api/v1/books?number_of_pages[gte]={pages}&sort=-number_of_pages&limit={limit}',
+    'book': '/api/v1/books/{book_id}',
+    'books_search': '/api/v1/books/search?q={word}&limit={limit}',
+    'authors': '/api/v1/authors?limit={limit}&page={page}',
+    'author': '/api/v1/authors/{author_id}',
+    'author_books': '/api/v1/authors/{author_id}/books?limit={limit}',
+    'authors_stats': '/api/v1/authors/stats?limit={limit}&page={page}',
+}
+
+
+def percentile(values: list, percent: int) -> float:
+    """Inclusive method interpolates between measured values, so p99 never exceeds max"""
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1] if len(values) > 1 else values[0]
+
+
+def generate_authors(rng: random.Random, start: int, stop: int) -> List[dict]:
+    return [{
+        'id': number,
+        'first_name': rng.choice(FIRST_NAMES),
+        'last_name': rng.choice(LAST_NAMES),
+        'birth_date': date(1900, 1, 1) + timedelta(days=rng.randrange(36500))
+    } for number in range(start, stop)]
+
+
+def generate_books(rng: random.Random, start: int, stop: int, authors: int) -> List[dict]:
+    return [{
+        'id': number,
+        'title': ' '.join(rng.sample(WORDS, 3)).capitalize(),
+        'isbn': 9780000000000 + number,
+        'number_of_pages': rng.randint(50, 1500),
+        'description': ' '.join(rng.choices(WORDS, k=20)),
+        'author_id': rng.randint(1, authors)
+    } for number in range(start, stop)]
+
+
+def generate_dataset(authors: int, books: int, seed: int):
+    """Inserts the dataset in one transaction with core executemany (the FTS triggers index books on the way)"""
+    rng = random.Random(seed)
+    with db.engine.begin() as connection:
+        for start in range(1, authors + 1, CHUNK_SIZE):
+            connection.execute(Author.__table__.insert(),
+                               generate_authors(rng, start, min(start + CHUNK_SIZE, authors + 1)))
+        for start in range(1, books + 1, CHUNK_SIZE):
+            connection.execute(Book.__table__.insert(),
+                               generate_books(rng, start, min(start + CHUNK_SIZE, books + 1), authors))
+
+
+def create_benchmark_app(database: Path, response_cache: bool):
+    class BenchmarkConfig(TestingConfig):
+        SECRET_KEY = TestingConfig.SECRET_KEY or 'benchmark'
+        DB_FILE_PATH = database
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{database}'
+        RESPONSE_CACHE_ENABLED = response_cache
+        DEBUG = False
+        TESTING = False
+
+    config['benchmark'] = BenchmarkConfig
+    return create_app('benchmark')
+
+
+def prepare_database(app, dataset: dict, regenerate: bool):
+    database = app.config['DB_FILE_PATH']
+    if database.exists() and not regenerate:
+        print(f'Using dataset {database}', file=sys.stderr)
+        return
+    if database.exists():
+        database.unlink()
+    started_at = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        generate_dataset(dataset['authors'], dataset['books'], dataset['seed'])
+    print(f'Generated dataset {database} in {time.perf_counter() - started_at:.1f} s', file=sys.stderr)
+
+
+def get_urls(template: str, dataset: dict, rng: random.Random, number: int) -> List[str]:
+    return [template.format(
+        limit=PER_PAGE,
+        page=rng.randint(1, max(1, min(MAX_PAGE, min(dataset['authors'], dataset['books']) // PER_PAGE))),
+        pages=rng.randint(50, 1500),
+        book_id=rng.randint(1, dataset['books']),
+        author_id=rng.randint(1, dataset['authors']),
+        word=rng.choice(WORDS)
+    ) for _ in range(number)]
+
+
+def get_sender(app, server_url: str = None) -> Callable[[], Callable[[str], int]]:
+    """Factory of per worker functions sending GET request and returning status code"""
+    def test_client_sender():
+        client = app.test_client()
+        return lambda url: client.get(url).status_code
+
+    def http_sender():
+        def send(url: str) -> int:
+            try:
+                with urlopen(server_url + url) as response:
+                    response.read()
+                    return response.status
+            except HTTPError as error:
+                return error.code
+        return send
+
+    return http_sender if server_url else test_client_sender
+
+
+def run_endpoint(new_sender: Callable, urls: List[str], workers: int) -> dict:
+    def work(worker_urls: List[str]) -> Tuple[List[float], int]:
+        send = new_sender()
+        latencies, errors = [], 0
+        for url in worker_urls:
+            started_at = time.perf_counter()
+            status = send(url)
+            latencies.append(time.perf_counter() - started_at)
+            errors += status >= 400
+        return latencies, errors
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        started_at = time.perf_counter()
+        results = list(executor.map(work, [urls[number::workers] for number in range(workers)]))
+        elapsed = time.perf_counter() - started_at
+    latencies = [latency * 1000 for worker_latencies, _ in results for latency in worker_latencies]
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'mean': round(statistics.mean(latencies), 2),
+        'p50': round(percentile(latencies, 50), 2),
+        'p95': round(percentile(latencies, 95), 2),
+        'p99': round(percentile(latencies, 99), 2),
+        'max': round(max(latencies), 2)
+    }
+
+
+def compare(report: dict, baseline: dict):
+    """Prints change of p95 latency and throughput of every endpoint against the baseline report"""
+    for name, result in report['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if previous is None:
+            continue
+        print(f'{name:>16}: p95 {previous["p95"]:8.2f} -> {result["p95"]:8.2f} ms '
+              f'({(result["p95"] / previous["p95"] - 1) * 100:+6.1f}%), '
+              f'throughput {previous["throughput"]:8.1f} -> {result["throughput"]:8.1f} req/s '
+              f'({(result["throughput"] / previous["throughput"] - 1) * 100:+6.1f}%)', file=sys.stderr)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--authors', type=int, default=100000)
+    parser.add_argument('--books', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--database', type=Path, help='SQLite file of the dataset, by default in temp directory')
+    parser.add_argument('--regenerate', action='store_true', help='generate the dataset even if the file exists')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500, help='measured requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=20, help='requests per endpoint sent before measuring')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='comma separated endpoint names')
+    parser.add_argument('--no-response-cache', action='store_true', help='serve every request except author statistics from the database')
+    parser.add_argument('--server', action='store_true', help='send requests over HTTP to a local WSGI server')
+    parser.add_argument('--output', type=Path, help='file for the JSON report, stdout by default')
+    parser.add_argument('--baseline', type=Path, help='JSON report of a previous run to compare with')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    dataset = {'authors': args.authors, 'books': args.books, 'seed': args.seed}
+    database = args.database or \
+        Path(tempfile.gettempdir()) / f'library-benchmark-{args.authors}-{args.books}-{args.seed}.db'
+    app = create_benchmark_app(database.resolve(), not args.no_response_cache)
+    prepare_database(app, dataset, args.regenerate)
+
+    server = None
+    if args.server:
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        Thread(target=server.serve_forever, daemon=True).start()
+    new_sender = get_sender(app, f'http://127.0.0.1:{server.server_port}' if server else None)
+
+    rng = random.Random(args.seed)
+    endpoints = {}
+    for name in args.endpoints.split(','):
+        urls = get_urls(ENDPOINTS[name], dataset, rng, args.warmup + args.requests)
+        if args.warmup:
+            run_endpoint(new_sender, urls[:args.warmup], args.workers)
+        endpoints[name] = run_endpoint(new_sender, urls[args.warmup:], args.workers)
+        print(f'{name:>16}: {endpoints[name]["throughput"]:8.1f} req/s, p50 {endpoints[name]["p50"]:8.2f} ms, '
+              f'p95 {endpoints[name]["p95"]:8.2f} ms, p99 {endpoints[name]["p99"]:8.2f} ms', file=sys.stderr)
+    if server is not None:
+        server.shutdown()
+
+    report = {
+        'app': 'flask-library-api',
+        'dataset': dataset,
+        'mode': 'server' if args.server else 'test_client',
+        'workers': args.workers,
+        'response_cache': not args.no_response_cache,
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'cpus': os.cpu_count()
+        },
+        'endpoints': endpoints
+    }
+    if args.baseline:
+        compare(report, json.loads(args.baseline.read_text()))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
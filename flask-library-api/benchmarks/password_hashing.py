@@ -0,0 +1,97 @@
+"""
+Login storm benchmark: concurrent clients log in as fast as they can while
+a probe client keeps requesting a cheap endpoint (GET /api/v1/books).
+Password hashing in the request thread is compared to the process pool
+(PASSWORD_HASH_WORKERS) for pbkdf2 and scrypt, reporting login throughput
+and p95 latency of logins and of the probe requests.
+
+Run from the flask-library-api directory: python -m benchmarks.password_hashing
+"""
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+
+from library_app import create_app, db, password_hasher
+from library_app.models import User
+
+
+CLIENTS = 16
+LOGINS_PER_CLIENT = 8
+USERS = 4
+WORKERS = os.cpu_count() or 2
+SCENARIOS = [
+    ('pbkdf2:sha256', 150000, 0),
+    ('pbkdf2:sha256', 150000, WORKERS),
+    ('scrypt', 16384, 0),
+    ('scrypt', 16384, WORKERS),
+]
+
+
+def percentile(values: list, percent: int) -> float:
+    return statistics.quantiles(values, n=100)[percent - 1] if len(values) > 1 else values[0]
+
+
+def login_storm(app, client_number: int) -> list:
+    client = app.test_client()
+    username = f'user{client_number % USERS}'
+    latencies = []
+    for _ in range(LOGINS_PER_CLIENT):
+        started_at = time.perf_counter()
+        response = client.post('/api/v1/auth/login', json={'username': username, 'password': 'password'})
+        latencies.append(time.perf_counter() - started_at)
+        assert response.status_code == 200
+    return latencies
+
+
+def probe(app, stop: Event) -> list:
+    client = app.test_client()
+    latencies = []
+    while not stop.is_set():
+        started_at = time.perf_counter()
+        client.get('/api/v1/books')
+        latencies.append(time.perf_counter() - started_at)
+    return latencies
+
+
+def run_scenario(algorithm: str, work_factor: int, workers: int):
+    app = create_app('testing')
+    app.config.update(PASSWORD_HASH_ALGORITHM=algorithm, PASSWORD_HASH_WORK_FACTOR=work_factor,
+                      PASSWORD_HASH_WORKERS=workers)
+    with app.app_context():
+        db.create_all()
+        for number in range(USERS):
+            db.session.add(User(username=f'user{number}', email=f'user{number}@example.com',
+                                password=User.generate_hashed_password('password')))
+        db.session.commit()
+
+    stop = Event()
+    with ThreadPoolExecutor(max_workers=CLIENTS + 1) as executor:
+        probe_future = executor.submit(probe, app, stop)
+        started_at = time.perf_counter()
+        login_latencies = [latency for latencies in executor.map(lambda number: login_storm(app, number), range(CLIENTS))
+                           for latency in latencies]
+        elapsed = time.perf_counter() - started_at
+        stop.set()
+        probe_latencies = probe_future.result()
+
+    with app.app_context():
+        password_hasher.shutdown()
+        db.drop_all()
+    app.config['DB_FILE_PATH'].unlink()
+
+    mode = f'{workers} processes' if workers else 'request thread'
+    print(f'{algorithm:>14} {work_factor:>7} {mode:>15}: {len(login_latencies) / elapsed:7.1f} logins/s, '
+          f'login p95 {percentile(login_latencies, 95) * 1000:7.1f} ms, '
+          f'probe p95 {percentile(probe_latencies, 95) * 1000:7.1f} ms ({len(probe_latencies)} probes)')
+
+
+def main():
+    print(f'{CLIENTS} clients x {LOGINS_PER_CLIENT} logins, {os.cpu_count()} CPUs')
+    for algorithm, work_factor, workers in SCENARIOS:
+        run_scenario(algorithm, work_factor, workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Micro-benchmark of per-request overhead of apply_filter and apply_order:
+before - the previous implementation (expressions built per request),
+cold - plan compiled on every request (plan cache cleared before each call),
+warm - plan taken from the compiled query plan cache.
+
+Run from the flask-library-api directory: python -m benchmarks.query_plan
+"""
+import timeit
+from flask import request
+
+from library_app import create_app
+from library_app.models import Book, Author
+from library_app.utils import apply_filter, apply_order, _compile_filter_plan, _compile_sort_plan, \
+    COMPARISON_OPERATORS_RE
+
+
+QUERY_STRINGS = [
+    (Book, 'title=Animal Farm'),
+    (Book, 'id[gte]=2&id[lte]=20&number_of_pages[gt]=100&sort=-id,title'),
+    (Author, 'birth_date[lt]=01-01-1950&sort=last_name,-birth_date'),
+]
+NUMBER = 5000
+
+
+def before_apply_order(model, query):
+    sort_keys = request.args.get('sort')
+    if sort_keys:
+        for key in sort_keys.split(','):
+            desc = False
+            if key.startswith('-'):
+                key = key[1:]
+                desc = True
+            column_attr = getattr(model, key, None)
+            if column_attr is not None:
+                query = query.order_by(column_attr.desc()) if desc else query.order_by(column_attr)
+    return query
+
+
+def before_get_filter_argument(column_name, value, operator):
+    operator_mapping = {
+        '==': column_name == value,
+        'gte': column_name >= value,
+        'gt': column_name > value,
+        'lte': column_name <= value,
+        'lt': column_name < value
+    }
+    return operator_mapping[operator]
+
+
+def before_apply_filter(model, query):
+    for param, value in request.args.items():
+        if param not in {'fields', 'sort', 'page', 'limit'}:
+            operator = '=='
+            match = COMPARISON_OPERATORS_RE.match(param)
+            if match is not None:
+                param, operator = match.groups()
+            column_attr = getattr(model, param, None)
+            if column_attr is not None:
+                value = model.additional_validation(param, value)
+                if value is None:
+                    continue
+                filter_argument = before_get_filter_argument(column_attr, value, operator)
+                query = query.filter(filter_argument)
+    return query
+
+
+def before_build_query(model):
+    query = before_apply_order(model, model.query)
+    return before_apply_filter(model, query)
+
+
+def build_query(model):
+    query = apply_order(model, model.query)
+    return apply_filter(model, query)
+
+
+def cold_build_query(model):
+    _compile_filter_plan.cache_clear()
+    _compile_sort_plan.cache_clear()
+    return build_query(model)
+
+
+def main():
+    app = create_app('testing')
+    for model, query_string in QUERY_STRINGS:
+        with app.test_request_context(f'/api/v1/?{query_string}'):
+            before = timeit.timeit(lambda: before_build_query(model), number=NUMBER)
+            cold = timeit.timeit(lambda: cold_build_query(model), number=NUMBER)
+            build_query(model)
+            warm = timeit.timeit(lambda: build_query(model), number=NUMBER)
+        print(f'{model.__name__:<8} {query_string:<64} '
+              f'before: {before / NUMBER * 1e6:7.1f} us  cold: {cold / NUMBER * 1e6:7.1f} us  '
+              f'warm: {warm / NUMBER * 1e6:7.1f} us  speedup: {before / warm:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark of list endpoint serialization: marshmallow Schema.dump with
+Flask jsonify compared to the compiled serializer with the fast JSON
+provider (orjson when installed, json otherwise).
+
+Run from the flask-library-api directory: python -m benchmarks.serialization
+"""
+import timeit
+from datetime import date
+from flask import jsonify
+
+from library_app import create_app
+from library_app.models import Author, Book, BookSchema, AuthorSchema
+from library_app.serialization import fast_dump, json_response
+
+
+LIMITS = [5, 100, 1000]
+NUMBER = 20
+
+
+def generate_authors(limit: int) -> list:
+    return [Author(id=number, first_name=f'first_name{number}', last_name=f'last_name{number}',
+                   birth_date=date(1950, 1, 1)) for number in range(1, limit + 1)]
+
+
+def generate_books(limit: int, authors: list = None) -> list:
+    authors = authors or generate_authors(10)
+    return [Book(id=number, title=f'title{number}', isbn=9780000000000 + number, number_of_pages=100 + number,
+                 description='description ' * 20, author=authors[number % len(authors)])
+            for number in range(1, limit + 1)]
+
+
+def generate_authors_with_books(limit: int) -> list:
+    authors = generate_authors(limit)
+    generate_books(limit * 3, authors)
+    return authors
+
+
+def marshmallow_response(schema, items):
+    data = schema.dump(items)
+    return jsonify({'success': True, 'data': data, 'number_of_records': len(data), 'pagination': {}})
+
+
+def compiled_response(schema, items):
+    data = fast_dump(schema, items)
+    return json_response({'success': True, 'data': data, 'number_of_records': len(data), 'pagination': {}})
+
+
+def main():
+    app = create_app('testing')
+    app.debug = False  # jsonify pretty prints responses in debug mode
+    with app.test_request_context():
+        for schema_name, schema, items_factory in [
+            ('BookSchema', BookSchema(many=True), generate_books),
+            ('AuthorSchema', AuthorSchema(many=True), generate_authors_with_books),
+        ]:
+            for limit in LIMITS:
+                items = items_factory(limit)
+                assert marshmallow_response(schema, items).get_json() == compiled_response(schema, items).get_json()
+                before = timeit.timeit(lambda: marshmallow_response(schema, items), number=NUMBER)
+                after = timeit.timeit(lambda: compiled_response(schema, items), number=NUMBER)
+                print(f'{schema_name:<13} {len(items):>5} rows  marshmallow + jsonify: {before / NUMBER * 1e3:8.2f} ms  '
+                      f'compiled + {app.config.get("JSON_PROVIDER") or "auto"}: {after / NUMBER * 1e3:8.2f} ms  '
+                      f'speedup: {before / after:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -13,8 +13,40 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY')
     SQLALCHEMY_DATABASE_URI = ''  
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),  #liczba stałych połączeń z bazą danych w puli
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),  #liczba dodatkowych połączeń ponad pool_size
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 3600)),  #po ilu sekundach połączenie jest odnawiane
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',  #sprawdzanie połączenia przed użyciem
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30))  #czas oczekiwania na wolne połączenie (sekundy)
+    }
     PER_PAGE = 5  #domyślna paginacja
     JWT_EXPIRED_MINUTES = 30  #token JWT wygaśnie po 30 minutach
+    PASSWORD_HASH_ALGORITHM = os.environ.get('PASSWORD_HASH_ALGORITHM', 'pbkdf2:sha256')  #pbkdf2:<skrót> lub scrypt
+    PASSWORD_HASH_WORK_FACTOR = int(os.environ.get('PASSWORD_HASH_WORK_FACTOR', 150000))  #iteracje pbkdf2 / koszt n scrypt
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))  #procesy do haszowania haseł, 0 - w wątku żądania
+    PASSWORD_HASH_QUEUE_SIZE = 64  #maksymalna liczba haseł czekających na wolny proces
+    REFRESH_TOKEN_EXPIRED_DAYS = 30  #token odświeżający wygaśnie po 30 dniach
+    TOKEN_DENYLIST_DATABASE = os.environ.get('TOKEN_DENYLIST_DATABASE')  #plik SQLite z unieważnionymi tokenami, domyślnie w pamięci
+    TOKEN_CACHE_SIZE = 1024  #liczba zapamiętanych zweryfikowanych tokenów JWT
+    BULK_MAX_ITEMS = 10000  #maksymalna liczba książek w jednym żądaniu bulk
+    BULK_CHUNK_SIZE = 500  #liczba wartości w jednym zapytaniu IN
+    LOAD_CHUNK_SIZE = 1000  #liczba wierszy wstawianych w jednej transakcji przez db-manage load
+    PURGE_BATCH_SIZE = 10000  #liczba wierszy usuwanych w jednej transakcji przez db-manage remove-data
+    EXPORT_CHUNK_SIZE = 1000  #liczba wierszy pobieranych naraz podczas eksportu
+    COUNT_CACHE_TTL = 60  #czas ważności zapamiętanej liczby rekordów (sekundy)
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '0') == '1'  #cache odpowiedzi publicznych endpointów GET, statystyki autorów są cache'owane zawsze
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'sqlite')  #sqlite (wspólny dla workerów) lub memory (tylko jeden proces)
+    RESPONSE_CACHE_DATABASE = os.environ.get('RESPONSE_CACHE_DATABASE', str(base_dir / 'response_cache.db'))  #plik SQLite backendu sqlite
+    RESPONSE_CACHE_SIZE = 1024  #maksymalna liczba zapamiętanych odpowiedzi
+    RESPONSE_CACHE_TTL = 60  #czas ważności zapamiętanej odpowiedzi (sekundy)
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER')  #orjson/json, domyślnie orjson jeżeli jest zainstalowany
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get('DB_REPLICA_URIS', '').split(',') if uri]  #adresy replik do odczytu (GET) oddzielone przecinkami
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))  #po zapisie klient czyta z bazy głównej
+    REPLICA_STICKY_DATABASE = os.environ.get('REPLICA_STICKY_DATABASE', str(base_dir / 'replica_sticky.db'))  #plik SQLite z czasami zapisów użytkowników, wspólny dla workerów
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  #token do /metrics, bez niego wymagany token użytkownika
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'  #profil żądań (czas, zapytania SQL, serializacja)
+    PROFILING_WINDOW = 1000  #liczba ostatnich profili zapamiętanych dla każdego endpointu
 
 
 class DevelopmentConfig(Config):
@@ -24,6 +56,10 @@ class DevelopmentConfig(Config):
 class TestingConfig(Config):
     DB_FILE_PATH = base_dir / 'tests' / 'test.db'
     SQLALCHEMY_DATABASE_URI = f'sqlite:///{DB_FILE_PATH}'
+    PASSWORD_HASH_WORK_FACTOR = 1000  #szybsze testy
+    RESPONSE_CACHE_ENABLED = True
+    RESPONSE_CACHE_BACKEND = 'memory'  #klient testowy działa w jednym procesie
+    REPLICA_STICKY_DATABASE = None
     DEBUG = True
     TESTING = True
         
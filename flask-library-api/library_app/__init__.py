@@ -1,11 +1,22 @@
 from flask import Flask
 from config import config
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from library_app.cache import CountCache, ResponseCache, TokenCache, TokenDenylist
+from library_app.hashing import PasswordHasher
+from library_app.pool import PoolMetrics
+from library_app.profiling import RequestProfiler
+from library_app.replicas import RoutingSQLAlchemy
 
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 migrate = Migrate()
+count_cache = CountCache()
+response_cache = ResponseCache()
+token_cache = TokenCache()
+token_denylist = TokenDenylist()
+pool_metrics = PoolMetrics()
+profiler = RequestProfiler()
+password_hasher = PasswordHasher()
 
 
 def create_app(config_name='development'):
@@ -14,17 +25,26 @@ def create_app(config_name='development'):
     
     db.init_app(app)
     migrate.init_app(app, db)
+    count_cache.init_app(app)
+    response_cache.init_app(app)
+    token_cache.init_app(app)
+    token_denylist.init_app(app)
+    pool_metrics.init_app(app)
+    profiler.init_app(app)
+    password_hasher.init_app(app)
 
     from library_app.commands import db_manage_bp
     from library_app.errors import errors_bp
     from library_app.authors import authors_bp
     from library_app.books import books_bp
     from library_app.auth import auth_bp
+    from library_app.metrics import metrics_bp
     app.register_blueprint(db_manage_bp)
     app.register_blueprint(errors_bp)
     app.register_blueprint(authors_bp, url_prefix='/api/v1')
     app.register_blueprint(books_bp, url_prefix='/api/v1')
     app.register_blueprint(auth_bp, url_prefix='/api/v1/auth')
+    app.register_blueprint(metrics_bp, url_prefix='/api/v1')
 
     return app
 
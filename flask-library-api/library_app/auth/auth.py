@@ -1,32 +1,31 @@
 from flask import abort, jsonify
 from webargs.flaskparser import use_args
 
-from library_app import db
+from library_app import db, token_denylist
 from library_app.auth import auth_bp
-from library_app.models import User, user_schema, UserSchema, user_password_update_schema
-from library_app.utils import validate_json_content_type, token_required
+from library_app.models import User, user_schema, UserSchema, user_password_update_schema, refresh_token_schema
+from library_app.utils import validate_json_content_type, token_required, decode_refresh_token, commit_or_conflict
 
 
 @auth_bp.route('/register', methods=['POST'])
 @validate_json_content_type
 @use_args(user_schema, error_status_code=400)
 def register(args: dict):   
-    if User.query.filter(User.username == args['username']).first():
-        abort(409, description=f'User with username {args["username"]} already exists')
-
-    if User.query.filter(User.email == args['email']).first():
-        abort(409, description=f'User with email {args["email"]} already exists')
     args['password'] = User.generate_hashed_password(args['password'])
 
     user = User(**args)
     db.session.add(user)
-    db.session.commit()
+    commit_or_conflict({
+        'username': f'User with username {args["username"]} already exists',
+        'email': f'User with email {args["email"]} already exists'
+    })
 
     token = user.generate_jwt()
 
     return jsonify({
         'success': True,
-        'token': token.decode()
+        'token': token.decode(),
+        'refresh_token': user.generate_refresh_token().decode()
     }), 201
 
 
@@ -41,12 +40,46 @@ def login(args: dict):
     
     if not user.is_password_valid(args['password']):
         abort(401, description='Invalid credentials')
+
+    if db.session.is_modified(user):
+        db.session.commit()
     
     token = user.generate_jwt()
     
     return jsonify({
         'success': True,
-        'token': token.decode()
+        'token': token.decode(),
+        'refresh_token': user.generate_refresh_token().decode()
+    })
+
+
+@auth_bp.route('/token/refresh', methods=['POST'])
+@validate_json_content_type
+@use_args(refresh_token_schema, error_status_code=400)
+def refresh_token(args: dict):
+    payload = decode_refresh_token(args['refresh_token'])
+    user = User.query.get(payload['user_id'])
+    if user is None or payload.get('generation', 0) != user.token_generation \
+            or not token_denylist.add(payload['jti'], payload['exp']):
+        abort(401, description='Revoked refresh token. Please login to get new token.')
+
+    return jsonify({
+        'success': True,
+        'token': user.generate_jwt().decode(),
+        'refresh_token': user.generate_refresh_token().decode()
+    })
+
+
+@auth_bp.route('/token/revoke', methods=['POST'])
+@validate_json_content_type
+@use_args(refresh_token_schema, error_status_code=400)
+def revoke_token(args: dict):
+    payload = decode_refresh_token(args['refresh_token'])
+    token_denylist.add(payload['jti'], payload['exp'])
+
+    return jsonify({
+        'success': True,
+        'data': 'Refresh token has been revoked'
     })
 
 
@@ -71,7 +104,7 @@ def update_user_password(user_id: int, args: dict):
     if not user.is_password_valid(args['current_password']):
         abort(401, description='Invalid password')
 
-    user.password = user.generate_hashed_password(args['new_password'])
+    user.change_password(args['new_password'])
     db.session.commit()
 
     return jsonify({
@@ -85,17 +118,14 @@ def update_user_password(user_id: int, args: dict):
 @validate_json_content_type
 @use_args(UserSchema(only=['username', 'email']), error_status_code=400)
 def update_user_data(user_id: int, args: dict):
-    if User.query.filter(User.username == args['username']).first():
-        abort(409, description=f'User with username {args["username"]} already exists')
-
-    if User.query.filter(User.email == args['email']).first():
-        abort(409, description=f'User with email {args["email"]} already exists')
-
     user = User.query.get_or_404(user_id, description=f'User with id {user_id} not found')
 
     user.username = args['username']
     user.email = args['email']
-    db.session.commit()
+    commit_or_conflict({
+        'username': f'User with username {args["username"]} already exists',
+        'email': f'User with email {args["email"]} already exists'
+    })
 
     return jsonify({
         'success': True,
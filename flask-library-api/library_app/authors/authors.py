@@ -1,23 +1,30 @@
-from flask import jsonify
+from flask import jsonify, current_app
 from webargs.flaskparser import use_args
 
-from library_app import db
+from library_app import db, response_cache
 from library_app.authors import authors_bp
-from library_app.models import Author, AuthorSchema, author_schema
-from library_app.utils import validate_json_content_type, get_schema_args, apply_order, apply_filter, get_pagination, token_required
+from library_app.models import Author, AuthorSchema, author_schema, AuthorStats, AuthorStatsSchema, \
+    author_stats_schema
+from library_app.serialization import fast_dump, json_response, stream_response
+from library_app.utils import validate_json_content_type, get_schema_args, apply_order, apply_filter, get_pagination, token_required, \
+    apply_eager_loading, apply_load_only, get_export_format, iterate_keyset_batches
 
 
 @authors_bp.route('/authors', methods=['GET'])
+@response_cache.cached('authors', 'books')
 def get_authors():
     query = Author.query
     schema_args = get_schema_args(Author)
+    schema = AuthorSchema(**schema_args)
     query = apply_order(Author, query)
     query = apply_filter(Author, query)
+    query = apply_load_only(Author, query, schema_args)
+    query = apply_eager_loading(Author, query, schema)
     items, pagination = get_pagination(query, 'authors.get_authors')
     
-    authors = AuthorSchema(**schema_args).dump(items)
+    authors = fast_dump(schema, items)
     
-    return jsonify({
+    return json_response({
         'success': True,
         'data': authors,
         'number_of_records': len(authors),
@@ -25,7 +32,54 @@ def get_authors():
     })
 
 
+@authors_bp.route('/authors/export', methods=['GET'])
+def export_authors():
+    export_format = get_export_format()
+    query = Author.query
+    schema_args = get_schema_args(Author)
+    schema = AuthorSchema(**schema_args)
+    query = apply_filter(Author, query)
+    query = apply_load_only(Author, query, schema_args)
+    query = apply_eager_loading(Author, query, schema)
+    items = iterate_keyset_batches(query, current_app.config.get('EXPORT_CHUNK_SIZE', 1000))
+
+    return stream_response(schema, items, export_format)
+
+
+@authors_bp.route('/authors/stats', methods=['GET'])
+@response_cache.cached('authors', 'books', always=True)
+def get_authors_stats():
+    query = AuthorStats.query
+    schema_args = get_schema_args(AuthorStats)
+    schema = AuthorStatsSchema(**schema_args)
+    query = apply_order(AuthorStats, query)
+    query = apply_filter(AuthorStats, query)
+    query = apply_load_only(AuthorStats, query, schema_args)
+    items, pagination = get_pagination(query, 'authors.get_authors_stats')
+
+    stats = fast_dump(schema, items)
+
+    return json_response({
+        'success': True,
+        'data': stats,
+        'number_of_records': len(stats),
+        'pagination': pagination
+    })
+
+
+@authors_bp.route('/authors/<int:author_id>/stats', methods=['GET'])
+@response_cache.cached('authors', 'books', always=True)
+def get_author_stats(author_id: int):
+    stats = AuthorStats.query.get_or_404(author_id, description=f'Author with id {author_id} not found')
+
+    return json_response({
+        'success': True,
+        'data': author_stats_schema.dump(stats)
+    })
+
+
 @authors_bp.route('/authors/<int:author_id>', methods=['GET'])
+@response_cache.cached('authors', 'books')
 def get_author(author_id: int):
     author = Author.query.get_or_404(author_id, description=f'Author with id {author_id} not found')
 
@@ -1,23 +1,65 @@
-from flask import jsonify, abort
+import json
+from typing import Dict
+from flask import jsonify, abort, request, current_app
+from marshmallow import ValidationError
+from sqlalchemy.exc import IntegrityError
 from webargs.flaskparser import use_args
+from werkzeug.exceptions import UnsupportedMediaType
 
-from library_app import db
+from library_app import db, count_cache, response_cache
 from library_app.books import books_bp
 from library_app.models import Book, BookSchema, book_schema, Author
-from library_app.utils import validate_json_content_type, get_schema_args, apply_filter, apply_order, get_pagination, token_required
+from library_app.search import get_search_terms, search_books
+from library_app.serialization import fast_dump, json_response, stream_response
+from library_app.utils import validate_json_content_type, get_schema_args, apply_filter, apply_order, get_pagination, token_required, \
+    apply_eager_loading, apply_load_only, get_export_format, commit_or_conflict, iterate_keyset_batches, \
+    get_unique_violation
 
 
 @books_bp.route('/books', methods=['GET'])
+@response_cache.cached('books', 'authors')
 def get_books():
     query = Book.query
     schema_args = get_schema_args(Book)
+    schema = BookSchema(**schema_args)
     query = apply_order(Book, query)
     query = apply_filter(Book, query)
+    query = apply_load_only(Book, query, schema_args)
+    query = apply_eager_loading(Book, query, schema)
     items, pagination = get_pagination(query, 'books.get_books')
     
-    books = BookSchema(**schema_args).dump(items)
+    books = fast_dump(schema, items)
     
-    return jsonify({
+    return json_response({
+        'success': True,
+        'data': books,
+        'number_of_records': len(books),
+        'pagination': pagination
+    })
+
+
+@books_bp.route('/books/search', methods=['GET'])
+def search_books_by_text():
+    terms = get_search_terms(request.args.get('q'))
+    if not terms:
+        abort(400, description='Search query (q) is required')
+    if 'cursor' in request.args:
+        abort(400, description='Search results are ranked, use page instead of cursor')
+
+    schema_args = get_schema_args(Book)
+    schema = BookSchema(**schema_args)
+    try:
+        query = search_books(Book.query, terms)
+    except NotImplementedError as exc:
+        abort(501, description=str(exc))
+    query = apply_filter(Book, query)
+    query = apply_load_only(Book, query, schema_args)
+    query = apply_eager_loading(Book, query, schema)
+    items, pagination = get_pagination(query, 'books.search_books_by_text')
+
+    books = fast_dump(schema, items)
+
+    return json_response({
         'success': True,
         'data': books,
         'number_of_records': len(books),
@@ -25,7 +67,22 @@ def get_books():
     })
 
 
+@books_bp.route('/books/export', methods=['GET'])
+def export_books():
+    export_format = get_export_format()
+    query = Book.query
+    schema_args = get_schema_args(Book)
+    schema = BookSchema(**schema_args)
+    query = apply_filter(Book, query)
+    query = apply_load_only(Book, query, schema_args)
+    query = apply_eager_loading(Book, query, schema)
+    items = iterate_keyset_batches(query, current_app.config.get('EXPORT_CHUNK_SIZE', 1000))
+
+    return stream_response(schema, items, export_format)
+
+
 @books_bp.route('/books/<int:book_id>', methods=['GET'])
+@response_cache.cached('books', 'authors')
 def get_book(book_id: int):
     book = Book.query.get_or_404(book_id, description=f'Book with id {book_id} not found')
 
@@ -42,10 +99,6 @@ def get_book(book_id: int):
 def update_book(user_id: int, args: dict, book_id: int):
     book = Book.query.get_or_404(book_id, description=f'Book with id {book_id} not found')
 
-    book_with_this_isbn = Book.query.filter(Book.isbn == args['isbn']).first()
-    if book_with_this_isbn is not None and book_with_this_isbn.isbn != book.isbn:
-        abort(409, description=f'Book with ISBN {args["isbn"]} already exists')
-
     book.title = args['title']
     book.isbn = args['isbn']
     book.number_of_pages = args['number_of_pages']
@@ -59,7 +112,7 @@ def update_book(user_id: int, args: dict, book_id: int):
         Author.query.get_or_404(author_id, description=f'Author with id {author_id} not found')
         book.author_id = author_id
     
-    db.session.commit()
+    commit_or_conflict({'isbn': f'Book with ISBN {args["isbn"]} already exists'})
 
     return jsonify({
         'success': True,
@@ -84,14 +137,21 @@ def delete_book(user_id: int, book_id):
 @books_bp.route('/authors/<int:author_id>/books', methods=['GET'])
 def get_all_author_books(author_id: int):
     Author.query.get_or_404(author_id, description=f'Author with id {author_id} not found')
-    books = Book.query.filter(Book.author_id == author_id).all()
+    query = Book.query.filter(Book.author_id == author_id)
+    schema_args = get_schema_args(Book)
+    schema = BookSchema(exclude=['author'], **schema_args)
+    query = apply_order(Book, query)
+    query = apply_filter(Book, query)
+    query = apply_load_only(Book, query, schema_args)
+    items, pagination = get_pagination(query, 'books.get_all_author_books')
 
-    items = BookSchema(many=True, exclude=['author']).dump(books)
+    books = fast_dump(schema, items)
 
-    return jsonify({
+    return json_response({
         'success': True,
-        'data': items,
-        'number_of_records': len(items)
+        'data': books,
+        'number_of_records': len(books),
+        'pagination': pagination
     })
 
 
@@ -102,16 +162,133 @@ def get_all_author_books(author_id: int):
 def create_book(user_id: int, args: dict, author_id: int):
     Author.query.get_or_404(author_id, description=f'Author with id {author_id} not found')
 
-    book_with_this_isbn = Book.query.filter(Book.isbn == args['isbn']).first()
-    if book_with_this_isbn is not None:
-        abort(409, description=f'Book with ISBN {args["isbn"]} already exists')
-
     book = Book(author_id=author_id, **args)
 
     db.session.add(book)
-    db.session.commit()
+    commit_or_conflict({'isbn': f'Book with ISBN {args["isbn"]} already exists'})
 
     return jsonify({
         'success': True,
         'data': book_schema.dump(book)
     }), 201
+
+
+def _load_bulk_data(max_items: int) -> list:
+    """Items of JSON list or NDJSON body, NDJSON stops being read after max_items + 1 items"""
+    if request.mimetype == 'application/x-ndjson':
+        data = []
+        for line in request.stream:
+            if not line.strip():
+                continue
+            try:
+                data.append(json.loads(line))
+            except ValueError:
+                data.append(line.decode(errors='replace'))
+            if len(data) > max_items:
+                break
+    else:
+        data = request.get_json()
+        if data is None:
+            raise UnsupportedMediaType('Content type must be application/json or application/x-ndjson')
+    if not isinstance(data, list) or not data:
+        abort(400, description='Expected a list of books')
+    if len(data) > max_items:
+        abort(400, description=f'Maximum number of books in one request is {max_items}')
+    return data
+
+
+def _chunks(items: list, size: int):
+    for index in range(0, len(items), size):
+        yield items[index:index + size]
+
+
+def _get_existing_isbns(isbns: list, chunk_size: int) -> set:
+    existing_isbns = set()
+    for chunk in _chunks(isbns, chunk_size):
+        existing_isbns.update(isbn for isbn, in db.session.query(Book.isbn).filter(Book.isbn.in_(chunk)))
+    return existing_isbns
+
+
+def _insert_books(rows: list, chunk_size: int) -> Dict[int, int]:
+    """
+    Inserts rows in one transaction and returns ids by ISBN, a concurrent
+    insert of the same ISBN (after the check) makes IntegrityError raised
+    after rollback
+    """
+    try:
+        db.session.execute(Book.__table__.insert(), rows)
+        created_ids = {}
+        for isbns in _chunks([row['isbn'] for row in rows], chunk_size):
+            created_ids.update(db.session.query(Book.isbn, Book.id).filter(Book.isbn.in_(isbns)))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise
+    return created_ids
+
+
+@books_bp.route('/authors/<int:author_id>/books/bulk', methods=['POST'])
+@token_required
+def create_books(user_id: int, author_id: int):
+    Author.query.get_or_404(author_id, description=f'Author with id {author_id} not found')
+    data = _load_bulk_data(current_app.config.get('BULK_MAX_ITEMS', 10000))
+
+    try:
+        items = BookSchema(many=True, exclude=['author_id']).load(data)
+        errors = {}
+    except ValidationError as err:
+        items, errors = err.valid_data, err.messages
+
+    results = [None] * len(data)
+    for index, messages in errors.items():
+        results[index] = {'index': index, 'status': 400, 'message': messages}
+
+    valid_indexes = [index for index in range(len(data)) if results[index] is None]
+    chunk_size = current_app.config.get('BULK_CHUNK_SIZE', 500)
+    existing_isbns = _get_existing_isbns([items[index]['isbn'] for index in valid_indexes], chunk_size)
+
+    rows = []
+    for index in valid_indexes:
+        isbn = items[index]['isbn']
+        if isbn in existing_isbns:
+            results[index] = {'index': index, 'status': 409, 'message': f'Book with ISBN {isbn} already exists'}
+            continue
+        existing_isbns.add(isbn)
+        rows.append((index, {'description': None, **items[index], 'author_id': author_id}))
+
+    while rows:
+        try:
+            created_ids = _insert_books([row for _, row in rows], chunk_size)
+            break
+        except IntegrityError as exc:
+            violation = get_unique_violation(exc) or ''
+            if violation != 'isbn' and not violation.endswith('_isbn'):
+                raise
+            #książki o tych ISBN dodało w międzyczasie inne żądanie
+            existing_isbns = _get_existing_isbns([row['isbn'] for _, row in rows], chunk_size)
+            if not existing_isbns:
+                raise
+            for index, row in rows:
+                if row['isbn'] in existing_isbns:
+                    results[index] = {'index': index, 'status': 409,
+                                      'message': f'Book with ISBN {row["isbn"]} already exists'}
+            rows = [(index, row) for index, row in rows if row['isbn'] not in existing_isbns]
+
+    if not rows:
+        status_code = 409 if all(result['status'] == 409 for result in results) else 400
+        return jsonify({
+            'success': False,
+            'data': results,
+            'number_of_records': 0
+        }), status_code
+
+    count_cache.invalidate(Book.__tablename__)
+    response_cache.invalidate(Book.__tablename__)
+    for index, row in rows:
+        results[index] = {'index': index, 'status': 201, 'id': created_ids[row['isbn']]}
+
+    return jsonify({
+        'success': True,
+        'data': results,
+        'number_of_records': len(rows)
+    }), 201 if len(rows) == len(data) else 207
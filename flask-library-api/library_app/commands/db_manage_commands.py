@@ -1,20 +1,20 @@
-import json, os
+import click
 from pathlib import Path
-from datetime import datetime
-
-from library_app import db
-from library_app.models import Author, Book
+from flask import current_app
 
 from library_app.commands import db_manage_bp
+from library_app.commands.explain import MODELS, explain_shapes
+from library_app.commands.loaders import INSERTERS, READERS, load_file
+from library_app.commands.purge import purge
+
 
+SAMPLES_DIR = Path(__file__).parent.parent.parent / 'samples'
+PURGE_TABLES = ['books', 'authors']
 
-def load_json_data(filename: str) -> list:
-        json_path = os.path.join('C:\\python\\CodersLab\\Python-examples\\flask-library-api\samples', filename)
-        # authors_path = os.path.join(os.getcwd(), 'samples', 'authors.json')
-        # authors_path = Path(__file__).parent.parent / 'samples' / 'authors.json'
-        with open(json_path) as file:
-            data_json = json.load(file)
-        return data_json
+
+def print_progress(stats: dict):
+    print(f'{stats["rows"]} rows processed, {stats["inserted"]} inserted, {stats["rejected"]} rejected '
+          f'({stats["rows_per_second"]:.0f} rows/s)')
 
 
 @db_manage_bp.cli.group()
@@ -27,18 +27,9 @@ def db_manage():
 def add_data():
     """Add sample data to the database"""
     try:
-        data_json = load_json_data('authors.json')
-        for item in data_json:
-            item['birth_date'] = datetime.strptime(item['birth_date'], '%d-%m-%Y').date()
-            author = Author(**item)
-            db.session.add(author)
-
-        data_json = load_json_data('books.json')
-        for item in data_json:
-            book = Book(**item)
-            db.session.add(book)
-
-        db.session.commit()
+        author_ids = set()  #książki przykładowe odwołują się do autorów przez author_id
+        for model in ['authors', 'books']:
+            load_file(str(SAMPLES_DIR / f'{model}.json'), model, preserved_author_ids=author_ids)
         print('Data has been added to database')
 
     except Exception as exc:
@@ -46,14 +37,61 @@ def add_data():
 
 
 @db_manage.command()
-def remove_data():
+@click.argument('model', type=click.Choice(list(INSERTERS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(list(READERS)),
+              help='File format, taken from the file extension by default')
+@click.option('--chunk-size', type=click.IntRange(min=1), help='Number of rows inserted in one transaction')
+@click.option('--checkpoint', 'checkpoint_path', type=click.Path(dir_okay=False),
+              help='Checkpoint file, defaults to PATH.checkpoint')
+def load(model: str, path: str, file_format: str, chunk_size: int, checkpoint_path: str):
+    """Stream rows of JSON array, NDJSON or CSV file into authors or books table"""
+    chunk_size = chunk_size or current_app.config.get('LOAD_CHUNK_SIZE', 1000)
+    checkpoint_path = checkpoint_path or f'{path}.checkpoint'
+    try:
+        stats = load_file(path, model, chunk_size, file_format, checkpoint_path, print_progress)
+        print(f'Data has been loaded to database: {stats["inserted"]} rows inserted, {stats["rejected"]} rejected '
+              f'in {stats["seconds"]:.2f}s ({stats["rows_per_second"]:.0f} rows/s)')
+    except Exception as exc:
+        print(f'Unexpected error: {exc}')
+        print(f'Committed rows are saved in {checkpoint_path}, run the command again to resume')
+
+
+@db_manage.command()
+@click.option('--dry-run', is_flag=True, help='Only report number of rows which would be removed')
+@click.option('--batch-size', type=click.IntRange(min=1), help='Number of rows deleted in one transaction '
+                                                               '(when TRUNCATE is not available)')
+def remove_data(dry_run: bool, batch_size: int):
     """Remove all data from the database"""
     try:
-        db.session.execute('DELETE FROM books')
-        db.session.execute('ALTER TABLE books AUTO_INCREMENT = 1')
-        db.session.execute('DELETE FROM authors')
-        db.session.execute('ALTER TABLE authors AUTO_INCREMENT = 1')
-        db.session.commit()
-        print('Data has been removed from database')
+        batch_size = batch_size or current_app.config.get('PURGE_BATCH_SIZE', 10000)
+        strategy, counts = purge(PURGE_TABLES, batch_size, dry_run)
+        for table_name, count in counts.items():
+            print(f'{table_name}: {count} rows')
+        if dry_run:
+            print(f'Dry run, data would be removed with {strategy}')
+        else:
+            print(f'Data has been removed from database ({strategy})')
+    except Exception as exc:
+        print(f'Unexpected error: {exc}')
+
+
+@db_manage.command()
+@click.option('--model', 'model_names', type=click.Choice(list(MODELS)), multiple=True,
+              help='Model to check, all models by default')
+@click.option('--query', 'query_strings', multiple=True,
+              help='Query string to check (e.g. "title=x&sort=-id"), common filter and sort shapes by default')
+def explain(model_names: tuple, query_strings: tuple):
+    """Show query plans of filter and sort query shapes and flag full table scans"""
+    try:
+        full_scans = checked = 0
+        for model_name in model_names or MODELS:
+            for query_string, plan, full_scan in explain_shapes(MODELS[model_name], query_strings):
+                checked += 1
+                full_scans += full_scan
+                print(f'{"FULL SCAN" if full_scan else "ok":>9}  /{model_name}?{query_string}')
+                for line in plan:
+                    print(f'{"":>11}{line}')
+        print(f'{full_scans} of {checked} query shapes scan the whole table or sort without index')
     except Exception as exc:
         print(f'Unexpected error: {exc}')
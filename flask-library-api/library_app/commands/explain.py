@@ -0,0 +1,77 @@
+import re
+from datetime import date, datetime
+from typing import Iterable, List, Tuple
+from flask import current_app
+from flask_sqlalchemy import BaseQuery, DefaultMeta
+from sqlalchemy import Text
+
+from library_app import db
+from library_app.models import Author, Book
+from library_app.utils import apply_filter, apply_order
+
+
+MODELS = {'authors': Author, 'books': Book}
+SKIPPED_COLUMNS = {'id', 'password'}
+SAMPLE_VALUES = {int: '1', float: '1', date: '01-01-2000', datetime: '2000-01-01 00:00:00', str: 'x'}
+RANGE_TYPES = {int, float, date, datetime}
+EXPLAIN_PREFIXES = {'sqlite': 'EXPLAIN QUERY PLAN', 'mysql': 'EXPLAIN', 'postgresql': 'EXPLAIN'}
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'^SCAN (TABLE )?\w+$|USE TEMP B-TREE FOR ORDER BY'),
+    'mysql': re.compile(r'\btype=ALL\b|Using filesort'),
+    'postgresql': re.compile(r'Seq Scan|^(->)?\s*Sort\b')
+}
+
+
+def get_query_shapes(model: DefaultMeta) -> List[str]:
+    """
+    Query strings of the common shapes built by apply_filter and apply_order -
+    equality filter, range filter (numbers and dates) and sort for every
+    column of the model (text columns, id and passwords are left out)
+    """
+    shapes = []
+    for column in model.__table__.columns:
+        if column.name in SKIPPED_COLUMNS or isinstance(column.type, Text):
+            continue
+        python_type = column.type.python_type
+        value = SAMPLE_VALUES.get(python_type, 'x')
+        shapes.append(f'{column.name}={value}')
+        if python_type in RANGE_TYPES:
+            shapes.append(f'{column.name}[gte]={value}')
+        shapes.append(f'sort={column.name}')
+    return shapes
+
+
+def build_query(model: DefaultMeta, query_string: str) -> BaseQuery:
+    with current_app.test_request_context(query_string=query_string):
+        return apply_filter(model, apply_order(model, model.query))
+
+
+def get_plan(query: BaseQuery) -> List[str]:
+    """Lines of the query plan reported by EXPLAIN of the database in use"""
+    dialect = db.engine.dialect.name
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    rows = db.session.connection().execute(f'{EXPLAIN_PREFIXES.get(dialect, "EXPLAIN")} {compiled}', params)
+    if dialect == 'sqlite':
+        return [row['detail'] for row in rows]
+    if dialect == 'mysql':
+        return [f'{row["table"]}: type={row["type"]} key={row["key"]} rows={row["rows"]} {row["Extra"] or ""}'.rstrip()
+                for row in rows]
+    return [row[0] for row in rows]
+
+
+def is_full_scan(plan: List[str]) -> bool:
+    """Plan reads the whole table or sorts all rows without an index"""
+    pattern = FULL_SCAN_PATTERNS.get(db.engine.dialect.name)
+    return pattern is not None and any(pattern.search(line.strip()) for line in plan)
+
+
+def explain_shapes(model: DefaultMeta, query_strings: Iterable[str] = None) -> List[Tuple[str, List[str], bool]]:
+    """(query string, plan, full scan) of given query shapes, all common shapes of the model by default"""
+    report = []
+    for query_string in query_strings or get_query_shapes(model):
+        plan = get_plan(build_query(model, query_string))
+        report.append((query_string, plan, is_full_scan(plan)))
+    return report
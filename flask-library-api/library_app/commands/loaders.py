@@ -0,0 +1,242 @@
+import csv
+import json
+import os
+import re
+import time
+from functools import partial
+from itertools import islice
+from typing import Callable, Iterator, List, Optional, Set, Tuple
+from marshmallow import EXCLUDE, Schema, ValidationError
+
+from library_app import db, count_cache, response_cache
+from library_app.models import Author, AuthorSchema, Book, BookSchema
+
+
+READ_SIZE = 1 << 16
+FILE_FORMATS = {'.json': 'json', '.ndjson': 'ndjson', '.jsonl': 'ndjson', '.csv': 'csv'}
+_WHITESPACE_RE = re.compile(r'\s*')
+_SEPARATOR_RE = re.compile(r'[\s,]*')
+
+
+def _read_json_array(file) -> Iterator[dict]:
+    """Yields objects of a top level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE)
+    position = _WHITESPACE_RE.match(buffer).end()
+    if not buffer.startswith('[', position):
+        raise ValueError('JSON file must contain an array of objects')
+    position += 1
+    while True:
+        position = _SEPARATOR_RE.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            data = file.read(READ_SIZE)
+            if not data:
+                raise
+            buffer, position = buffer[position:] + data, 0
+            continue
+        yield item
+
+
+def _read_ndjson(file) -> Iterator[dict]:
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _read_csv(file) -> Iterator[dict]:
+    for row in csv.DictReader(file):
+        yield {key: value for key, value in row.items() if value != ''}
+
+
+READERS = {'json': _read_json_array, 'ndjson': _read_ndjson, 'csv': _read_csv}
+
+
+def get_file_format(path: str) -> str:
+    file_format = FILE_FORMATS.get(os.path.splitext(path)[1].lower())
+    if file_format is None:
+        raise ValueError(f'Unknown format of file {path}, allowed formats: {", ".join(READERS)}')
+    return file_format
+
+
+def read_rows(path: str, file_format: Optional[str] = None) -> Iterator[dict]:
+    """Streams rows of JSON array, NDJSON or CSV file (format taken from extension by default)"""
+    reader = READERS[file_format or get_file_format(path)]
+    with open(path, encoding='utf-8', newline='') as file:
+        yield from reader(file)
+
+
+def _validate(schema: Schema, items: List[dict]) -> Tuple[List[Optional[dict]], int]:
+    """Loads items with schema, invalid items are replaced with None"""
+    try:
+        return schema.load(items, unknown=EXCLUDE), 0
+    except ValidationError as err:
+        rows = [None if index in err.messages else row for index, row in enumerate(err.valid_data)]
+        return rows, len(err.messages)
+
+
+def _get_source_id(item: dict) -> Optional[int]:
+    try:
+        return int(item['id'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _insert_authors(items: List[dict], preserved_author_ids: Optional[Set[int]] = None) -> Tuple[int, int]:
+    """
+    Authors get new ids, unless preserved_author_ids is given - then ids of the
+    file are kept (rows colliding with existing authors are rejected) and added
+    to preserved_author_ids, so books loaded in the same run may reference them
+    """
+    rows, rejected = _validate(AuthorSchema(many=True, exclude=['books']), items)
+    rows_with_ids = {}
+    if preserved_author_ids is not None:
+        source_ids = [_get_source_id(item) for item in items]
+        taken_ids = {author_id for author_id, in
+                     db.session.query(Author.id).filter(Author.id.in_(set(source_ids) - {None}))}
+        for index, source_id in enumerate(source_ids):
+            if rows[index] is None or source_id is None:
+                continue
+            if source_id in taken_ids:
+                rejected += 1
+            else:
+                taken_ids.add(source_id)
+                rows_with_ids[source_id] = {**rows[index], 'id': source_id}
+            rows[index] = None
+    rows = [row for row in rows if row is not None]
+    if rows:
+        db.session.execute(Author.__table__.insert(), rows)
+    if rows_with_ids:
+        db.session.execute(Author.__table__.insert(), list(rows_with_ids.values()))
+        preserved_author_ids.update(rows_with_ids)
+    return len(rows) + len(rows_with_ids), rejected
+
+
+def _get_author_name(item: dict) -> Optional[Tuple[str, str]]:
+    author = item.get('author')
+    if isinstance(author, dict):
+        first_name, last_name = author.get('first_name'), author.get('last_name')
+    else:
+        first_name, last_name = item.get('author.first_name'), item.get('author.last_name')
+    if first_name is None or last_name is None:
+        return None
+    return first_name, last_name
+
+
+def _resolve_authors(items: List[dict], preserved_author_ids: Optional[Set[int]] = None) -> List[Optional[int]]:
+    """
+    Returns author id of every book item - author is looked up by first and
+    last name (author object of NDJSON export or author.* columns of CSV
+    export, one query for the whole chunk). Ids of the source database don't
+    match ids of authors loaded into another database, so bare author_id is
+    accepted only for authors loaded with preserved ids in the same run.
+    """
+    names = {_get_author_name(item) for item in items} - {None}
+    ids_by_name = {}
+    if names:
+        query = db.session.query(Author.first_name, Author.last_name, Author.id) \
+            .filter(Author.last_name.in_({last_name for _, last_name in names})) \
+            .order_by(Author.id)
+        for first_name, last_name, author_id in query:
+            ids_by_name.setdefault((first_name, last_name), author_id)
+
+    resolved = []
+    for item in items:
+        name = _get_author_name(item)
+        author_id = item.get('author_id')
+        if name is not None:
+            resolved.append(ids_by_name.get(name))
+        elif author_id is not None and preserved_author_ids and int(author_id) in preserved_author_ids:
+            resolved.append(int(author_id))
+        else:
+            resolved.append(None)
+    return resolved
+
+
+def _insert_books(items: List[dict], preserved_author_ids: Optional[Set[int]] = None) -> Tuple[int, int]:
+    author_ids = _resolve_authors(items, preserved_author_ids)
+    for item, author_id in zip(items, author_ids):
+        item['author_id'] = author_id
+    rows, _ = _validate(BookSchema(many=True, exclude=['author']), items)
+    rows = [{'description': None, **row} for row, author_id in zip(rows, author_ids)
+            if row is not None and author_id is not None]
+    rejected = len(items) - len(rows)
+
+    isbns = {row['isbn'] for row in rows}
+    existing_isbns = {isbn for isbn, in db.session.query(Book.isbn).filter(Book.isbn.in_(isbns))} if isbns else set()
+    unique_rows = []
+    for row in rows:
+        if row['isbn'] not in existing_isbns:
+            existing_isbns.add(row['isbn'])
+            unique_rows.append(row)
+    if unique_rows:
+        db.session.execute(Book.__table__.insert(), unique_rows)
+    return len(unique_rows), rejected + len(rows) - len(unique_rows)
+
+
+INSERTERS = {'authors': _insert_authors, 'books': _insert_books}
+
+
+def read_checkpoint(checkpoint_path: Optional[str], path: str, model: str) -> int:
+    if checkpoint_path is None or not os.path.exists(checkpoint_path):
+        return 0
+    with open(checkpoint_path) as file:
+        checkpoint = json.load(file)
+    if checkpoint.get('path') != os.path.abspath(path) or checkpoint.get('model') != model:
+        raise ValueError(f'Checkpoint {checkpoint_path} belongs to another load, remove it to start from scratch')
+    return checkpoint['rows']
+
+
+def write_checkpoint(checkpoint_path: str, path: str, model: str, rows: int):
+    temporary_path = f'{checkpoint_path}.tmp'
+    with open(temporary_path, 'w') as file:
+        json.dump({'path': os.path.abspath(path), 'model': model, 'rows': rows}, file)
+    os.replace(temporary_path, checkpoint_path)
+
+
+def load_file(path: str, model: str, chunk_size: int = 1000, file_format: Optional[str] = None,
+              checkpoint_path: Optional[str] = None, progress: Optional[Callable[[dict], None]] = None,
+              preserved_author_ids: Optional[Set[int]] = None) -> dict:
+    """
+    Streams rows of the file into model table with core bulk inserts, every
+    chunk is committed separately and the number of processed rows is stored
+    in the checkpoint file, so after a failure the next run skips already
+    committed rows. Invalid rows (and books with unknown author or already
+    existing ISBN) are counted as rejected and skipped. With preserved_author_ids
+    authors keep ids of the file and books may reference them by author_id.
+    """
+    insert = partial(INSERTERS[model], preserved_author_ids=preserved_author_ids)
+    skipped = read_checkpoint(checkpoint_path, path, model)
+    stats = {'rows': skipped, 'inserted': 0, 'rejected': 0, 'seconds': 0.0, 'rows_per_second': 0.0}
+    started_at = time.perf_counter()
+    rows = islice(read_rows(path, file_format), skipped, None)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        try:
+            inserted, rejected = insert(chunk)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            count_cache.invalidate(model)
+            response_cache.invalidate(model)
+        stats['rows'] += len(chunk)
+        stats['inserted'] += inserted
+        stats['rejected'] += rejected
+        stats['seconds'] = time.perf_counter() - started_at
+        stats['rows_per_second'] = (stats['rows'] - skipped) / stats['seconds'] if stats['seconds'] else 0.0
+        if checkpoint_path is not None:
+            write_checkpoint(checkpoint_path, path, model, stats['rows'])
+        if progress is not None:
+            progress(stats)
+
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return stats
@@ -1,5 +1,6 @@
 from flask import Response, jsonify
-from library_app import db
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from library_app import db, pool_metrics
 
 from library_app.errors import errors_bp
 
@@ -20,6 +21,8 @@ class ErrorResponse:
 
 @errors_bp.app_errorhandler(400)
 def bad_request_error(err):
+    if not hasattr(err, 'data'):
+        return ErrorResponse(err.description, 400).to_response()
     messages = err.data.get('messages', {}).get('json', {})
     return ErrorResponse(messages, 400).to_response()
 
@@ -44,6 +47,18 @@ def unsupported_media_type_error(err):
     return ErrorResponse(err.description, 415).to_response()
 
 
+@errors_bp.app_errorhandler(501)
+def not_implemented_error(err):
+    return ErrorResponse(err.description, 501).to_response()
+
+
+@errors_bp.app_errorhandler(PoolTimeoutError)
+def pool_timeout_error(err):
+    db.session.rollback()
+    pool_metrics.record_timeout()
+    return ErrorResponse('Database is busy, please try again later', 503).to_response()
+
+
 @errors_bp.app_errorhandler(500)
 def internal_server_error(err):
     db.session.rolback()
@@ -1,18 +1,22 @@
 from flask import current_app
-from werkzeug.security import generate_password_hash
 import jwt
-from library_app import db
+import secrets
+from library_app import db, password_hasher
+from sqlalchemy import func, select
+from typing import Optional, Union
 from datetime import datetime, date, timedelta
 from marshmallow import Schema, fields, validate, validates, ValidationError
-from werkzeug.security import generate_password_hash, check_password_hash
 
 
 class Author(db.Model):
     __tablename__ = 'authors'
+    __table_args__ = (
+        db.Index('ix_authors_last_name_first_name', 'last_name', 'first_name'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(50), nullable=False)
     last_name = db.Column(db.String(50), nullable=False)
-    birth_date = db.Column(db.Date, nullable=False)
+    birth_date = db.Column(db.Date, nullable=False, index=True)
     books = db.relationship('Book', back_populates='author', cascade='all, delete-orphan')
 
     def __repr__(self):
@@ -31,11 +35,11 @@ class Author(db.Model):
 class Book(db.Model):
     __tablename__ = 'books'
     id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(50), nullable=False)
+    title = db.Column(db.String(50), nullable=False, index=True)
     isbn = db.Column(db.BigInteger, nullable=False, unique=True)
-    number_of_pages = db.Column(db.Integer, nullable=False)
+    number_of_pages = db.Column(db.Integer, nullable=False, index=True)
     description = db.Column(db.Text)
-    author_id = db.Column(db.Integer, db.ForeignKey('authors.id'), nullable=False)
+    author_id = db.Column(db.Integer, db.ForeignKey('authors.id'), nullable=False, index=True)
     author = db.relationship('Author', back_populates='books')
     
     def __repr__(self):
@@ -46,6 +50,29 @@ class Book(db.Model):
         return value        
 
 
+class AuthorStats(db.Model):
+    """Read-only view of authors with aggregates of their books, one grouped query"""
+    __tablename__ = 'author_stats'
+    __table__ = select([
+        Author.id,
+        Author.first_name,
+        Author.last_name,
+        func.count(Book.id).label('number_of_books'),
+        func.coalesce(func.sum(Book.number_of_pages), 0).label('total_pages'),
+        func.avg(Book.number_of_pages).label('average_pages')
+    ]).select_from(Author.__table__.outerjoin(Book.__table__)).group_by(Author.id).alias('author_stats')
+
+    @staticmethod
+    def additional_validation(param: str, value: str) -> Optional[Union[str, int, float]]:
+        # aggregates have no column type on SQLite, so values must be compared as numbers
+        if param in {'first_name', 'last_name'}:
+            return value
+        try:
+            return float(value) if param == 'average_pages' else int(value)
+        except ValueError:
+            return None
+
+
 class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
@@ -53,10 +80,11 @@ class User(db.Model):
     email = db.Column(db.String(255), nullable=False, unique=True)
     password = db.Column(db.String(255), nullable=False)
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
+    token_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     @staticmethod
     def generate_hashed_password(password: str) -> str:
-        return generate_password_hash(password)
+        return password_hasher.hash(password)
 
     def generate_jwt(self) -> bytes:
         payload = {
@@ -65,8 +93,28 @@ class User(db.Model):
         }
         return jwt.encode(payload, current_app.config.get('SECRET_KEY'))
 
+    def generate_refresh_token(self) -> bytes:
+        payload = {
+            'user_id': self.id,
+            'type': 'refresh',
+            'jti': secrets.token_urlsafe(16),
+            'generation': self.token_generation,
+            'exp': datetime.utcnow() + timedelta(days=current_app.config.get('REFRESH_TOKEN_EXPIRED_DAYS', 30))
+        }
+        return jwt.encode(payload, current_app.config.get('SECRET_KEY'))
+
+    def change_password(self, password: str):
+        """Sets a new password, refresh tokens issued before are no longer accepted (commit is up to the caller)"""
+        self.password = self.generate_hashed_password(password)
+        self.token_generation = User.token_generation + 1
+
     def is_password_valid(self, password: str) -> bool:
-        return check_password_hash(self.password, password)
+        """Checks the password, hash made with outdated hasher parameters is replaced (commit is up to the caller)"""
+        if not password_hasher.verify(self.password, password):
+            return False
+        if password_hasher.needs_rehash(self.password):
+            self.password = password_hasher.hash(password)
+        return True
 
 
 class AuthorSchema(Schema):
@@ -97,6 +145,15 @@ class BookSchema(Schema):
             raise ValidationError('ISBN not containes 13 digits')
 
 
+class AuthorStatsSchema(Schema):
+    id = fields.Integer(dump_only=True)
+    first_name = fields.String(dump_only=True)
+    last_name = fields.String(dump_only=True)
+    number_of_books = fields.Integer(dump_only=True)
+    total_pages = fields.Integer(dump_only=True)
+    average_pages = fields.Float(dump_only=True)
+
+
 class UserSchema(Schema):
     id = fields.Integer(dump_only=True)
     username = fields.String(required=True, validate=validate.Length(max=255))
@@ -105,6 +162,10 @@ class UserSchema(Schema):
     created_date = fields.DateTime(dump_only=True)
 
 
+class RefreshTokenSchema(Schema):
+    refresh_token = fields.String(required=True)
+
+
 class UserPasswordUpdateShema(Schema):
     current_password = fields.String(required=True, load_only=True, validate=validate.Length(min=6, max=255))
     new_password = fields.String(required=True, load_only=True, validate=validate.Length(min=6, max=255))
@@ -112,5 +173,7 @@ class UserPasswordUpdateShema(Schema):
 
 author_schema = AuthorSchema()
 book_schema = BookSchema()
+author_stats_schema = AuthorStatsSchema()
 user_schema = UserSchema()
-user_password_update_schema = UserPasswordUpdateShema()
\ No newline at end of file
+user_password_update_schema = UserPasswordUpdateShema()
+refresh_token_schema = RefreshTokenSchema()
\ No newline at end of file
@@ -0,0 +1,115 @@
+import os
+from threading import Lock
+from typing import Optional
+from flask import Flask, current_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import URL
+from sqlalchemy.pool import QueuePool
+
+
+QUEUE_POOL_OPTIONS = ['pool_size', 'max_overflow', 'pool_timeout']
+COUNTERS = ['connects', 'closes', 'invalidations', 'checkouts', 'checkins', 'overflow_checkouts', 'timeouts']
+
+
+def get_pool_options(sa_url: URL, options: dict) -> dict:
+    """
+    Engine options without QueuePool settings (pool_size, max_overflow,
+    pool_timeout) when the pool of the dialect doesn't accept them - SQLite
+    file databases use NullPool, in-memory ones SingletonThreadPool
+    """
+    poolclass = options.get('poolclass') or sa_url.get_dialect().get_pool_class(sa_url)
+    if issubclass(poolclass, QueuePool):
+        return options
+    return {name: value for name, value in options.items() if name not in QUEUE_POOL_OPTIONS}
+
+
+class PoolMetrics:
+    """
+    Per process (worker) counters of the database connection pool, gathered
+    from SQLAlchemy pool events: physical connections opened/closed/invalidated
+    (churn), checkouts and checkins, checkouts served by overflow connections
+    (pool_size exhausted) and checkouts which timed out after pool_timeout.
+    """
+    def __init__(self, app: Flask = None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        from library_app import db
+
+        state = {'lock': Lock(), 'max_checked_out': 0, 'checked_out': 0, **{name: 0 for name in COUNTERS}}
+        app.extensions['pool_metrics'] = state
+
+        def listen(engine: Engine, bind_key: Optional[str]):
+            if bind_key is None:  #tylko baza główna, repliki mają osobne pule
+                self._listen(engine, state)
+
+        db.listen_engines(app, listen)
+
+    @staticmethod
+    def _listen(engine: Engine, state: dict):
+        def increment(name: str, value: int = 1):
+            with state['lock']:
+                state[name] += value
+
+        @event.listens_for(engine, 'connect')
+        def connect(dbapi_connection, connection_record):
+            increment('connects')
+
+        @event.listens_for(engine, 'close')
+        def close(dbapi_connection, connection_record):
+            increment('closes')
+
+        @event.listens_for(engine, 'close_detached')
+        def close_detached(dbapi_connection):
+            increment('closes')
+
+        @event.listens_for(engine, 'invalidate')
+        def invalidate(dbapi_connection, connection_record, exception):
+            increment('invalidations')
+
+        @event.listens_for(engine, 'checkout')
+        def checkout(dbapi_connection, connection_record, connection_proxy):
+            pool = engine.pool
+            with state['lock']:
+                state['checkouts'] += 1
+                state['checked_out'] += 1
+                state['max_checked_out'] = max(state['max_checked_out'], state['checked_out'])
+                if isinstance(pool, QueuePool) and pool.checkedout() > pool.size():
+                    state['overflow_checkouts'] += 1
+
+        @event.listens_for(engine, 'checkin')
+        def checkin(dbapi_connection, connection_record):
+            with state['lock']:
+                state['checkins'] += 1
+                state['checked_out'] -= 1
+
+    @property
+    def _state(self) -> dict:
+        return current_app.extensions['pool_metrics']
+
+    def record_timeout(self):
+        with self._state['lock']:
+            self._state['timeouts'] += 1
+
+    def stats(self) -> dict:
+        from library_app import db
+
+        state = self._state
+        pool = db.get_engine(current_app).pool
+        with state['lock']:
+            data = {name: state[name] for name in COUNTERS}
+            data['checked_out'] = state['checked_out']
+            data['max_checked_out'] = state['max_checked_out']
+        data['pid'] = os.getpid()
+        data['pool'] = {'class': type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            data['pool'].update({
+                'size': pool.size(),
+                'checked_in': pool.checkedin(),
+                'overflow': pool.overflow(),
+                'max_overflow': pool._max_overflow,
+                'timeout': pool.timeout()
+            })
+        return data
@@ -0,0 +1,151 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+from typing import Iterator, List, Optional
+from flask import Flask, Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+METRICS = ['duration', 'sql_count', 'sql_duration', 'dump_duration', 'size']
+DURATION_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500]  #milisekundy
+
+
+def _is_profiled() -> bool:
+    return has_request_context() and 'profile' in g
+
+
+@contextmanager
+def profile_section(name: str) -> Iterator[None]:
+    """Adds time spent in the block to <name>_duration of the profiled request"""
+    if not _is_profiled():
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        g.profile[f'{name}_duration'] += time.perf_counter() - started_at
+
+
+def _percentile(ordered: List[float], percent: int) -> float:
+    return ordered[max(0, -(-len(ordered) * percent // 100) - 1)]
+
+
+def _summarize(values: List[float]) -> dict:
+    ordered = sorted(values)
+    return {
+        'mean': round(sum(ordered) / len(ordered), 3),
+        'p50': round(_percentile(ordered, 50), 3),
+        'p95': round(_percentile(ordered, 95), 3),
+        'p99': round(_percentile(ordered, 99), 3),
+        'max': round(ordered[-1], 3)
+    }
+
+
+def _get_histogram(durations: List[float]) -> dict:
+    histogram = {f'le_{bucket}': 0 for bucket in DURATION_BUCKETS}
+    histogram['inf'] = 0
+    for duration in durations:
+        bucket = next((bucket for bucket in DURATION_BUCKETS if duration <= bucket), None)
+        histogram[f'le_{bucket}' if bucket is not None else 'inf'] += 1
+    return histogram
+
+
+class RequestProfiler:
+    """
+    Opt-in (PROFILING_ENABLED) per request profile - wall time, number and time
+    of SQL statements (engine cursor events of the primary and replicas), time
+    of serialization (fast_dump) and response size. Every profiled response gets
+    Server-Timing header, the last PROFILING_WINDOW profiles of every endpoint
+    (books.get_books, authors.get_author...) are kept in memory of the process,
+    so growing sql_count of an endpoint shows N+1 queries.
+    """
+    def __init__(self, app: Flask = None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        from library_app import db
+
+        app.config.setdefault('PROFILING_ENABLED', False)
+        app.config.setdefault('PROFILING_WINDOW', 1000)
+        app.extensions['profiler'] = {'lock': Lock(), 'endpoints': {}}
+        if not app.config['PROFILING_ENABLED']:
+            return
+
+        def listen(engine: Engine, bind_key: Optional[str]):
+            self._listen(engine)
+
+        db.listen_engines(app, listen)
+        app.before_request(self.start)
+        app.after_request(self.finish)
+
+    @staticmethod
+    def _listen(engine: Engine):
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+            if _is_profiled():
+                context.profile_started_at = time.perf_counter()
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+            started_at = getattr(context, 'profile_started_at', None)
+            if started_at is not None and _is_profiled():
+                g.profile['sql_count'] += 1
+                g.profile['sql_duration'] += time.perf_counter() - started_at
+
+    @staticmethod
+    def start():
+        g.profile = {'started_at': time.perf_counter(), 'sql_count': 0, 'sql_duration': 0.0, 'dump_duration': 0.0}
+
+    def finish(self, response: Response) -> Response:
+        """Server-Timing header (milliseconds) and profile recorded for the endpoint of the request"""
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        profile['duration'] = time.perf_counter() - profile.pop('started_at')
+        for name in ['duration', 'sql_duration', 'dump_duration']:
+            profile[name] *= 1000
+        profile['size'] = response.calculate_content_length() or 0
+        response.headers['Server-Timing'] = (
+            f'app;dur={profile["duration"]:.2f}, '
+            f'sql;dur={profile["sql_duration"]:.2f};desc="{profile["sql_count"]} queries", '
+            f'dump;dur={profile["dump_duration"]:.2f}'
+        )
+        if request.endpoint is not None:
+            self.record(request.endpoint, profile)
+        return response
+
+    @property
+    def _state(self) -> dict:
+        return current_app.extensions['profiler']
+
+    def record(self, endpoint: str, profile: dict):
+        state = self._state
+        with state['lock']:
+            if endpoint not in state['endpoints']:
+                state['endpoints'][endpoint] = {
+                    'requests': 0,
+                    'samples': deque(maxlen=current_app.config['PROFILING_WINDOW'])
+                }
+            state['endpoints'][endpoint]['requests'] += 1
+            state['endpoints'][endpoint]['samples'].append(tuple(profile[name] for name in METRICS))
+
+    def stats(self) -> dict:
+        """Summary (mean, p50, p95, p99, max) of every metric and duration histogram per endpoint"""
+        state = self._state
+        with state['lock']:
+            endpoints = {endpoint: (data['requests'], list(data['samples']))
+                         for endpoint, data in state['endpoints'].items()}
+        data = {}
+        for endpoint, (requests, samples) in sorted(endpoints.items()):
+            columns = dict(zip(METRICS, zip(*samples)))
+            data[endpoint] = {
+                'requests': requests,
+                'window': len(samples),
+                **{name: _summarize(values) for name, values in columns.items()},
+                'histogram': _get_histogram(columns['duration'])
+            }
+        return {'enabled': current_app.config['PROFILING_ENABLED'], 'endpoints': data}
@@ -0,0 +1,64 @@
+import re
+from typing import List
+from flask_sqlalchemy import BaseQuery
+from sqlalchemy import DDL, desc, event, func, literal_column, text
+from sqlalchemy.sql import column, table
+
+from library_app.models import Book
+
+
+SEARCH_TERM_RE = re.compile(r'\w+')
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# SQLite - external content FTS5 table over books, kept in sync by triggers
+# (also for core inserts of bulk create / loader and batched purge deletes)
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5("
+    "title, description, content='books', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN "
+    "INSERT INTO books_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN "
+    "INSERT INTO books_fts(books_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, description ON books BEGIN "
+    "INSERT INTO books_fts(books_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO books_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END"
+]
+# MySQL - InnoDB maintains FULLTEXT indexes on every write
+MYSQL_SEARCH_DDL = ['ALTER TABLE books ADD FULLTEXT INDEX ix_books_title_description_fulltext (title, description)']
+
+books_fts = table('books_fts', column('rowid'))
+
+for statement in SQLITE_SEARCH_DDL:
+    event.listen(Book.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in MYSQL_SEARCH_DDL:
+    event.listen(Book.__table__, 'after_create', DDL(statement).execute_if(dialect='mysql'))
+event.listen(Book.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS books_fts').execute_if(dialect='sqlite'))
+
+
+def get_search_terms(search_query: str) -> List[str]:
+    """Words of the search query, operators and quotes of the full-text syntax are dropped"""
+    return SEARCH_TERM_RE.findall(search_query or '')
+
+
+def search_books(query: BaseQuery, terms: List[str]) -> BaseQuery:
+    """
+    Books matching all terms (as prefixes, "tolk" finds "Tolkien") in title or
+    description, the most relevant first - bm25 of the FTS5 table with title
+    matches weighted over description ones on SQLite, MATCH ... AGAINST score
+    of the FULLTEXT index on MySQL
+    """
+    dialect = query.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        rank = func.bm25(literal_column('books_fts'), TITLE_WEIGHT, DESCRIPTION_WEIGHT)
+        return query.join(books_fts, books_fts.c.rowid == Book.id) \
+            .filter(literal_column('books_fts').match(match)) \
+            .order_by(rank, Book.id)
+    if dialect == 'mysql':
+        match = ' '.join(f'+{term}*' for term in terms)
+        score = text('MATCH (books.title, books.description) AGAINST (:search_query IN BOOLEAN MODE)') \
+            .bindparams(search_query=match)
+        return query.filter(score).order_by(desc(score), Book.id)
+    raise NotImplementedError(f'Full-text search is not available for {dialect}')
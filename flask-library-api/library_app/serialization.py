@@ -0,0 +1,152 @@
+import csv
+import io
+import json
+from threading import Lock
+from typing import Any, Callable, Iterable, Iterator, Optional
+from flask import Response, current_app, stream_with_context
+from marshmallow import Schema, fields, missing
+
+from library_app.profiling import profile_section
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), default=str).encode()
+
+
+def _orjson_dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+
+
+JSON_PROVIDERS = {'json': _json_dumps}
+if orjson is not None:
+    JSON_PROVIDERS['orjson'] = _orjson_dumps
+
+
+def dumps(obj: Any) -> bytes:
+    """Serializes obj with JSON_PROVIDER from config (orjson when installed, json otherwise)"""
+    provider = current_app.config.get('JSON_PROVIDER') or ('orjson' if orjson is not None else 'json')
+    return JSON_PROVIDERS.get(provider, _json_dumps)(obj)
+
+
+def json_response(payload: dict, status: int = 200) -> Response:
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+_serializers = {}
+_serializers_lock = Lock()
+
+
+def _get_converter(field: fields.Field) -> Optional[Callable]:
+    field_type = type(field)
+    if field_type is fields.Integer:
+        return int
+    if field_type is fields.Float:
+        return float
+    if field_type in {fields.String, fields.Email}:
+        return str
+    if field_type is fields.Date and field.format not in {None, 'iso'}:
+        return lambda value: value.strftime(field.format)
+    if field_type in {fields.Date, fields.DateTime} and field.format in {None, 'iso'}:
+        return lambda value: value.isoformat()
+    if field_type is fields.Nested and not field.schema.many:
+        return compile_serializer(field.schema)
+    if field_type is fields.List and type(field.inner) is fields.Nested and not field.inner.schema.many:
+        nested_serializer = compile_serializer(field.inner.schema)
+        return lambda values: [nested_serializer(value) for value in values]
+    return None
+
+
+def _compile(schema: Schema) -> Callable[[Any], dict]:
+    getters = []
+    for field_name, field in schema.dump_fields.items():
+        getters.append((field.data_key or field_name, field.attribute or field_name, _get_converter(field), field))
+
+    def serialize(obj: Any) -> dict:
+        data = {}
+        for key, attribute, converter, field in getters:
+            if converter is None:
+                value = field.serialize(attribute, obj)
+                if value is missing:
+                    continue
+            else:
+                value = getattr(obj, attribute)
+                if value is not None:
+                    value = converter(value)
+            data[key] = value
+        return data
+
+    return serialize
+
+
+def compile_serializer(schema: Schema) -> Callable[[Any], dict]:
+    """
+    Returns object to dict serializer generated from the schema fields (respecting
+    only/exclude), it gives the same output as schema.dump without per-field dispatch
+    of marshmallow, unsupported field types are serialized by the field itself
+    """
+    only = frozenset(schema.only) if schema.only is not None else None
+    key = (type(schema), only, frozenset(schema.exclude))
+    serializer = _serializers.get(key)
+    if serializer is None:
+        serializer = _compile(schema)
+        with _serializers_lock:
+            _serializers[key] = serializer
+    return serializer
+
+
+def fast_dump(schema: Schema, obj: Any) -> Any:
+    serializer = compile_serializer(schema)
+    with profile_section('dump'):
+        if schema.many:
+            return [serializer(item) for item in obj]
+        return serializer(obj)
+
+
+EXPORT_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def _flatten(data: dict, prefix: str = '') -> dict:
+    row = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            row.update(_flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, list):
+            row[f'{prefix}{key}'] = dumps(value).decode()
+        else:
+            row[f'{prefix}{key}'] = value
+    return row
+
+
+def _ndjson_lines(serializer: Callable, items: Iterable) -> Iterator[bytes]:
+    for item in items:
+        yield dumps(serializer(item)) + b'\n'
+
+
+def _csv_lines(serializer: Callable, items: Iterable) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = None
+    for item in items:
+        row = _flatten(serializer(item))
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=sorted(row), extrasaction='ignore')
+            writer.writeheader()
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def stream_response(schema: Schema, items: Iterable, export_format: str) -> Response:
+    """
+    Streams items (typically iterate_keyset_batches) as NDJSON or CSV, one
+    object is serialized at a time so memory does not grow with the number
+    of rows, nested objects are flattened to dotted CSV columns
+    """
+    serializer = compile_serializer(schema)
+    lines = _csv_lines(serializer, items) if export_format == 'csv' else _ndjson_lines(serializer, items)
+    return Response(stream_with_context(lines), mimetype=EXPORT_MIMETYPES[export_format])
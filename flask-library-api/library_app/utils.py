@@ -1,15 +1,35 @@
+import base64
+import binascii
+import json
 import jwt
+import math
 import re
+import secrets
+from datetime import date, datetime
 from flask import request, url_for, current_app, abort
 from werkzeug.exceptions import UnsupportedMediaType
-from functools import wraps
-from typing import Tuple
+from functools import lru_cache, wraps
+from operator import eq, ge, gt, le, lt
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from flask_sqlalchemy import DefaultMeta, BaseQuery
+from marshmallow import Schema, fields
+from sqlalchemy import and_, or_, false, func, text, inspect, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload, load_only
+from sqlalchemy.orm.strategy_options import Load
 from sqlalchemy.orm.attributes import InstrumentedAttribute
 from sqlalchemy.sql.expression import BinaryExpression
 
+from library_app import db, count_cache, token_cache, token_denylist
+
 
 COMPARISON_OPERATORS_RE = re.compile(r'(.*)\[(gte|gt|lte|lt)\]')
+COMPARISON_OPERATORS = {'==': eq, 'gte': ge, 'gt': gt, 'lte': le, 'lt': lt}
+RESERVED_PARAMS = {'fields', 'sort', 'page', 'limit', 'cursor', 'count', 'format', 'q'}
+QUERY_PLAN_CACHE_SIZE = 256
+UNIQUE_VIOLATION_RE = re.compile(r"UNIQUE constraint failed: \w+\.(\w+)"
+                                 r"|Duplicate entry .* for key '(?:\w+\.)?(\w+)'"
+                                 r"|Key \((\w+)\)=")
 
 
 def validate_json_content_type(func):
@@ -22,26 +42,75 @@ def validate_json_content_type(func):
     return wrapper
 
 
+def decode_token(token: str) -> dict:
+    """Returns payload of the token, verified tokens are taken from token_cache"""
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, current_app.config.get('SECRET_KEY'), algorithms=['HS256'])
+        token_cache.set(token, payload)
+    return payload
+
+
+def get_token_payload() -> dict:
+    token = None
+    auth = request.headers.get('Authorization')
+    if auth and len(auth.split(' ')) == 2:
+        token = auth.split(' ')[1]
+    if token is None:
+        abort(401, description='Missing token. Please login or register.')
+
+    try:
+        payload = decode_token(token)
+    except jwt.ExpiredSignatureError:
+        abort(401, description='Expired token. Please login to get new token.')
+    except jwt.InvalidTokenError:
+        abort(401, description='Invalid token. Please login or register.')
+    if payload.get('type') == 'refresh':
+        abort(401, description='Invalid token. Please login or register.')
+    return payload
+
+
+def decode_refresh_token(token: str) -> dict:
+    """Returns payload of valid, not revoked refresh token or aborts with 401"""
+    try:
+        payload = jwt.decode(token, current_app.config.get('SECRET_KEY'), algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        abort(401, description='Expired refresh token. Please login to get new token.')
+    except jwt.InvalidTokenError:
+        abort(401, description='Invalid refresh token. Please login or register.')
+    if payload.get('type') != 'refresh' or 'jti' not in payload:
+        abort(401, description='Invalid refresh token. Please login or register.')
+    if payload['jti'] in token_denylist:
+        abort(401, description='Revoked refresh token. Please login to get new token.')
+    return payload
+
+
 def token_required(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        token = None
-        auth = request.headers.get('Authorization')
-        if auth:
-            token = auth.split(' ')[1]
-        if token is None:
-            abort(401, description='Missing token. Please login or register.')
-        
-        try:
-            payload = jwt.decode(token, current_app.config.get('SECRET_KEY'), algorithms=['HS256'])
-        except jwt.ExpiredSignatureError:
-            abort(401, description='Expired token. Please login to get new token.')
-        except jwt.InvalidTokenError:
-            abort(401, description='Invalid token. Please login or register.')
+        payload = get_token_payload()
         return func(payload['user_id'], *args, **kwargs)
     return wrapper
 
 
+def metrics_token_required(func):
+    """
+    Metrics are available with METRICS_TOKEN as bearer token (for scrapers),
+    or with a user token when METRICS_TOKEN is not set
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        metrics_token = current_app.config.get('METRICS_TOKEN')
+        if not metrics_token:
+            get_token_payload()
+            return func(*args, **kwargs)
+        auth = request.headers.get('Authorization', '')
+        if not secrets.compare_digest(auth, f'Bearer {metrics_token}'):
+            abort(401, description='Invalid metrics token.')
+        return func(*args, **kwargs)
+    return wrapper
+
+
 def get_schema_args(model: DefaultMeta) -> dict:
     schema_args = {'many': True}
     fields = request.args.get('fields')
@@ -50,64 +119,338 @@ def get_schema_args(model: DefaultMeta) -> dict:
     return schema_args
 
 
+@lru_cache(maxsize=QUERY_PLAN_CACHE_SIZE)
+def _compile_sort_plan(model: DefaultMeta, sort: str) -> Tuple[tuple, tuple]:
+    sort_keys = []
+    for key in sort.split(','):
+        desc = False
+        if key.startswith('-'):
+            key = key[1:]
+            desc = True
+        if key in model.__table__.columns:
+            sort_keys.append((getattr(model, key), desc))
+    order_by = tuple(column_attr.desc() if desc else column_attr for column_attr, desc in sort_keys)
+    return tuple(sort_keys), order_by
+
+
+def _get_sort_plan(model: DefaultMeta) -> Tuple[tuple, tuple]:
+    sort = request.args.get('sort')
+    return _compile_sort_plan(model, sort) if sort else ((), ())
+
+
+def _get_sort_keys(model: DefaultMeta) -> Tuple[Tuple[InstrumentedAttribute, bool], ...]:
+    return _get_sort_plan(model)[0]
+
+
+def apply_load_only(model: DefaultMeta, query: BaseQuery, schema_args: dict) -> BaseQuery:
+    """
+    Selects only the columns requested with fields parameter, primary and
+    foreign keys plus sort keys (needed for keyset cursors) are always loaded
+    """
+    if 'only' not in schema_args:
+        return query
+    column_names = set(schema_args['only'])
+    column_names.update(column.key for column in model.__table__.columns
+                        if column.primary_key or column.foreign_keys)
+    column_names.update(column_attr.key for column_attr, _ in _get_sort_keys(model))
+    return query.options(load_only(*column_names))
+
+
+def _get_loader_options(model: DefaultMeta, schema: Schema, parent: Load = None) -> List[Load]:
+    options = []
+    relationships = inspect(model).relationships
+    for field_name, field in schema.dump_fields.items():
+        attribute = field.attribute or field_name
+        if attribute not in relationships:
+            continue
+        if isinstance(field, fields.List):
+            field = field.inner
+        if not isinstance(field, fields.Nested):
+            continue
+        relationship = relationships[attribute]
+        # collections are loaded with one extra SELECT ... IN, many-to-one with a JOIN
+        if relationship.uselist:
+            loader = selectinload if parent is None else parent.selectinload
+        else:
+            loader = joinedload if parent is None else parent.joinedload
+        option = loader(getattr(model, attribute))
+        options.append(option)
+        options.extend(_get_loader_options(relationship.mapper.class_, field.schema, option))
+    return options
+
+
+def apply_eager_loading(model: DefaultMeta, query: BaseQuery, schema: Schema) -> BaseQuery:
+    """
+    Eager loads every relationship the schema is going to dump (respecting
+    only/exclude), so a page of results is dumped without lazy loads (N+1)
+    """
+    options = _get_loader_options(model, schema)
+    return query.options(*options) if options else query
+
+
 def apply_order(model: DefaultMeta, query: BaseQuery) -> BaseQuery:
-    sort_keys = request.args.get('sort')
-    if sort_keys:
-        for key in sort_keys.split(','):
-            desc = False
-            if key.startswith('-'):
-                key = key[1:]
-                desc = True
-            column_attr = getattr(model, key, None)
-            if column_attr is not None:
-                query = query.order_by(column_attr.desc()) if desc else query.order_by(column_attr)
-    return query
-
-
-def _get_filter_argument(column_name: InstrumentedAttribute, value: str, operator: str) -> BinaryExpression:
-    operator_mapping = {
-        '==': column_name == value,
-        'gte': column_name >= value,
-        'gt': column_name > value,
-        'lte': column_name <= value,
-        'lt': column_name < value
-    }
-    return operator_mapping[operator]
+    order_by = _get_sort_plan(model)[1]
+    return query.order_by(*order_by) if order_by else query
+
+
+@lru_cache(maxsize=QUERY_PLAN_CACHE_SIZE)
+def _compile_filter_plan(model: DefaultMeta, params: Tuple[str, ...]) -> Tuple[tuple, ...]:
+    """
+    Filter plan for the shape of the request (names and operators of filter
+    parameters) - (parameter, column name, bound parameter key, expression)
+    tuples, values are bound per request
+    """
+    plan = []
+    for param in params:
+        column_name, operator = param, '=='
+        match = COMPARISON_OPERATORS_RE.match(param)
+        if match is not None:
+            column_name, operator = match.groups()
+        if column_name in model.__table__.columns:
+            key = f'filter_{len(plan)}'
+            filter_argument = COMPARISON_OPERATORS[operator](getattr(model, column_name), bindparam(key))
+            plan.append((param, column_name, key, filter_argument))
+    return tuple(plan)
 
 
 def apply_filter(model: DefaultMeta, query: BaseQuery) -> BaseQuery:
-    for param, value in request.args.items():
-        if param not in {'fields', 'sort', 'page', 'limit'}:
-            operator = '=='
-            match = COMPARISON_OPERATORS_RE.match(param)
-            if match is not None:
-                param, operator = match.groups()                
-            column_attr = getattr(model, param, None)
-            if column_attr is not None:
-                value = model.additional_validation(param, value)
-                if value is None:
-                    continue
-                filter_argument = _get_filter_argument(column_attr, value, operator)
-                query = query.filter(filter_argument)
-    return query
+    # sorted, so the same filter set always builds the same WHERE clause
+    params = tuple(sorted(param for param in request.args if param not in RESERVED_PARAMS))
+    filter_arguments = []
+    values = {}
+    for param, column_name, key, filter_argument in _compile_filter_plan(model, params):
+        value = model.additional_validation(column_name, request.args[param])
+        if value is None:
+            continue
+        filter_arguments.append(filter_argument)
+        values[key] = value
+    return query.filter(*filter_arguments).params(**values) if filter_arguments else query
 
 
-def get_pagination(query: BaseQuery, func_name: str) -> Tuple[list, dict]:
-    page = request.args.get('page', 1, type=int)
+def _get_keyset_columns(model: DefaultMeta) -> List[Tuple[InstrumentedAttribute, bool]]:
+    columns = list(_get_sort_keys(model))
+    if not any(column_attr.key == 'id' for column_attr, _ in columns):
+        columns.append((model.id, False))
+    return columns
+
+
+def _encode_cursor(item: Any, columns: list, direction: str) -> str:
+    values = [getattr(item, column_attr.key) for column_attr, _ in columns]
+    data = json.dumps({'values': values, 'direction': direction}, default=str)
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def _decode_cursor(cursor: str, columns: list) -> Tuple[list, str]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        values, direction = data['values'], data['direction']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        abort(400, description='Invalid cursor')
+    if len(values) != len(columns) or direction not in {'next', 'prev'}:
+        abort(400, description='Invalid cursor')
+
+    decoded_values = []
+    for (column_attr, _), value in zip(columns, values):
+        python_type = column_attr.type.python_type
+        if value is not None and python_type is date:
+            value = date.fromisoformat(value)
+        elif value is not None and python_type is datetime:
+            value = datetime.fromisoformat(value)
+        decoded_values.append(value)
+    return decoded_values, direction
+
+
+def _get_seek_argument(column_attr: InstrumentedAttribute, value: Any, after: bool) -> BinaryExpression:
+    # NULLs are ordered before any other value (SQLite and MySQL behaviour)
+    if value is None:
+        return column_attr.isnot(None) if after else false()
+    if after:
+        return column_attr > value
+    return or_(column_attr < value, column_attr.is_(None))
+
+
+def _get_keyset_filter(columns: list, values: list, backwards: bool) -> BinaryExpression:
+    conditions = []
+    for index, ((column_attr, desc), value) in enumerate(zip(columns, values)):
+        equal_arguments = [
+            prev_column_attr.is_(None) if prev_value is None else prev_column_attr == prev_value
+            for (prev_column_attr, _), prev_value in zip(columns[:index], values[:index])
+        ]
+        seek_argument = _get_seek_argument(column_attr, value, after=desc == backwards)
+        conditions.append(and_(*equal_arguments, seek_argument))
+    return or_(*conditions)
+
+
+def get_keyset_pagination(query: BaseQuery, func_name: str) -> Tuple[list, dict]:
+    """
+    Keyset (cursor) pagination - seeks on the active sort keys plus id
+    instead of using OFFSET, and does not count the records
+    (example: cursor=<value of next_cursor>, empty cursor for the first page).
+    """
+    model = query.column_descriptions[0]['type']
     limit = request.args.get('limit', current_app.config.get('PER_PAGE', 5), type=int)
-    params = {key: value for key, value in request.args.items() if key != 'page'}
-    paginate_object = query.paginate(page, limit, False)
+    if limit < 1:  # an empty page without next_cursor would read as the end of the collection
+        abort(400, description='Limit must be a positive integer')
+    cursor = request.args.get('cursor')
+    params = {**request.view_args, **{key: value for key, value in request.args.items() if key not in {'page', 'cursor'}}}
+    columns = _get_keyset_columns(model)
+
+    direction = 'next'
+    if cursor:
+        values, direction = _decode_cursor(cursor, columns)
+        query = query.filter(_get_keyset_filter(columns, values, direction == 'prev'))
+
+    backwards = direction == 'prev'
+    ordering = [column_attr.desc() if desc != backwards else column_attr.asc()
+                for column_attr, desc in columns]
+    items = query.order_by(None).order_by(*ordering).limit(limit + 1).all()
+
+    has_more = len(items) > limit
+    items = items[:limit]
+    if backwards:
+        items.reverse()
 
     pagination = {
-        'total_pages': paginate_object.pages,
-        'total_records': paginate_object.total,
-        'current_page': url_for(func_name, page=page, **params)
+        'current_page': url_for(func_name, cursor=cursor or '', **params)
     }
 
-    if paginate_object.has_next:
+    has_next = has_more if not backwards else True
+    has_prev = has_more if backwards else bool(cursor)
+    if items and has_next:
+        next_cursor = _encode_cursor(items[-1], columns, 'next')
+        pagination['next_cursor'] = url_for(func_name, cursor=next_cursor, **params)
+    if items and has_prev:
+        prev_cursor = _encode_cursor(items[0], columns, 'prev')
+        pagination['prev_cursor'] = url_for(func_name, cursor=prev_cursor, **params)
+
+    return items, pagination
+
+
+def iterate_keyset_batches(query: BaseQuery, batch_size: int) -> Iterator[Any]:
+    """
+    All items of the query fetched in batches of batch_size seeking on the
+    active sort keys plus id (WHERE <keys> > <last item> ORDER BY <keys> LIMIT),
+    so every batch is a separate SELECT with its own eager loads - unlike
+    yield_per it works with selectinload on every driver.
+    """
+    model = query.column_descriptions[0]['type']
+    columns = _get_keyset_columns(model)
+    query = query.order_by(None).order_by(*[column_attr.desc() if desc else column_attr.asc()
+                                            for column_attr, desc in columns])
+    values = None
+    while True:
+        batch_query = query if values is None else query.filter(_get_keyset_filter(columns, values, False))
+        items = batch_query.limit(batch_size).all()
+        yield from items
+        if len(items) < batch_size:
+            return
+        values = [getattr(items[-1], column_attr.key) for column_attr, _ in columns]
+
+
+def _estimate_total_records(query: BaseQuery) -> int:
+    model = query.column_descriptions[0]['type']
+    bind = query.session.get_bind()
+    if bind.dialect.name == 'mysql':
+        total = query.session.execute(
+            text('SELECT TABLE_ROWS FROM information_schema.TABLES '
+                 'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name'),
+            {'table_name': model.__tablename__}
+        ).scalar()
+    else:
+        total = query.session.query(func.max(model.id)).scalar()
+    return total or 0
+
+
+def get_total_records(query: BaseQuery) -> Optional[int]:
+    """
+    Number of records matching the query according to count parameter:
+    exact - always run COUNT, estimate - any cached count or table statistics,
+    none - skip counting, by default counts cached for COUNT_CACHE_TTL seconds
+    """
+    count = request.args.get('count')
+    if count not in {None, 'exact', 'estimate', 'none'}:
+        abort(400, description='Allowed count values: exact, estimate, none')
+    if count == 'none':
+        return None
+
+    key = count_cache.make_key(query)
+    total = None
+    if count == 'estimate':
+        total = count_cache.get(key)
+        if total is None and query.whereclause is None:
+            return _estimate_total_records(query)
+    elif count is None:
+        total = count_cache.get(key, ttl=current_app.config.get('COUNT_CACHE_TTL', 60))
+
+    if total is None:
+        total = query.order_by(None).count()
+        count_cache.set(key, query, total)
+    return total
+
+
+def get_export_format() -> str:
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in {'ndjson', 'csv'}:
+        abort(400, description='Allowed export formats: ndjson, csv')
+    return export_format
+
+
+def get_pagination(query: BaseQuery, func_name: str) -> Tuple[list, dict]:
+    if 'cursor' in request.args:
+        return get_keyset_pagination(query, func_name)
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    limit = request.args.get('limit', current_app.config.get('PER_PAGE', 5), type=int)
+    if limit < 0:
+        limit = 20
+    params = {**request.view_args, **{key: value for key, value in request.args.items() if key != 'page'}}
+    total = get_total_records(query)
+
+    if total is None:
+        items = query.limit(limit + 1).offset((page - 1) * limit).all()
+        has_next = len(items) > limit
+        items = items[:limit]
+        pagination = {}
+    else:
+        items = query.limit(limit).offset((page - 1) * limit).all()
+        total_pages = math.ceil(total / limit) if limit else 0
+        has_next = page < total_pages
+        pagination = {
+            'total_pages': total_pages,
+            'total_records': total
+        }
+
+    pagination['current_page'] = url_for(func_name, page=page, **params)
+    if has_next:
         pagination['next_page'] = url_for(func_name, page=page+1, **params)
-    if paginate_object.has_prev:
+    if page > 1:
         pagination['previous_page'] = url_for(func_name, page=page-1, **params)
     
-    return paginate_object.items, pagination
+    return items, pagination
+
+
+def get_unique_violation(exc: IntegrityError) -> Optional[str]:
+    """Column (or unique index) named in the unique violation message of SQLite, MySQL or PostgreSQL"""
+    match = UNIQUE_VIOLATION_RE.search(str(exc.orig))
+    if match is None:
+        return None
+    return next(group for group in match.groups() if group)
+
 
+def commit_or_conflict(messages: Dict[str, str]):
+    """
+    Commits the session relying on unique constraints instead of looking for
+    duplicates before the write (one round trip, no race between check and
+    insert). Violation of a unique column from messages aborts with 409 and
+    the column's message, other integrity errors are raised.
+    """
+    try:
+        db.session.commit()
+    except IntegrityError as exc:
+        db.session.rollback()
+        violation = get_unique_violation(exc)
+        if violation is not None:
+            for column_name, message in messages.items():
+                if violation == column_name or violation.endswith(f'_{column_name}'):
+                    abort(409, description=message)
+        raise
@@ -0,0 +1,55 @@
+"""books full text search
+
+Revision ID: 5a9c17e4f0b2
+Revises: e81f03c6d5a7
+Create Date: 2026-10-18 12:05:37.914620
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a9c17e4f0b2'
+down_revision = 'e81f03c6d5a7'
+branch_labels = None
+depends_on = None
+
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5("
+    "title, description, content='books', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN "
+    "INSERT INTO books_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN "
+    "INSERT INTO books_fts(books_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, description ON books BEGIN "
+    "INSERT INTO books_fts(books_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO books_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "INSERT INTO books_fts(books_fts) VALUES ('rebuild')"
+]
+SQLITE_DOWNGRADE = [
+    'DROP TRIGGER IF EXISTS books_fts_update',
+    'DROP TRIGGER IF EXISTS books_fts_delete',
+    'DROP TRIGGER IF EXISTS books_fts_insert',
+    'DROP TABLE IF EXISTS books_fts'
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+    elif dialect == 'mysql':
+        op.create_index('ix_books_title_description_fulltext', 'books', ['title', 'description'], unique=False,
+                        mysql_prefix='FULLTEXT')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_DOWNGRADE:
+            op.execute(statement)
+    elif dialect == 'mysql':
+        op.drop_index('ix_books_title_description_fulltext', table_name='books')
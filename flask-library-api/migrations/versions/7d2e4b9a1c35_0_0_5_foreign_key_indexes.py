@@ -0,0 +1,28 @@
+"""foreign key indexes
+
+Revision ID: 7d2e4b9a1c35
+Revises: 02c75cdf3eeb
+Create Date: 2026-10-18 10:12:41.508214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2e4b9a1c35'
+down_revision = '02c75cdf3eeb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_books_author_id'), 'books', ['author_id'], unique=False)
+
+
+def downgrade():
+    # InnoDB dropped its implicit foreign key index when ix_books_author_id was
+    # created and refuses to drop the last index of a foreign key column
+    if op.get_bind().dialect.name == 'mysql':
+        op.create_index('author_id', 'books', ['author_id'], unique=False)
+    op.drop_index(op.f('ix_books_author_id'), table_name='books')
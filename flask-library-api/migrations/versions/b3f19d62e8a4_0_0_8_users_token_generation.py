@@ -0,0 +1,24 @@
+"""users token generation
+
+Revision ID: b3f19d62e8a4
+Revises: 5a9c17e4f0b2
+Create Date: 2026-10-18 22:14:06.381527
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f19d62e8a4'
+down_revision = '5a9c17e4f0b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('token_generation', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('users', 'token_generation')
@@ -1,4 +1,10 @@
 import pytest
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+from library_app import token_cache, token_denylist, password_hasher
+from library_app.models import User
 
 
 def test_registration(client):
@@ -87,6 +93,37 @@ def test_registration_already_used_email(client, user):
     assert 'token' not in response_data
 
 
+def test_registration_concurrent_requests(app):
+    clients = 8
+    barrier = Barrier(clients)
+
+    def register(number: int):
+        client = app.test_client()
+        barrier.wait()
+        response = client.post('/api/v1/auth/register',
+                               json={'username': 'racer', 'password': '1234567', 'email': f'racer{number}@o2.pl'})
+        return response.status_code, response.get_json()
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(register, range(clients)))
+
+    assert sorted(status_code for status_code, _ in results) == [201] + [409] * (clients - 1)
+    assert {data['message'] for status_code, data in results if status_code == 409} == \
+        {'User with username racer already exists'}
+    with app.app_context():
+        assert User.query.filter(User.username == 'racer').count() == 1
+
+
+def test_registration_statements_count(client, sql_statements):
+    sql_statements.clear()
+    response = client.post('/api/v1/auth/register',
+                           json={'username': 'gz', 'password': '1234567', 'email': 'gz@o2.pl'})
+
+    assert response.status_code == 201
+    # no duplicate probes before the insert, the select reloads the committed user for its token
+    assert sql_statements[0].startswith('INSERT')
+
+
 def test_get_current_user(client, user, token):
     response = client.get('/api/v1/auth/me',
                             headers={
@@ -111,3 +148,158 @@ def test_get_current_user_missing_token(client):
     assert response.headers['Content-Type'] == 'application/json'
     assert response_data['success'] is False
     assert 'data' not in response_data    
+
+
+def test_token_cache(app, client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    with app.app_context():
+        token_cache.invalidate()
+        stats = token_cache.stats()
+
+    for _ in range(3):
+        response = client.get('/api/v1/auth/me', headers=headers)
+        assert response.status_code == 200
+
+    with app.app_context():
+        assert token_cache.stats() == {
+            'hits': stats['hits'] + 2,
+            'misses': stats['misses'] + 1,
+            'size': 1
+        }
+        token_cache.invalidate(token)
+        assert token_cache.stats()['size'] == 0
+
+
+def test_token_cache_expired_token(app, client, token):
+    with app.app_context():
+        payload = token_cache.get(token) or {'user_id': 1}
+        token_cache.set(token, {**payload, 'exp': time.time() - 1})
+        assert token_cache.get(token) is None
+
+
+def test_token_cache_invalid_token(client, token):
+    response = client.get('/api/v1/auth/me', headers={'Authorization': f'Bearer {token}x'})
+    response_data = response.get_json()
+
+    assert response.status_code == 401
+    assert response_data['message'] == 'Invalid token. Please login or register.'
+
+
+def test_login_rehash_password(app, client, user):
+    app.config['PASSWORD_HASH_WORK_FACTOR'] = 2000
+    response = client.post('/api/v1/auth/login', json={'username': user['username'], 'password': user['password']})
+
+    assert response.status_code == 200
+    with app.app_context():
+        assert User.query.first().password.startswith('pbkdf2:sha256:2000$')
+
+    response = client.post('/api/v1/auth/login', json={'username': user['username'], 'password': user['password']})
+    assert response.status_code == 200
+
+
+def test_login_scrypt(app, client, user):
+    app.config['PASSWORD_HASH_ALGORITHM'] = 'scrypt'
+    app.config['PASSWORD_HASH_WORK_FACTOR'] = 1024
+    client.post('/api/v1/auth/login', json={'username': user['username'], 'password': user['password']})
+
+    with app.app_context():
+        assert User.query.first().password.startswith('scrypt:1024:8:1$')
+
+    response = client.post('/api/v1/auth/login', json={'username': user['username'], 'password': 'invalid'})
+    assert response.status_code == 401
+    response = client.post('/api/v1/auth/login', json={'username': user['username'], 'password': user['password']})
+    assert response.status_code == 200
+
+
+def test_password_hashing_process_pool(app, client, user):
+    app.config['PASSWORD_HASH_WORKERS'] = 1
+    try:
+        response = client.post('/api/v1/auth/login', json={'username': user['username'], 'password': user['password']})
+        assert response.status_code == 200
+        with app.app_context():
+            assert app.extensions['password_hasher']['executor'] is not None
+    finally:
+        with app.app_context():
+            password_hasher.shutdown()
+
+
+@pytest.fixture
+def refresh_token(client, user):
+    response = client.post('/api/v1/auth/login', json={'username': user['username'], 'password': user['password']})
+    return response.get_json()['refresh_token']
+
+
+def test_refresh_token(client, refresh_token):
+    response = client.post('/api/v1/auth/token/refresh', json={'refresh_token': refresh_token})
+    response_data = response.get_json()
+
+    assert response.status_code == 200
+    assert response_data['refresh_token'] != refresh_token
+    response = client.get('/api/v1/auth/me', headers={'Authorization': f'Bearer {response_data["token"]}'})
+    assert response.status_code == 200
+
+    response = client.post('/api/v1/auth/token/refresh', json={'refresh_token': refresh_token})
+    assert response.status_code == 401
+    assert response.get_json()['message'] == 'Revoked refresh token. Please login to get new token.'
+
+    response = client.post('/api/v1/auth/token/refresh', json={'refresh_token': response_data['refresh_token']})
+    assert response.status_code == 200
+
+
+def test_refresh_token_not_accepted_as_access_token(client, refresh_token):
+    response = client.get('/api/v1/auth/me', headers={'Authorization': f'Bearer {refresh_token}'})
+
+    assert response.status_code == 401
+
+
+def test_access_token_not_accepted_as_refresh_token(client, token):
+    response = client.post('/api/v1/auth/token/refresh', json={'refresh_token': token})
+
+    assert response.status_code == 401
+    assert response.get_json()['message'] == 'Invalid refresh token. Please login or register.'
+
+
+def test_revoke_refresh_token(client, refresh_token):
+    response = client.post('/api/v1/auth/token/revoke', json={'refresh_token': refresh_token})
+    assert response.status_code == 200
+
+    response = client.post('/api/v1/auth/token/refresh', json={'refresh_token': refresh_token})
+    assert response.status_code == 401
+
+
+def test_password_update_revokes_refresh_tokens(client, user, refresh_token):
+    response = client.post('/api/v1/auth/login', json={'username': user['username'], 'password': user['password']})
+    headers = {'Authorization': f'Bearer {response.get_json()["token"]}'}
+
+    response = client.put('/api/v1/auth/update/password', headers=headers,
+                          json={'current_password': user['password'], 'new_password': '7654321'})
+    assert response.status_code == 200
+
+    response = client.post('/api/v1/auth/token/refresh', json={'refresh_token': refresh_token})
+    assert response.status_code == 401
+    assert response.get_json()['message'] == 'Revoked refresh token. Please login to get new token.'
+
+    response = client.post('/api/v1/auth/login', json={'username': user['username'], 'password': '7654321'})
+    response = client.post('/api/v1/auth/token/refresh', json={'refresh_token': response.get_json()['refresh_token']})
+    assert response.status_code == 200
+
+
+def test_token_denylist_sqlite(app, client, refresh_token, tmp_path):
+    app.config['TOKEN_DENYLIST_DATABASE'] = str(tmp_path / 'denylist.db')
+    token_denylist.init_app(app)
+
+    response = client.post('/api/v1/auth/token/refresh', json={'refresh_token': refresh_token})
+    assert response.status_code == 200
+    response = client.post('/api/v1/auth/token/refresh', json={'refresh_token': refresh_token})
+    assert response.status_code == 401
+    with app.app_context():
+        assert len(token_denylist) == 1
+
+
+def test_token_denylist_memory_warning(app, caplog):
+    token_denylist.init_app(app)
+    assert 'TOKEN_DENYLIST_DATABASE' not in caplog.text
+
+    app.debug = app.testing = False
+    token_denylist.init_app(app)
+    assert 'TOKEN_DENYLIST_DATABASE' in caplog.text
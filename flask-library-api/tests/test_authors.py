@@ -1,4 +1,10 @@
+import json
 import pytest
+from datetime import date
+
+from config import DevelopmentConfig
+from library_app import create_app, db
+from library_app.models import Author, AuthorSchema, Book
 
 
 def test_get_authors_no_records(client):
@@ -159,3 +165,128 @@ def test_create_author_missing_token(client, author):
     assert response.headers['Content-Type'] == 'application/json'
     assert response_data['success'] is False
     assert 'data' not in response_data
+
+
+def test_get_authors_statements_count(client, books, sql_statements):
+    sql_statements.clear()
+    response = client.get('/api/v1/authors?count=exact')
+    response_data = response.get_json()
+
+    assert len(response_data['data'][0]['books']) == 7
+    assert len(sql_statements) == 3
+
+
+def test_get_authors_fast_serialization(app, client, books):
+    response = client.get('/api/v1/authors')
+    response_data = response.get_json()
+
+    with app.app_context():
+        expected_data = AuthorSchema(many=True).dump(Author.query.all())
+
+    assert response.status_code == 200
+    assert response_data['data'] == expected_data
+
+
+def test_export_authors_with_books(app, client, books):
+    app.config['EXPORT_CHUNK_SIZE'] = 1
+    response = client.get('/api/v1/authors/export')
+    items = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.status_code == 200
+    assert len(items) == 1
+    assert len(items[0]['books']) == 7
+
+
+def test_get_authors_stats(client, token, books):
+    client.post('/api/v1/authors', headers={'Authorization': f'Bearer {token}'},
+                json={'first_name': 'A', 'last_name': 'B', 'birth_date': '01-01-1950'})
+
+    response = client.get('/api/v1/authors/stats?sort=-number_of_books')
+    response_data = response.get_json()
+
+    assert response.status_code == 200
+    assert response_data['data'] == [
+        {'id': 1, 'first_name': 'G', 'last_name': 'Z', 'number_of_books': 7, 'total_pages': 707,
+         'average_pages': 101.0},
+        {'id': 2, 'first_name': 'A', 'last_name': 'B', 'number_of_books': 0, 'total_pages': 0,
+         'average_pages': None}
+    ]
+    assert response_data['pagination']['total_records'] == 2
+
+
+@pytest.mark.parametrize('query_string, expected_ids', [
+    ('number_of_books[gte]=1', [1]),
+    ('total_pages[lt]=10', [2]),
+    ('average_pages[gt]=100.5&last_name=Z', [1]),
+    ('number_of_books=abc', [1, 2])
+])
+def test_get_authors_stats_filter(client, token, books, query_string, expected_ids):
+    client.post('/api/v1/authors', headers={'Authorization': f'Bearer {token}'},
+                json={'first_name': 'A', 'last_name': 'B', 'birth_date': '01-01-1950'})
+
+    response = client.get(f'/api/v1/authors/stats?{query_string}&sort=id&fields=id')
+
+    assert [item['id'] for item in response.get_json()['data']] == expected_ids
+
+
+def test_get_authors_stats_cached_until_books_change(client, token, book, books, sql_statements):
+    client.get('/api/v1/authors/stats')
+    client.get('/api/v1/authors/1/stats')
+    sql_statements.clear()
+
+    assert client.get('/api/v1/authors/stats').get_json()['data'][0]['number_of_books'] == 7
+    assert client.get('/api/v1/authors/1/stats').get_json()['data']['number_of_books'] == 7
+    assert sql_statements == []
+
+    client.post('/api/v1/authors/1/books', headers={'Authorization': f'Bearer {token}'},
+                json={**book, 'isbn': 9999999999999, 'number_of_pages': 300})
+
+    assert client.get('/api/v1/authors/stats').get_json()['data'][0]['number_of_books'] == 8
+    assert client.get('/api/v1/authors/1/stats').get_json()['data']['total_pages'] == 1007
+
+
+def test_get_authors_stats_cached_with_default_config(monkeypatch, tmp_path):
+    monkeypatch.setattr(DevelopmentConfig, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{tmp_path / "dev.db"}')
+    monkeypatch.setattr(DevelopmentConfig, 'RESPONSE_CACHE_DATABASE', str(tmp_path / 'response_cache.db'))
+    monkeypatch.setattr(DevelopmentConfig, 'REPLICA_STICKY_DATABASE', str(tmp_path / 'replica_sticky.db'))
+    app = create_app('development')
+    assert not app.config['RESPONSE_CACHE_ENABLED']
+    with app.app_context():
+        db.create_all()
+        db.session.add(Author(first_name='A', last_name='B', birth_date=date(1950, 1, 1)))
+        db.session.commit()
+    client = app.test_client()
+
+    assert client.get('/api/v1/authors/stats').headers['X-Cache'] == 'MISS'
+    assert client.get('/api/v1/authors/stats').headers['X-Cache'] == 'HIT'
+    assert client.get('/api/v1/authors/1/stats').headers['X-Cache'] == 'MISS'
+    assert 'X-Cache' not in client.get('/api/v1/authors').headers
+
+    with app.app_context():
+        db.session.add(Book(title='first', isbn=1212121212121, number_of_pages=100, author_id=1))
+        db.session.commit()
+
+    response = client.get('/api/v1/authors/stats')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['data'][0]['number_of_books'] == 1
+    assert client.get('/api/v1/authors/1/stats').get_json()['data']['number_of_books'] == 1
+
+
+def test_get_author_stats_not_found(client):
+    response = client.get('/api/v1/authors/5/stats')
+
+    assert response.status_code == 404
+    assert response.get_json()['success'] is False
+
+
+def test_get_author_response_cache_invalidated_by_books(client, token, author, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/api/v1/authors', json=author, headers=headers)
+    assert client.get('/api/v1/authors/1').get_json()['data']['books'] == []
+    assert client.get('/api/v1/authors/1').headers['X-Cache'] == 'HIT'
+
+    client.post('/api/v1/authors/1/books', json=book, headers=headers)
+
+    response = client.get('/api/v1/authors/1')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert [item['title'] for item in response.get_json()['data']['books']] == ['testbook']
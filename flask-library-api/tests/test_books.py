@@ -1,5 +1,9 @@
+import json
 import pytest
 
+from library_app.books import books as books_views
+from library_app.models import Book, BookSchema
+
 
 def test_get_books_no_data(client):
     response = client.get('/api/v1/books')
@@ -201,3 +205,445 @@ def test_create_book_missing_field(client, token, author, data, missing_field):
     assert 'data' not in response_data
     assert missing_field in response_data['message']
     assert 'Missing data for required field.' in response_data['message'][missing_field]
+
+
+def test_get_books_cursor(client, books):
+    response = client.get('/api/v1/books?cursor=&limit=3&fields=id')
+    response_data = response.get_json()
+
+    assert response.status_code == 200
+    assert response_data['data'] == [{'id': 1}, {'id': 2}, {'id': 3}]
+    assert response_data['number_of_records'] == 3
+    assert 'total_records' not in response_data['pagination']
+    assert 'prev_cursor' not in response_data['pagination']
+
+    response = client.get(response_data['pagination']['next_cursor'])
+    response_data = response.get_json()
+
+    assert response.status_code == 200
+    assert response_data['data'] == [{'id': 4}, {'id': 5}, {'id': 6}]
+
+    response = client.get(response_data['pagination']['next_cursor'])
+    response_data = response.get_json()
+
+    assert response_data['data'] == [{'id': 7}]
+    assert 'next_cursor' not in response_data['pagination']
+
+    response = client.get(response_data['pagination']['prev_cursor'])
+    response_data = response.get_json()
+
+    assert response_data['data'] == [{'id': 4}, {'id': 5}, {'id': 6}]
+    assert 'next_cursor' in response_data['pagination']
+    assert 'prev_cursor' in response_data['pagination']
+
+
+def test_get_books_cursor_with_sort(client, books):
+    ids = []
+    url = '/api/v1/books?cursor=&limit=2&fields=id&sort=-number_of_pages'
+    while url:
+        response_data = client.get(url).get_json()
+        ids.extend(item['id'] for item in response_data['data'])
+        url = response_data['pagination'].get('next_cursor')
+
+    assert ids == [2, 5, 1, 4, 7, 3, 6]
+
+
+@pytest.mark.parametrize('url', ['/api/v1/books?cursor=&limit=0', '/api/v1/books?cursor=&limit=-1',
+                                 '/api/v1/authors/1/books?cursor=&limit=0'])
+def test_get_books_cursor_invalid_limit(client, books, url):
+    response = client.get(url)
+    response_data = response.get_json()
+
+    assert response.status_code == 400
+    assert response_data['success'] is False
+    assert response_data['message'] == 'Limit must be a positive integer'
+
+
+def test_get_books_invalid_cursor(client, books):
+    response = client.get('/api/v1/books?cursor=invalid')
+    response_data = response.get_json()
+
+    assert response.status_code == 400
+    assert response_data['success'] is False
+    assert response_data['message'] == 'Invalid cursor'
+
+
+def test_get_books_count_none(client, books):
+    response = client.get('/api/v1/books?count=none&limit=3&page=2')
+    response_data = response.get_json()
+
+    assert response.status_code == 200
+    assert response_data['number_of_records'] == 3
+    assert response_data['pagination'] == {
+        'current_page': '/api/v1/books?page=2&count=none&limit=3',
+        'next_page': '/api/v1/books?page=3&count=none&limit=3',
+        'previous_page': '/api/v1/books?page=1&count=none&limit=3'
+    }
+
+
+@pytest.mark.parametrize('count', ['exact', 'estimate'])
+def test_get_books_count(client, books, count):
+    response = client.get(f'/api/v1/books?count={count}')
+    response_data = response.get_json()
+
+    assert response.status_code == 200
+    assert response_data['pagination']['total_records'] == 7
+    assert response_data['pagination']['total_pages'] == 2
+
+
+def test_get_books_count_invalid(client, books):
+    response = client.get('/api/v1/books?count=invalid')
+    response_data = response.get_json()
+
+    assert response.status_code == 400
+    assert response_data['success'] is False
+
+
+def test_get_books_count_cache_invalidation(client, token, books, book):
+    response = client.get('/api/v1/books?number_of_pages[gte]=101')
+    assert response.get_json()['pagination']['total_records'] == 5
+
+    client.post('/api/v1/authors/1/books',
+                json={**book, 'isbn': book['isbn'] + 100, 'number_of_pages': 200},
+                headers={
+                    'Authorization': f'Bearer {token}'
+                })
+
+    response = client.get('/api/v1/books?number_of_pages[gte]=101')
+    assert response.get_json()['pagination']['total_records'] == 6
+
+    client.delete('/api/v1/books/8',
+                  headers={
+                      'Authorization': f'Bearer {token}'
+                  })
+
+    response = client.get('/api/v1/books?number_of_pages[gte]=101')
+    assert response.get_json()['pagination']['total_records'] == 5
+
+
+@pytest.mark.parametrize('limit', [1, 7])
+def test_get_books_statements_count(client, books, sql_statements, limit):
+    sql_statements.clear()
+    response = client.get(f'/api/v1/books?limit={limit}&count=exact')
+    response_data = response.get_json()
+
+    assert response_data['number_of_records'] == limit
+    assert all(item['author']['id'] == 1 for item in response_data['data'])
+    assert len(sql_statements) == 2
+
+
+def test_get_books_fields_load_only(client, books, sql_statements):
+    sql_statements.clear()
+    response = client.get('/api/v1/books?fields=id,title&count=none')
+    response_data = response.get_json()
+
+    assert response_data['data'][0] == {'id': 1, 'title': 'testbook1'}
+    assert len(sql_statements) == 1
+    assert 'books.title' in sql_statements[0]
+    assert 'books.author_id' in sql_statements[0]
+    assert 'books.description' not in sql_statements[0]
+    assert 'books.isbn' not in sql_statements[0]
+
+
+def test_get_books_filter_values(client, books):
+    for number_of_pages, total_records in [(100, 2), (101, 3), (102, 2), (100, 2)]:
+        response = client.get(f'/api/v1/books?number_of_pages={number_of_pages}')
+        response_data = response.get_json()
+
+        assert response_data['pagination']['total_records'] == total_records
+        assert all(item['number_of_pages'] == number_of_pages for item in response_data['data'])
+
+
+@pytest.mark.parametrize('provider', ['json', 'orjson'])
+def test_get_books_fast_serialization(app, client, books, provider):
+    app.config['JSON_PROVIDER'] = provider
+    response = client.get('/api/v1/books?limit=10')
+    response_data = response.get_json()
+
+    with app.app_context():
+        expected_data = BookSchema(many=True).dump(Book.query.all())
+
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'application/json'
+    assert response_data['data'] == expected_data
+    assert response_data['number_of_records'] == 7
+
+
+def test_create_books_bulk(client, token, author, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/api/v1/authors', json=author, headers=headers)
+    client.post('/api/v1/authors/1/books', json=book, headers=headers)
+    payload = [
+        {**book, 'isbn': book['isbn'] + 1},
+        book,
+        {**book, 'isbn': book['isbn'] + 2, 'title': None},
+        {**book, 'isbn': book['isbn'] + 1},
+        {'title': 'nodescription', 'isbn': book['isbn'] + 3, 'number_of_pages': 10}
+    ]
+    response = client.post('/api/v1/authors/1/books/bulk', json=payload, headers=headers)
+    response_data = response.get_json()
+
+    assert response.status_code == 207
+    assert response_data['number_of_records'] == 2
+    assert [item['status'] for item in response_data['data']] == [201, 409, 400, 409, 201]
+    assert 'title' in response_data['data'][2]['message']
+
+    response = client.get(f'/api/v1/books/{response_data["data"][0]["id"]}')
+    assert response.get_json()['data']['isbn'] == book['isbn'] + 1
+    assert response.get_json()['data']['author']['id'] == 1
+    response = client.get('/api/v1/books?count=exact')
+    assert response.get_json()['pagination']['total_records'] == 3
+
+
+def test_create_books_bulk_ndjson(client, token, author, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/api/v1/authors', json=author, headers=headers)
+    lines = [json.dumps({**book, 'isbn': book['isbn'] + n}) for n in range(3)]
+    response = client.post('/api/v1/authors/1/books/bulk',
+                            data='\n'.join(lines) + '\n',
+                            content_type='application/x-ndjson',
+                            headers=headers)
+    response_data = response.get_json()
+
+    assert response.status_code == 201
+    assert response_data['number_of_records'] == 3
+    assert len({item['id'] for item in response_data['data']}) == 3
+
+
+def test_create_books_bulk_concurrent_insert(monkeypatch, client, token, author, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/api/v1/authors', json=author, headers=headers)
+    client.post('/api/v1/authors/1/books', json=book, headers=headers)
+    get_existing_isbns = books_views._get_existing_isbns
+    calls = []
+
+    def missing_concurrent_insert(isbns, chunk_size):
+        calls.append(isbns)
+        return set() if len(calls) == 1 else get_existing_isbns(isbns, chunk_size)
+
+    monkeypatch.setattr(books_views, '_get_existing_isbns', missing_concurrent_insert)
+    response = client.post('/api/v1/authors/1/books/bulk', json=[book, {**book, 'isbn': book['isbn'] + 1}],
+                           headers=headers)
+    response_data = response.get_json()
+
+    assert response.status_code == 207
+    assert [item['status'] for item in response_data['data']] == [409, 201]
+    assert len(calls) == 2
+
+
+def test_create_books_bulk_all_failed(client, token, author, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/api/v1/authors', json=author, headers=headers)
+    client.post('/api/v1/authors/1/books', json=book, headers=headers)
+
+    response = client.post('/api/v1/authors/1/books/bulk', json=[book, book], headers=headers)
+    assert response.status_code == 409
+    assert response.get_json()['success'] is False
+    assert response.get_json()['number_of_records'] == 0
+
+    response = client.post('/api/v1/authors/1/books/bulk', json=[book, {**book, 'title': None}], headers=headers)
+    assert response.status_code == 400
+    assert [item['status'] for item in response.get_json()['data']] == [409, 400]
+
+
+def test_create_books_bulk_ndjson_too_many(app, client, token, author, book):
+    app.config['BULK_MAX_ITEMS'] = 2
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/api/v1/authors', json=author, headers=headers)
+    lines = [json.dumps({**book, 'isbn': book['isbn'] + n}) for n in range(3)]
+    response = client.post('/api/v1/authors/1/books/bulk', data='\n'.join(lines), content_type='application/x-ndjson',
+                           headers=headers)
+
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Maximum number of books in one request is 2'
+
+
+def test_create_books_bulk_invalid_payload(client, token, author, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/api/v1/authors', json=author, headers=headers)
+    response = client.post('/api/v1/authors/1/books/bulk', json=book, headers=headers)
+    assert response.status_code == 400
+
+    response = client.post('/api/v1/authors/1/books/bulk', data='text', headers=headers)
+    assert response.status_code == 415
+
+    response = client.post('/api/v1/authors/2/books/bulk', json=[book], headers=headers)
+    assert response.status_code == 404
+
+
+def test_export_books_ndjson(app, client, books):
+    app.config['EXPORT_CHUNK_SIZE'] = 2
+    response = client.get('/api/v1/books/export?number_of_pages=101')
+    lines = response.get_data(as_text=True).splitlines()
+    items = [json.loads(line) for line in lines]
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert [item['id'] for item in items] == [1, 4, 7]
+    assert items[0]['author']['id'] == 1
+
+
+def test_export_books_csv(client, books):
+    response = client.get('/api/v1/books/export?format=csv&fields=id,title&sort=-id')
+    lines = response.get_data(as_text=True).splitlines()
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert lines[0] == 'id,title'
+    assert len(lines) == 8
+    assert lines[1].startswith('7,')
+
+
+def test_export_books_keyset_batches(app, client, books, sql_statements):
+    app.config['EXPORT_CHUNK_SIZE'] = 2
+    sql_statements.clear()
+    response = client.get('/api/v1/books/export?sort=-number_of_pages')
+    items = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert [item['id'] for item in items] == [2, 5, 1, 4, 7, 3, 6]
+    assert all(item['author']['id'] == 1 for item in items)
+    assert len([statement for statement in sql_statements if statement.startswith('SELECT books.')]) == 4
+
+
+def test_export_books_invalid_format(client, books):
+    response = client.get('/api/v1/books/export?format=xml')
+
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Allowed export formats: ndjson, csv'
+
+
+def test_search_books_ranked(client, token, author, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/api/v1/authors', json=author, headers=headers)
+    for number, (title, description) in enumerate([('Dragons', 'A hobbit meets dragons'),
+                                                    ('The Hobbit', 'There and back again'),
+                                                    ('Silmarillion', 'Elves and dragons')]):
+        client.post('/api/v1/authors/1/books', headers=headers,
+                    json={**book, 'title': title, 'description': description, 'isbn': book['isbn'] + number})
+
+    response = client.get('/api/v1/books/search?q=hobb&fields=title')
+    response_data = response.get_json()
+
+    assert response.status_code == 200
+    assert response_data['data'] == [{'title': 'The Hobbit'}, {'title': 'Dragons'}]
+    assert response_data['pagination']['total_records'] == 2
+
+    response = client.get('/api/v1/books/search?q=dragons+elves&fields=title')
+    assert response.get_json()['data'] == [{'title': 'Silmarillion'}]
+
+
+def test_search_books_pagination(client, books):
+    response = client.get('/api/v1/books/search?q=testdescription&limit=5&page=2')
+    response_data = response.get_json()
+
+    assert response.status_code == 200
+    assert response_data['number_of_records'] == 2
+    assert response_data['pagination']['total_records'] == 7
+    assert 'q=testdescription' in response_data['pagination']['previous_page']
+
+
+def test_search_books_index_follows_writes(client, token, books):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.put('/api/v1/books/1', headers=headers, json={**books[0], 'title': 'renamed'})
+    client.delete('/api/v1/books/2', headers=headers)
+
+    assert [item['id'] for item in client.get('/api/v1/books/search?q=renamed').get_json()['data']] == [1]
+    assert client.get('/api/v1/books/search?q=testbook1').get_json()['data'] == []
+    assert client.get('/api/v1/books/search?q=testbook2').get_json()['data'] == []
+    assert client.get('/api/v1/books/search?q=testbook3').get_json()['number_of_records'] == 1
+
+
+@pytest.mark.parametrize('query_string', ['', 'q=', 'q=%22*()', 'q=book&cursor=x'])
+def test_search_books_invalid_query(client, query_string):
+    response = client.get(f'/api/v1/books/search?{query_string}')
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_get_all_author_books_paginated(client, books):
+    response = client.get('/api/v1/authors/1/books?limit=3&page=2&sort=-title&fields=title')
+    response_data = response.get_json()
+
+    assert response.status_code == 200
+    assert response_data['data'] == [{'title': 'testbook4'}, {'title': 'testbook3'}, {'title': 'testbook2'}]
+    assert response_data['pagination']['total_records'] == 7
+    assert response_data['pagination']['next_page'].startswith('/api/v1/authors/1/books?page=3')
+
+
+def test_get_all_author_books_filtered(client, books):
+    response = client.get('/api/v1/authors/1/books?number_of_pages=100&fields=id,author_id')
+    response_data = response.get_json()
+
+    assert response.status_code == 200
+    assert response_data['data'] == [{'id': 3}, {'id': 6}]
+    assert response_data['number_of_records'] == 2
+
+
+def test_get_all_author_books_keyset(client, books):
+    response = client.get('/api/v1/authors/1/books?cursor=&limit=4&sort=-number_of_pages')
+    first_page = response.get_json()
+    response = client.get(first_page['pagination']['next_cursor'])
+    second_page = response.get_json()
+
+    ids = [item['id'] for item in first_page['data'] + second_page['data']]
+    assert ids == [2, 5, 1, 4, 7, 3, 6]
+    assert 'next_cursor' not in second_page['pagination']
+
+
+def test_get_all_author_books_author_not_found(client):
+    response = client.get('/api/v1/authors/5/books')
+
+    assert response.status_code == 404
+    assert response.get_json()['success'] is False
+
+
+def test_get_books_response_cache(client, token, books, book, sql_statements):
+    response = client.get('/api/v1/books?sort=-id&limit=3')
+    assert response.headers['X-Cache'] == 'MISS'
+    sql_statements.clear()
+
+    response = client.get('/api/v1/books?limit=3&sort=-id')
+    assert response.headers['X-Cache'] == 'HIT'
+    assert [item['title'] for item in response.get_json()['data']] == ['testbook7', 'testbook6', 'testbook5']
+    assert sql_statements == []
+
+    client.post('/api/v1/authors/1/books', headers={'Authorization': f'Bearer {token}'},
+                json={**book, 'title': 'newbook', 'isbn': 9999999999999})
+
+    response = client.get('/api/v1/books?sort=-id&limit=3')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['data'][0]['title'] == 'newbook'
+
+
+def test_get_book_response_cache_invalidated(client, token, books, book):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.get('/api/v1/books/1')
+    assert client.get('/api/v1/books/1').headers['X-Cache'] == 'HIT'
+
+    client.put('/api/v1/books/1', json={**book, 'title': 'changed', 'isbn': 9999999999999}, headers=headers)
+    response = client.get('/api/v1/books/1')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['data']['title'] == 'changed'
+
+    client.delete('/api/v1/books/1', headers=headers)
+    assert client.get('/api/v1/books/1').status_code == 404
+
+
+def test_get_books_response_cache_invalidated_by_bulk_create(client, token, books, book):
+    client.get('/api/v1/books?count=exact')
+    client.post('/api/v1/authors/1/books/bulk', json=[{**book, 'isbn': 9999999999999}],
+                headers={'Authorization': f'Bearer {token}'})
+
+    response = client.get('/api/v1/books?count=exact')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['pagination']['total_records'] == 8
+
+
+def test_get_books_response_cache_not_stored_on_failed_write(client, token, books, book):
+    client.get('/api/v1/books/1')
+    response = client.post('/api/v1/authors/1/books', json={**book, 'isbn': book['isbn'] + 1},
+                           headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == 409
+    assert client.get('/api/v1/books/1').headers['X-Cache'] == 'HIT'
@@ -0,0 +1,137 @@
+import json
+from datetime import date
+
+from library_app import db
+from library_app.commands import loaders
+from library_app.commands.db_manage_commands import SAMPLES_DIR, explain, load, remove_data
+from library_app.commands.explain import explain_shapes, get_query_shapes
+from library_app.commands.purge import get_purge_order
+from library_app.models import Author, Book
+
+
+def test_load_json_array_streaming(app, monkeypatch):
+    monkeypatch.setattr(loaders, 'READ_SIZE', 16)
+    rows = list(loaders.read_rows(str(SAMPLES_DIR / 'authors.json')))
+
+    with open(SAMPLES_DIR / 'authors.json') as file:
+        assert rows == json.load(file)
+
+
+def test_load_authors_and_books(app, tmp_path):
+    authors_path = tmp_path / 'authors.ndjson'
+    authors_path.write_text('\n'.join([
+        json.dumps({'first_name': 'G', 'last_name': 'Z', 'birth_date': '22-11-1977'}),
+        json.dumps({'first_name': 'A', 'last_name': 'B', 'birth_date': '01-01-1950', 'id': 5}),
+        json.dumps({'first_name': 'X'})
+    ]))
+    books_path = tmp_path / 'books.csv'
+    books_path.write_text('\n'.join([
+        'author.first_name,author.last_name,author_id,isbn,number_of_pages,title',
+        'A,B,,1212121212121,100,first',
+        'G,Z,5,1212121212122,100,second',
+        'G,Z,5,1212121212122,100,duplicate',
+        ',,1,1212121212123,100,bare author id',
+        'Q,W,,1212121212124,100,unknown author'
+    ]))
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(load, ['authors', str(authors_path), '--chunk-size', '2'])
+    assert 'rows/s' in result.output
+    assert '2 rows inserted, 1 rejected' in result.output
+    result = runner.invoke(load, ['books', str(books_path)])
+    assert '2 rows inserted, 3 rejected' in result.output
+
+    with app.app_context():
+        assert Author.query.count() == 2
+        assert {(book.title, book.author_id) for book in Book.query} == {('first', 2), ('second', 1)}
+    assert not (tmp_path / 'books.csv.checkpoint').exists()
+
+
+def test_load_preserved_author_ids(app, tmp_path):
+    authors_path = tmp_path / 'authors.ndjson'
+    authors_path.write_text('\n'.join([
+        json.dumps({'id': 7, 'first_name': 'G', 'last_name': 'Z', 'birth_date': '22-11-1977'}),
+        json.dumps({'id': 8, 'first_name': 'A', 'last_name': 'B', 'birth_date': '01-01-1950'})
+    ]))
+    books_path = tmp_path / 'books.ndjson'
+    books_path.write_text('\n'.join([
+        json.dumps({'title': 'first', 'isbn': 1212121212121, 'number_of_pages': 100, 'author_id': 7}),
+        json.dumps({'title': 'second', 'isbn': 1212121212122, 'number_of_pages': 100, 'author_id': 8})
+    ]))
+    with app.app_context():
+        db.session.add(Author(id=8, first_name='X', last_name='Y', birth_date=date(1990, 1, 1)))
+        db.session.commit()
+        author_ids = set()
+
+        assert loaders.load_file(str(authors_path), 'authors', preserved_author_ids=author_ids)['inserted'] == 1
+        assert loaders.load_file(str(books_path), 'books', preserved_author_ids=author_ids)['inserted'] == 1
+        assert author_ids == {7}
+        assert [(book.title, book.author.first_name) for book in Book.query] == [('first', 'G')]
+
+
+def test_load_resume_from_checkpoint(app, tmp_path):
+    authors_path = tmp_path / 'authors.ndjson'
+    authors_path.write_text('\n'.join(
+        json.dumps({'first_name': f'G{n}', 'last_name': 'Z', 'birth_date': '22-11-1977'}) for n in range(5)
+    ))
+    checkpoint_path = tmp_path / 'authors.checkpoint'
+    checkpoint_path.write_text(json.dumps({'path': str(authors_path), 'model': 'authors', 'rows': 3}))
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(load, ['authors', str(authors_path), '--checkpoint', str(checkpoint_path)])
+
+    assert '2 rows inserted' in result.output
+    with app.app_context():
+        assert [author.first_name for author in Author.query.order_by(Author.id)] == ['G3', 'G4']
+    assert not checkpoint_path.exists()
+
+
+def test_purge_order(app):
+    with app.app_context():
+        assert [table.name for table in get_purge_order(['authors', 'books'])] == ['books', 'authors']
+
+
+def test_remove_data_dry_run(app, books):
+    runner = app.test_cli_runner()
+    result = runner.invoke(remove_data, ['--dry-run'])
+
+    assert 'books: 7 rows' in result.output
+    assert 'authors: 1 rows' in result.output
+    assert 'Dry run, data would be removed with delete' in result.output
+    with app.app_context():
+        assert Book.query.count() == 7
+
+
+def test_remove_data(app, client, token, books, author):
+    runner = app.test_cli_runner()
+    result = runner.invoke(remove_data, ['--batch-size', '2'])
+
+    assert 'Data has been removed from database (delete)' in result.output
+    with app.app_context():
+        assert Book.query.count() == 0
+        assert Author.query.count() == 0
+
+    response = client.post('/api/v1/authors', json=author, headers={'Authorization': f'Bearer {token}'})
+    assert response.get_json()['data']['id'] == 1
+
+
+def test_explain_query_shapes_use_indexes(app):
+    assert {'author_id=1', 'number_of_pages[gte]=1', 'sort=title'} <= set(get_query_shapes(Book))
+    assert 'description=x' not in get_query_shapes(Book)
+
+    with app.app_context():
+        report = explain_shapes(Book, ['author_id=1', 'number_of_pages[gte]=1&sort=number_of_pages', 'sort=-title',
+                                       'description=x'])
+
+    assert [full_scan for _, _, full_scan in report] == [False, False, False, True]
+    assert 'ix_books_author_id' in report[0][1][0]
+
+
+def test_explain_command(app):
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(explain, ['--model', 'authors', '--query', 'last_name=x', '--query', 'sort=first_name'])
+
+    assert '      ok  /authors?last_name=x' in result.output
+    assert 'FULL SCAN  /authors?sort=first_name' in result.output
+    assert '1 of 2 query shapes scan the whole table or sort without index' in result.output
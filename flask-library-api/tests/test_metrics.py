@@ -0,0 +1,231 @@
+import re
+import pytest
+from sqlalchemy.pool import QueuePool
+
+from config import DevelopmentConfig, TestingConfig
+from library_app import create_app, db
+from library_app.commands.db_manage_commands import add_data
+
+
+@pytest.fixture
+def pooled_app(monkeypatch):
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_ENGINE_OPTIONS', {
+        'poolclass': QueuePool,
+        'pool_size': 1,
+        'max_overflow': 0,
+        'pool_timeout': 0.1
+    })
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+
+    yield app
+
+    with app.app_context():
+        db.engine.dispose()
+    app.config['DB_FILE_PATH'].unlink()
+
+
+@pytest.fixture
+def profiled_app(monkeypatch):
+    monkeypatch.setattr(TestingConfig, 'PROFILING_ENABLED', True)
+    app = create_app('testing')
+    app.config['METRICS_TOKEN'] = 'metrics-secret'
+    with app.app_context():
+        db.create_all()
+
+    yield app
+
+    app.config['DB_FILE_PATH'].unlink()
+
+
+def test_get_metrics_missing_token(client):
+    response = client.get('/api/v1/metrics')
+
+    assert response.status_code == 401
+
+
+def test_get_metrics_with_user_token(client, token):
+    response = client.get('/api/v1/metrics', headers={'Authorization': f'Bearer {token}'})
+    data = response.get_json()['data']['pool']
+
+    assert response.status_code == 200
+    assert data['checkouts'] >= 1
+    assert data['checked_out'] == 0
+
+
+def test_get_metrics_with_metrics_token(app, client):
+    app.config['METRICS_TOKEN'] = 'metrics-secret'
+    response = client.get('/api/v1/metrics', headers={'Authorization': 'Bearer wrong'})
+    assert response.status_code == 401
+
+    response = client.get('/api/v1/metrics', headers={'Authorization': 'Bearer metrics-secret'})
+    assert response.status_code == 200
+    assert response.get_json()['data']['pool']['pool']['class'] == 'NullPool'
+
+
+def test_get_metrics_pool(pooled_app):
+    client = pooled_app.test_client()
+    pooled_app.config['METRICS_TOKEN'] = 'metrics-secret'
+    headers = {'Authorization': 'Bearer metrics-secret'}
+    client.get('/api/v1/books')
+    client.get('/api/v1/books')
+
+    response = client.get('/api/v1/metrics', headers=headers)
+    pool = response.get_json()['data']['pool']
+
+    assert pool['pool']['class'] == 'QueuePool'
+    assert pool['pool']['size'] == 1
+    assert pool['checked_out'] == 0
+    assert pool['checkouts'] == pool['checkins'] >= 2
+    assert pool['connects'] == 1
+
+
+def test_pool_options_skipped_for_sqlite(monkeypatch, tmp_path):
+    monkeypatch.setattr(DevelopmentConfig, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{tmp_path / "dev.db"}')
+    monkeypatch.setattr(DevelopmentConfig, 'RESPONSE_CACHE_DATABASE', str(tmp_path / 'response_cache.db'))
+    app = create_app('development')
+
+    with app.app_context():
+        assert type(db.engine.pool).__name__ == 'NullPool'
+        assert db.session.execute('SELECT 1').scalar() == 1
+    assert app.extensions['pool_metrics']['connects'] == 1
+
+
+def test_pool_timeout(pooled_app):
+    client = pooled_app.test_client()
+    pooled_app.config['METRICS_TOKEN'] = 'metrics-secret'
+    with pooled_app.app_context():
+        connection = db.engine.connect()
+        response = client.get('/api/v1/books')
+        connection.close()
+
+    assert response.status_code == 503
+    assert response.get_json()['message'] == 'Database is busy, please try again later'
+
+    response = client.get('/api/v1/metrics', headers={'Authorization': 'Bearer metrics-secret'})
+    assert response.get_json()['data']['pool']['timeouts'] == 1
+
+
+def test_server_timing_disabled_by_default(client):
+    response = client.get('/api/v1/books')
+
+    assert response.status_code == 200
+    assert 'Server-Timing' not in response.headers
+
+
+def test_server_timing(profiled_app):
+    client = profiled_app.test_client()
+    response = client.get('/api/v1/books')
+    server_timing = response.headers['Server-Timing']
+
+    assert response.status_code == 200
+    assert re.fullmatch(r'app;dur=[\d.]+, sql;dur=[\d.]+;desc="[1-9]\d* queries", dump;dur=[\d.]+', server_timing)
+
+
+def test_server_timing_replica_engine_created_lazily(monkeypatch, tmp_path):
+    monkeypatch.setattr(TestingConfig, 'PROFILING_ENABLED', True)
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_REPLICA_URIS', [f'sqlite:///{tmp_path / "replica.db"}'])
+    app = create_app('testing')
+    assert app.extensions['replicas']['engines'] == {}
+    with app.app_context():
+        db.create_all()
+        db.Model.metadata.create_all(bind=db.get_engine(app, bind='replica_0'))
+
+    response = app.test_client().get('/api/v1/books')
+
+    assert re.search(r'sql;dur=[\d.]+;desc="[1-9]\d* queries"', response.headers['Server-Timing'])
+    app.config['DB_FILE_PATH'].unlink()
+
+
+def test_get_request_metrics(profiled_app):
+    profiled_app.test_cli_runner().invoke(add_data)
+    client = profiled_app.test_client()
+    headers = {'Authorization': 'Bearer metrics-secret'}
+    for _ in range(3):
+        client.get('/api/v1/books')
+    client.get('/api/v1/authors/1')
+
+    response = client.get('/api/v1/metrics/requests', headers=headers)
+    data = response.get_json()['data']
+    books = data['endpoints']['books.get_books']
+
+    assert response.status_code == 200
+    assert data['enabled'] is True
+    assert books['requests'] == books['window'] == 3
+    assert books['sql_count']['max'] >= 1
+    assert books['size']['mean'] > 0
+    assert books['duration']['p50'] <= books['duration']['p99'] <= books['duration']['max']
+    assert sum(books['histogram'].values()) == 3
+    assert data['endpoints']['authors.get_author']['requests'] == 1
+
+
+def test_get_request_metrics_window(profiled_app):
+    profiled_app.config['PROFILING_WINDOW'] = 2
+    client = profiled_app.test_client()
+    for _ in range(5):
+        client.get('/api/v1/books')
+
+    response = client.get('/api/v1/metrics/requests', headers={'Authorization': 'Bearer metrics-secret'})
+    books = response.get_json()['data']['endpoints']['books.get_books']
+
+    assert books['requests'] == 5
+    assert books['window'] == 2
+
+
+def test_get_request_metrics_missing_token(profiled_app):
+    response = profiled_app.test_client().get('/api/v1/metrics/requests')
+
+    assert response.status_code == 401
+
+
+def test_get_metrics_response_cache(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    for _ in range(3):
+        client.get('/api/v1/books')
+    client.get('/api/v1/authors')
+
+    response = client.get('/api/v1/metrics', headers=headers)
+    data = response.get_json()['data']['response_cache']
+
+    assert data['backend'] == 'memory'
+    assert data['hits'] == 2
+    assert data['misses'] == 2
+    assert data['hit_ratio'] == 0.5
+    assert data['size'] == 2
+    assert data['endpoints']['books.get_books'] == {'hits': 2, 'misses': 1, 'hit_ratio': 0.667}
+
+
+def test_response_cache_sqlite_backend(monkeypatch, tmp_path, author):
+    monkeypatch.setattr(TestingConfig, 'RESPONSE_CACHE_BACKEND', 'sqlite')
+    monkeypatch.setattr(TestingConfig, 'RESPONSE_CACHE_DATABASE', str(tmp_path / 'response_cache.db'))
+    worker_1, worker_2 = create_app('testing'), create_app('testing')
+    with worker_1.app_context():
+        db.create_all()
+
+    assert worker_1.test_client().get('/api/v1/authors').headers['X-Cache'] == 'MISS'
+    response = worker_2.test_client().get('/api/v1/authors')
+    assert response.headers['X-Cache'] == 'HIT'
+    assert response.get_json()['data'] == []
+    worker_1.test_client().get('/api/v1/authors/stats')
+
+    client = worker_2.test_client()
+    client.post('/api/v1/auth/register', json={'username': 'gz', 'password': '1234567', 'email': 'gz@o2.pl'})
+    token = client.post('/api/v1/auth/login', json={'username': 'gz', 'password': '1234567'}).get_json()['token']
+    client.post('/api/v1/authors', json=author, headers={'Authorization': f'Bearer {token}'})
+
+    response = worker_1.test_client().get('/api/v1/authors')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert len(response.get_json()['data']) == 1
+    response = worker_1.test_client().get('/api/v1/authors/stats')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['data'][0]['number_of_books'] == 0
+
+    worker_1.config['DB_FILE_PATH'].unlink()
+
+
+def test_response_cache_unsupported_backend(monkeypatch):
+    monkeypatch.setattr(TestingConfig, 'RESPONSE_CACHE_BACKEND', 'redis')
+
+    with pytest.raises(ValueError):
+        create_app('testing')
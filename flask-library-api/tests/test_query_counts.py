@@ -0,0 +1,56 @@
+from datetime import date
+
+from library_app import db
+from library_app.models import Author, Book
+
+
+def add_author(number: int) -> Author:
+    author = Author(first_name=f'First{number}', last_name=f'Last{number}', birth_date=date(1950, 1, 1))
+    db.session.add(author)
+    return author
+
+
+def add_book(number: int, author: Author) -> Book:
+    book = Book(title=f'Hobbit {number}', isbn=9780000000000 + number, number_of_pages=100 + number,
+                description='Adventure', author=author)
+    db.session.add(book)
+    return book
+
+
+def test_get_books_query_count(assert_no_n_plus_one):
+    def seed(numbers):
+        for number in numbers:
+            add_book(number, add_author(number))
+
+    assert_no_n_plus_one('/api/v1/books?limit=100', seed)
+
+
+def test_get_authors_query_count(assert_no_n_plus_one):
+    def seed(numbers):
+        for number in numbers:
+            author = add_author(number)
+            add_book(number * 2, author)
+            add_book(number * 2 + 1, author)
+
+    assert_no_n_plus_one('/api/v1/authors?limit=100', seed)
+
+
+def test_get_all_author_books_query_count(app, assert_no_n_plus_one):
+    with app.app_context():
+        add_author(0)
+        db.session.commit()
+
+    def seed(numbers):
+        author = Author.query.get(1)
+        for number in numbers:
+            add_book(number, author)
+
+    assert_no_n_plus_one('/api/v1/authors/1/books?limit=100', seed)
+
+
+def test_search_books_query_count(assert_no_n_plus_one):
+    def seed(numbers):
+        for number in numbers:
+            add_book(number, add_author(number))
+
+    assert_no_n_plus_one('/api/v1/books/search?q=hobbit&limit=100', seed)
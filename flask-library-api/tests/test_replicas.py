@@ -0,0 +1,75 @@
+import pytest
+
+from config import TestingConfig
+from library_app import create_app, db
+from library_app.replicas import StickyWrites
+
+
+@pytest.fixture
+def replica_app(monkeypatch, tmp_path):
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_REPLICA_URIS', [f'sqlite:///{tmp_path / "replica.db"}'])
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.Model.metadata.create_all(bind=db.get_engine(app, bind='replica_0'))
+
+    yield app
+
+    app.config['DB_FILE_PATH'].unlink()
+
+
+def test_reads_from_replica(replica_app, author):
+    client = replica_app.test_client()
+    client.post('/api/v1/auth/register', json={'username': 'gz', 'password': '1234567', 'email': 'gz@o2.pl'})
+    response = client.post('/api/v1/auth/login', json={'username': 'gz', 'password': '1234567'})
+    token = response.get_json()['token']
+
+    response = client.post('/api/v1/authors', json=author, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 201
+    assert 'read_primary_until' in response.headers['Set-Cookie']
+
+    response = client.get('/api/v1/authors?count=exact')
+    assert response.get_json()['number_of_records'] == 1
+
+    response = replica_app.test_client().get('/api/v1/authors?count=exact')
+    assert response.get_json()['number_of_records'] == 0
+
+
+def test_no_sticky_cookie_without_replicas(client, token, author):
+    response = client.post('/api/v1/authors', json=author, headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == 201
+    assert 'Set-Cookie' not in response.headers
+
+
+def test_replica_response_not_cached_after_write(replica_app, author):
+    client = replica_app.test_client()
+    client.post('/api/v1/auth/register', json={'username': 'gz', 'password': '1234567', 'email': 'gz@o2.pl'})
+    token = client.post('/api/v1/auth/login', json={'username': 'gz', 'password': '1234567'}).get_json()['token']
+    client.post('/api/v1/authors', json=author, headers={'Authorization': f'Bearer {token}'})
+
+    other_client = replica_app.test_client()
+    assert other_client.get('/api/v1/authors').headers['X-Cache'] == 'MISS'
+    assert other_client.get('/api/v1/authors').headers['X-Cache'] == 'MISS'
+
+    replica_app.config['REPLICA_STICKY_SECONDS'] = 0
+    assert other_client.get('/api/v1/authors').headers['X-Cache'] == 'MISS'
+    assert other_client.get('/api/v1/authors').headers['X-Cache'] == 'HIT'
+
+
+@pytest.mark.parametrize('sticky_database', [False, True])
+def test_reads_from_primary_after_write_of_token_user(tmp_path, replica_app, author, sticky_database):
+    if sticky_database:
+        replica_app.config['REPLICA_STICKY_DATABASE'] = str(tmp_path / 'sticky.db')
+        replica_app.extensions['replicas']['sticky_writes'] = StickyWrites(replica_app)
+    client = replica_app.test_client()
+    client.post('/api/v1/auth/register', json={'username': 'gz', 'password': '1234567', 'email': 'gz@o2.pl'})
+    token = client.post('/api/v1/auth/login', json={'username': 'gz', 'password': '1234567'}).get_json()['token']
+    client.post('/api/v1/authors', json=author, headers={'Authorization': f'Bearer {token}'})
+
+    client_without_cookies = replica_app.test_client(use_cookies=False)
+    response = client_without_cookies.get('/api/v1/authors?count=exact', headers={'Authorization': f'Bearer {token}'})
+    assert response.get_json()['number_of_records'] == 1
+
+    response = client_without_cookies.get('/api/v1/authors?count=exact')
+    assert response.get_json()['number_of_records'] == 0
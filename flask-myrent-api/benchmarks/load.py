@@ -0,0 +1,331 @@
+"""
+Load benchmark of the API on a synthetic dataset: landlords with their flats,
+tenants, agreements (one per flat) and monthly settlements are generated with
+seeded random values into SQLite (the file is reused by later runs with the
+same sizes and seed), then concurrent workers request every endpoint through
+the Flask test client or a local WSGI server (--server), endpoints requiring
+login use tokens of a few landlords. Latency percentiles and throughput of
+every endpoint are printed as JSON, --baseline compares them with a previous
+report.
+
+Run from the flask-myrent-api directory:
+python -m benchmarks.load --landlords 50000 --output report.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from threading import Thread
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from werkzeug.serving import make_server
+
+from config import TestingConfig, config
+from myrent_app import create_app, db, password_hasher
+from myrent_app.models import Landlord, Flat, Tenant, Agreement, Settlement
+
+
+SEED = 2020
+CHUNK_SIZE = 1000
+PER_PAGE = 20
+MAX_PAGE = 50
+TOKEN_LANDLORDS = 16
+FIRST_NAMES = ['Anna', 'Jan', 'Maria', 'Piotr', 'Ewa', 'Tomasz', 'Katarzyna', 'Marek', 'Olga', 'Adam']
+LAST_NAMES = ['Nowak', 'Kowalski', 'Wiśniewski', 'Wójcik', 'Kamińska', 'Lewandowski', 'Zielińska', 'Szymański']
+STREETS = ['Długa', 'Krótka', 'Polna', 'Leśna', 'Słoneczna', 'Ogrodowa', 'Lipowa', 'Kwiatowa']
+ENDPOINTS = {
+    'flats': ('/api/v1/flats?limit={limit}&page={page}', False),
+    'flat': ('/api/v1/flats/{flat_id}', False),
+    'landlords': ('/api/v1/landlords?limit={limit}&page={page}', False),
+    'landlords_sorted': ('/api/v1/landlords?sort=last_name,first_name&limit={limit}&page={page}', False),
+    'landlord': ('/api/v1/landlords/{landlord_id}', False),
+    'landlord_flats': ('/api/v1/landlords/{landlord_id}/flats?limit={limit}', False),
+    'tenants': ('/api/v1/tenants?limit={limit}', True),
+    'agreements': ('/api/v1/agreements', True),
+    'settlements': ('/api/v1/settlements', True),
+    'agreement_settlements': ('/api/v1/agreements/{agreement_id}/settlements?limit={limit}', True),
+}
+
+
+def percentile(values: list, percent: int) -> float:
+    """Inclusive method interpolates between measured values, so p99 never exceeds max"""
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1] if len(values) > 1 else values[0]
+
+
+def _person(rng: random.Random, kind: str, number: int, password: str) -> dict:
+    return {
+        'id': number,
+        'identifier': f'{kind}{number}',
+        'email': f'{kind}{number}@example.com',
+        'first_name': rng.choice(FIRST_NAMES),
+        'last_name': rng.choice(LAST_NAMES),
+        'phone': f'{rng.randrange(10 ** 9):09d}',
+        'address': f'{rng.choice(STREETS)} {rng.randint(1, 200)}',
+        'password': password
+    }
+
+
+def generate_rows(rng: random.Random, start: int, stop: int, dataset: dict, password: str) -> Dict[str, List[dict]]:
+    """
+    Rows of landlords start..stop-1 and everything they own - ids are derived
+    from the landlord id, so endpoints can be requested without looking them up
+    """
+    flats_per_landlord, tenants_per_landlord = dataset['flats_per_landlord'], dataset['tenants_per_landlord']
+    rows = {'landlords': [], 'flats': [], 'tenants': [], 'agreements': [], 'settlements': []}
+    for landlord_id in range(start, stop):
+        rows['landlords'].append(_person(rng, 'landlord', landlord_id, password))
+        for number in range(tenants_per_landlord):
+            tenant_id = (landlord_id - 1) * tenants_per_landlord + number + 1
+            rows['tenants'].append({**_person(rng, 'tenant', tenant_id, password), 'landlord_id': landlord_id})
+        for number in range(flats_per_landlord):
+            flat_id = (landlord_id - 1) * flats_per_landlord + number + 1
+            date_from = date(2020, 1, 1) + timedelta(days=rng.randrange(365))
+            rows['flats'].append({
+                'id': flat_id,
+                'identifier': f'flat{flat_id}',
+                'address': f'{rng.choice(STREETS)} {rng.randint(1, 200)}/{rng.randint(1, 50)}',
+                'status': 'active',
+                'landlord_id': landlord_id
+            })
+            rows['agreements'].append({
+                'id': flat_id,
+                'identifier': f'agreement{flat_id}',
+                'sign_date': date_from,
+                'date_from': date_from,
+                'date_to': date_from + timedelta(days=365),
+                'price_value': rng.randint(10, 50) * 100,
+                'price_period': 'month',
+                'payment_deadline': 10,
+                'deposit_value': 0,
+                'flat_id': flat_id,
+                'tenant_id': (landlord_id - 1) * tenants_per_landlord + number % tenants_per_landlord + 1
+            })
+            for month in range(dataset['settlements_per_agreement']):
+                rows['settlements'].append({
+                    'id': (flat_id - 1) * dataset['settlements_per_agreement'] + month + 1,
+                    'type': 'charge' if month % 2 == 0 else 'payment',
+                    'value': rows['agreements'][-1]['price_value'],
+                    'date': date_from + timedelta(days=30 * (month // 2)),
+                    'agreement_id': flat_id
+                })
+    return rows
+
+
+def generate_dataset(dataset: dict):
+    """Inserts the dataset in one transaction with core executemany"""
+    rng = random.Random(dataset['seed'])
+    password = password_hasher.hash('password')
+    tables = [Landlord, Tenant, Flat, Agreement, Settlement]
+    with db.engine.begin() as connection:
+        for start in range(1, dataset['landlords'] + 1, CHUNK_SIZE):
+            rows = generate_rows(rng, start, min(start + CHUNK_SIZE, dataset['landlords'] + 1), dataset, password)
+            for model in tables:
+                connection.execute(model.__table__.insert(), rows[model.__tablename__])
+
+
+def create_benchmark_app(database: Path, response_cache: bool):
+    class BenchmarkConfig(TestingConfig):
+        SECRET_KEY = TestingConfig.SECRET_KEY or 'benchmark'
+        DB_FILE_PATH = database
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{database}'
+        RESPONSE_CACHE_ENABLED = response_cache
+        DEBUG = False
+        TESTING = False
+
+    config['benchmark'] = BenchmarkConfig
+    return create_app('benchmark')
+
+
+def prepare_database(app, dataset: dict, regenerate: bool):
+    database = app.config['DB_FILE_PATH']
+    if database.exists() and not regenerate:
+        print(f'Using dataset {database}', file=sys.stderr)
+        return
+    if database.exists():
+        database.unlink()
+    started_at = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        generate_dataset(dataset)
+    print(f'Generated dataset {database} in {time.perf_counter() - started_at:.1f} s', file=sys.stderr)
+
+
+def get_tokens(app, dataset: dict, rng: random.Random) -> Dict[int, str]:
+    """JWT of TOKEN_LANDLORDS random landlords, endpoints requiring login are requested with them"""
+    landlord_ids = rng.sample(range(1, dataset['landlords'] + 1), min(TOKEN_LANDLORDS, dataset['landlords']))
+    with app.app_context():
+        return {landlord.id: landlord.generate_jwt().decode()
+                for landlord in Landlord.query.filter(Landlord.id.in_(landlord_ids))}
+
+
+def get_urls(endpoint: Tuple[str, bool], dataset: dict, tokens: Dict[int, str], rng: random.Random,
+             number: int) -> List[Tuple[str, dict]]:
+    template, login_required = endpoint
+    urls = []
+    for _ in range(number):
+        if login_required:
+            landlord_id = rng.choice(list(tokens))
+            headers = {'Authorization': f'Bearer {tokens[landlord_id]}'}
+        else:
+            landlord_id = rng.randint(1, dataset['landlords'])
+            headers = {}
+        flat_id = (landlord_id - 1) * dataset['flats_per_landlord'] + rng.randint(1, dataset['flats_per_landlord'])
+        url = template.format(
+            limit=PER_PAGE,
+            page=rng.randint(1, max(1, min(MAX_PAGE, dataset['landlords'] // PER_PAGE))),
+            landlord_id=landlord_id,
+            flat_id=flat_id,
+            agreement_id=flat_id
+        )
+        urls.append((url, headers))
+    return urls
+
+
+def get_sender(app, server_url: Optional[str] = None) -> Callable[[], Callable[[str, dict], int]]:
+    """Factory of per worker functions sending GET request and returning status code"""
+    def test_client_sender():
+        client = app.test_client()
+        return lambda url, headers: client.get(url, headers=headers).status_code
+
+    def http_sender():
+        def send(url: str, headers: dict) -> int:
+            try:
+                with urlopen(Request(server_url + url, headers=headers)) as response:
+                    response.read()
+                    return response.status
+            except HTTPError as error:
+                return error.code
+        return send
+
+    return http_sender if server_url else test_client_sender
+
+
+def run_endpoint(new_sender: Callable, urls: List[Tuple[str, dict]], workers: int) -> dict:
+    def work(worker_urls: List[Tuple[str, dict]]) -> Tuple[List[float], int]:
+        send = new_sender()
+        latencies, errors = [], 0
+        for url, headers in worker_urls:
+            started_at = time.perf_counter()
+            status = send(url, headers)
+            latencies.append(time.perf_counter() - started_at)
+            errors += status >= 400
+        return latencies, errors
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        started_at = time.perf_counter()
+        results = list(executor.map(work, [urls[number::workers] for number in range(workers)]))
+        elapsed = time.perf_counter() - started_at
+    latencies = [latency * 1000 for worker_latencies, _ in results for latency in worker_latencies]
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'mean': round(statistics.mean(latencies), 2),
+        'p50': round(percentile(latencies, 50), 2),
+        'p95': round(percentile(latencies, 95), 2),
+        'p99': round(percentile(latencies, 99), 2),
+        'max': round(max(latencies), 2)
+    }
+
+
+def compare(report: dict, baseline: dict):
+    """Prints change of p95 latency and throughput of every endpoint against the baseline report"""
+    for name, result in report['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if previous is None:
+            continue
+        print(f'{name:>21}: p95 {previous["p95"]:8.2f} -> {result["p95"]:8.2f} ms '
+              f'({(result["p95"] / previous["p95"] - 1) * 100:+6.1f}%), '
+              f'throughput {previous["throughput"]:8.1f} -> {result["throughput"]:8.1f} req/s '
+              f'({(result["throughput"] / previous["throughput"] - 1) * 100:+6.1f}%)', file=sys.stderr)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--landlords', type=int, default=50000)
+    parser.add_argument('--flats-per-landlord', type=int, default=2)
+    parser.add_argument('--tenants-per-landlord', type=int, default=2)
+    parser.add_argument('--settlements-per-agreement', type=int, default=24)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--database', type=Path, help='SQLite file of the dataset, by default in temp directory')
+    parser.add_argument('--regenerate', action='store_true', help='generate the dataset even if the file exists')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500, help='measured requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=20, help='requests per endpoint sent before measuring')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='comma separated endpoint names')
+    parser.add_argument('--no-response-cache', action='store_true', help='serve every request from the database')
+    parser.add_argument('--server', action='store_true', help='send requests over HTTP to a local WSGI server')
+    parser.add_argument('--output', type=Path, help='file for the JSON report, stdout by default')
+    parser.add_argument('--baseline', type=Path, help='JSON report of a previous run to compare with')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    dataset = {
+        'landlords': args.landlords,
+        'flats_per_landlord': args.flats_per_landlord,
+        'tenants_per_landlord': args.tenants_per_landlord,
+        'settlements_per_agreement': args.settlements_per_agreement,
+        'seed': args.seed
+    }
+    database = args.database or \
+        Path(tempfile.gettempdir()) / f'myrent-benchmark-{"-".join(str(value) for value in dataset.values())}.db'
+    app = create_benchmark_app(database.resolve(), not args.no_response_cache)
+    prepare_database(app, dataset, args.regenerate)
+
+    server = None
+    if args.server:
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        Thread(target=server.serve_forever, daemon=True).start()
+    new_sender = get_sender(app, f'http://127.0.0.1:{server.server_port}' if server else None)
+
+    rng = random.Random(args.seed)
+    tokens = get_tokens(app, dataset, rng)
+    endpoints = {}
+    for name in args.endpoints.split(','):
+        urls = get_urls(ENDPOINTS[name], dataset, tokens, rng, args.warmup + args.requests)
+        if args.warmup:
+            run_endpoint(new_sender, urls[:args.warmup], args.workers)
+        endpoints[name] = run_endpoint(new_sender, urls[args.warmup:], args.workers)
+        print(f'{name:>21}: {endpoints[name]["throughput"]:8.1f} req/s, p50 {endpoints[name]["p50"]:8.2f} ms, '
+              f'p95 {endpoints[name]["p95"]:8.2f} ms, p99 {endpoints[name]["p99"]:8.2f} ms', file=sys.stderr)
+    if server is not None:
+        server.shutdown()
+
+    report = {
+        'app': 'flask-myrent-api',
+        'dataset': dataset,
+        'mode': 'server' if args.server else 'test_client',
+        'workers': args.workers,
+        'response_cache': not args.no_response_cache,
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'cpus': os.cpu_count()
+        },
+        'endpoints': endpoints
+    }
+    if args.baseline:
+        compare(report, json.loads(args.baseline.read_text()))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,8 +13,36 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY')
     SQLALCHEMY_DATABASE_URI = ''
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 3600)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    }
     JWT_EXPIRED_MINUTES = 30
+    REFRESH_TOKEN_EXPIRED_DAYS = 30
+    TOKEN_DENYLIST_DATABASE = os.environ.get('TOKEN_DENYLIST_DATABASE')
+    TOKEN_CACHE_SIZE = 1024
+    PASSWORD_HASH_ALGORITHM = os.environ.get('PASSWORD_HASH_ALGORITHM', 'pbkdf2:sha256')
+    PASSWORD_HASH_WORK_FACTOR = int(os.environ.get('PASSWORD_HASH_WORK_FACTOR', 150000))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))
+    PASSWORD_HASH_QUEUE_SIZE = 64
     PER_PAGE = 5
+    COUNT_CACHE_TTL = 60
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '0') == '1'
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'sqlite')
+    RESPONSE_CACHE_DATABASE = os.environ.get('RESPONSE_CACHE_DATABASE', str(base_dir / 'response_cache.db'))
+    RESPONSE_CACHE_SIZE = 1024
+    RESPONSE_CACHE_TTL = 60
+    PURGE_BATCH_SIZE = 10000
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER')
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get('DB_REPLICA_URIS', '').split(',') if uri]
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+    REPLICA_STICKY_DATABASE = os.environ.get('REPLICA_STICKY_DATABASE', str(base_dir / 'replica_sticky.db'))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+    PROFILING_WINDOW = 1000
     CORS_HEADERS = 'Content-Type'
     ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif'}
     MAX_CONTENT_LENGTH = 2 * 1024 * 1024
@@ -29,6 +57,10 @@ class DevelopmentConfig(Config):
 class TestingConfig(Config):
     DB_FILE_PATH = base_dir / 'tests' / 'test.db'
     SQLALCHEMY_DATABASE_URI = f'sqlite:///{DB_FILE_PATH}'
+    PASSWORD_HASH_WORK_FACTOR = 1000
+    RESPONSE_CACHE_ENABLED = True
+    RESPONSE_CACHE_BACKEND = 'memory'
+    REPLICA_STICKY_DATABASE = None
     DEBUG = True
     TESTING = True
     UPLOAD_FOLDER = base_dir / 'tests' / 'uploads'
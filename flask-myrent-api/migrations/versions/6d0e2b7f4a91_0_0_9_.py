@@ -0,0 +1,26 @@
+"""landlords and tenants token generation
+
+Revision ID: 6d0e2b7f4a91
+Revises: 2f6a8d41c9e0
+Create Date: 2026-10-18 22:21:43.905162
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d0e2b7f4a91'
+down_revision = '2f6a8d41c9e0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('landlords', sa.Column('token_generation', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('tenants', sa.Column('token_generation', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('tenants', 'token_generation')
+    op.drop_column('landlords', 'token_generation')
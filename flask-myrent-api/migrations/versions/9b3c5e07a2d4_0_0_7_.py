@@ -0,0 +1,40 @@
+"""foreign key indexes
+
+Revision ID: 9b3c5e07a2d4
+Revises: 41f25fef2679
+Create Date: 2026-10-18 10:31:18.640925
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3c5e07a2d4'
+down_revision = '41f25fef2679'
+branch_labels = None
+depends_on = None
+
+FOREIGN_KEY_COLUMNS = [
+    ('flats', 'landlord_id'),
+    ('pictures', 'flat_id'),
+    ('tenants', 'landlord_id'),
+    ('agreements', 'flat_id'),
+    ('agreements', 'tenant_id'),
+    ('settlements', 'agreement_id'),
+]
+
+
+def upgrade():
+    for table_name, column_name in FOREIGN_KEY_COLUMNS:
+        op.create_index(op.f(f'ix_{table_name}_{column_name}'), table_name, [column_name], unique=False)
+
+
+def downgrade():
+    # InnoDB dropped its implicit foreign key indexes when the ix_ ones were
+    # created and refuses to drop the last index of a foreign key column
+    mysql = op.get_bind().dialect.name == 'mysql'
+    for table_name, column_name in reversed(FOREIGN_KEY_COLUMNS):
+        if mysql:
+            op.create_index(column_name, table_name, [column_name], unique=False)
+        op.drop_index(op.f(f'ix_{table_name}_{column_name}'), table_name=table_name)
@@ -1,12 +1,23 @@
 from flask import Flask
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from config import config
+from myrent_app.cache import CountCache, ResponseCache, TokenCache, TokenDenylist
+from myrent_app.hashing import PasswordHasher
+from myrent_app.pool import PoolMetrics
+from myrent_app.profiling import RequestProfiler
+from myrent_app.replicas import RoutingSQLAlchemy
 
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 migrate = Migrate()
+count_cache = CountCache()
+response_cache = ResponseCache()
+token_cache = TokenCache()
+token_denylist = TokenDenylist()
+pool_metrics = PoolMetrics()
+profiler = RequestProfiler()
+password_hasher = PasswordHasher()
 
 
 def create_app(config_name='development'):
@@ -17,6 +28,13 @@ def create_app(config_name='development'):
 
     db.init_app(app)
     migrate.init_app(app, db)
+    count_cache.init_app(app)
+    response_cache.init_app(app)
+    token_cache.init_app(app)
+    token_denylist.init_app(app)
+    pool_metrics.init_app(app)
+    profiler.init_app(app)
+    password_hasher.init_app(app)
     
     from myrent_app.landlords import landlords_bp
     from myrent_app.flats import flats_bp
@@ -26,6 +44,8 @@ def create_app(config_name='development'):
     from myrent_app.agreements import agreements_bp
     from myrent_app.settlements import settlements_bp
     from myrent_app.pictures import pictures_bp
+    from myrent_app.metrics import metrics_bp
+    from myrent_app.tokens import tokens_bp
 
     app.register_blueprint(landlords_bp, url_prefix=f'/api/{version}')
     app.register_blueprint(flats_bp, url_prefix=f'/api/{version}')
@@ -33,8 +53,13 @@ def create_app(config_name='development'):
     app.register_blueprint(agreements_bp, url_prefix=f'/api/{version}')
     app.register_blueprint(settlements_bp, url_prefix=f'/api/{version}')
     app.register_blueprint(pictures_bp, url_prefix=f'/api/{version}')
+    app.register_blueprint(metrics_bp, url_prefix=f'/api/{version}')
+    app.register_blueprint(tokens_bp, url_prefix=f'/api/{version}')
     app.register_blueprint(errors_bp)
     app.register_blueprint(db_manage_bp)
 
+    from myrent_app.utils import set_conditional_headers
+    app.after_request(set_conditional_headers)
+
     return app
 
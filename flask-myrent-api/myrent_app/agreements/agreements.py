@@ -6,7 +6,8 @@ from myrent_app.agreements import agreements_bp
 from myrent_app.models import Agreement, AgreementSchema, agreement_schema, \
                             Flat, Tenant, Landlord
 from myrent_app.utils import token_landlord_tenant_required, token_landlord_required, \
-                        validate_json_content_type
+                        validate_json_content_type, apply_eager_loading, \
+                        get_not_modified_response, commit_or_conflict
 
 
 @agreements_bp.route('/agreements', methods=['GET'])
@@ -21,7 +22,12 @@ def get_agreements(id_model_tuple: tuple):
     if id_model_tuple[1] == 'tenants':
         items = Agreement.query.filter_by(tenant_id=id_model_tuple[0])
 
-    agreements = AgreementSchema(many=True).dump(items)
+    schema = AgreementSchema(many=True)
+    items = apply_eager_loading(Agreement, items, schema).all()
+    not_modified = get_not_modified_response(schema, items)
+    if not_modified is not None:
+        return not_modified
+    agreements = schema.dump(items)
 
     return jsonify({
         'success': True,
@@ -41,6 +47,9 @@ def get_agreement(id_model_tuple: tuple, agreement_id: int):
 
     if id_model_tuple[1] == 'tenants' and agreement.tenant_id != id_model_tuple[0]:
         abort(404, description=f'Agreement with id {agreement_id} not found')
+    not_modified = get_not_modified_response(agreement_schema, agreement)
+    if not_modified is not None:
+        return not_modified
 
     return jsonify({
         'success': True,
@@ -65,16 +74,10 @@ def create_agreement(landlord_id: int, args: dict, flat_id: int, tenant_id: int)
     if tenant.landlord_id != landlord_id:
         abort(404, description=f'Tenant with id {tenant_id} not found')
 
-    agreement_with_identifier = Agreement.query.filter(
-                                        Agreement.identifier == args['identifier']
-                                        ).first()                   
-    if agreement_with_identifier is not None:
-        abort(409, description=f'Agreement with identifier {args["identifier"]} already exists')             
-
     agreement = Agreement(flat_id=flat_id, tenant_id=tenant_id, **args)
 
     db.session.add(agreement)
-    db.session.commit()
+    commit_or_conflict({'identifier': f'Agreement with identifier {args["identifier"]} already exists'})
 
     return jsonify({
         'success': True,
@@ -0,0 +1,467 @@
+import json
+import sqlite3
+import time
+from collections import Counter, OrderedDict
+from contextlib import closing
+from functools import wraps
+from itertools import chain
+from threading import Lock
+from typing import Callable, Iterable, Optional
+from urllib.parse import urlencode
+from flask import Flask, current_app, has_app_context, request
+from flask_sqlalchemy import BaseQuery
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.util import find_tables
+
+
+class CountCache:
+    """
+    Cache of COUNT(*) results used by paginated list endpoints. Entries are
+    keyed by the queried model plus its normalized filter set (compiled WHERE
+    clause with bound values, including values bound with Query.params),
+    expire after COUNT_CACHE_TTL seconds and are dropped as soon as one of
+    the tables they depend on is written.
+    """
+    def __init__(self, app: Flask = None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.config.setdefault('COUNT_CACHE_TTL', 60)
+        app.extensions['count_cache'] = {'counts': {}, 'lock': Lock()}
+
+    @property
+    def _state(self) -> dict:
+        return current_app.extensions['count_cache']
+
+    @staticmethod
+    def make_key(query: BaseQuery) -> tuple:
+        table_name = query.column_descriptions[0]['type'].__tablename__
+        whereclause = query.whereclause
+        if whereclause is None:
+            return table_name, None, ()
+        compiled = whereclause.compile()
+        params = {**compiled.params, **query._params}
+        return table_name, str(compiled), tuple(sorted(params.items()))
+
+    def get(self, key: tuple, ttl: Optional[int] = None) -> Optional[int]:
+        entry = self._state['counts'].get(key)
+        if entry is None:
+            return None
+        count, stored_at, _ = entry
+        if ttl is not None and time.monotonic() - stored_at > ttl:
+            return None
+        return count
+
+    def set(self, key: tuple, query: BaseQuery, count: int):
+        tables = frozenset(table.name for table in find_tables(query.statement))
+        with self._state['lock']:
+            self._state['counts'][key] = (count, time.monotonic(), tables)
+
+    def invalidate(self, *table_names: str):
+        """Drop cached counts depending on given tables (all when no tables given)"""
+        state = self._state
+        with state['lock']:
+            if not table_names:
+                state['counts'].clear()
+                return
+            for key, (_, _, tables) in list(state['counts'].items()):
+                if tables.intersection(table_names):
+                    del state['counts'][key]
+
+
+class MemoryResponseStore:
+    """
+    In-process (per worker) LRU store of at most RESPONSE_CACHE_SIZE
+    responses, each tagged with the tables it was read from
+    """
+    def __init__(self, app: Flask):
+        self.size = app.config['RESPONSE_CACHE_SIZE']
+        self.entries = OrderedDict()
+        self.invalidated_at = {}
+        self.lock = Lock()
+
+    def get(self, key: str) -> Optional[tuple]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: tuple, tags: Iterable[str], ttl: int, read_at: float):
+        tags = frozenset(tags)
+        with self.lock:
+            if any(self.invalidated_at.get(tag, 0) >= read_at for tag in tags):
+                return
+            self.entries[key] = (value, time.time() + ttl, tags)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, tags: Iterable[str]):
+        now = time.time()
+        with self.lock:
+            for tag in tags:
+                self.invalidated_at[tag] = now
+            for key, (_, _, entry_tags) in list(self.entries.items()):
+                if entry_tags.intersection(tags):
+                    del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class SQLiteResponseStore:
+    """
+    Store of at most RESPONSE_CACHE_SIZE responses in RESPONSE_CACHE_DATABASE
+    SQLite file, shared by all workers of the host (local stand-in for a shared
+    cache server), the oldest entries are evicted first
+    """
+    def __init__(self, app: Flask):
+        self.database = app.config['RESPONSE_CACHE_DATABASE']
+        if not self.database:
+            raise ValueError('RESPONSE_CACHE_DATABASE is required by sqlite response cache backend')
+        self.size = app.config['RESPONSE_CACHE_SIZE']
+        with closing(self._connect()) as connection, connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS response_cache (key TEXT PRIMARY KEY, body BLOB NOT NULL, '
+                               'status INTEGER NOT NULL, headers TEXT NOT NULL, stored_at REAL NOT NULL, '
+                               'expires_at REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_response_cache_stored_at ON response_cache (stored_at)')
+            connection.execute('CREATE TABLE IF NOT EXISTS response_cache_tags (tag TEXT NOT NULL, key TEXT NOT NULL, '
+                               'PRIMARY KEY (tag, key))')
+            connection.execute('CREATE TABLE IF NOT EXISTS response_cache_invalidations '
+                               '(tag TEXT PRIMARY KEY, invalidated_at REAL NOT NULL)')
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.database, timeout=5)
+
+    def get(self, key: str) -> Optional[tuple]:
+        with closing(self._connect()) as connection:
+            row = connection.execute('SELECT body, status, headers FROM response_cache WHERE key = ? AND expires_at >= ?',
+                                     (key, time.time())).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def set(self, key: str, value: tuple, tags: Iterable[str], ttl: int, read_at: float):
+        tags = list(tags)
+        body, status, headers = value
+        now = time.time()
+        with closing(self._connect()) as connection, connection:
+            placeholders = ', '.join('?' * len(tags))
+            invalidated = connection.execute(f'SELECT 1 FROM response_cache_invalidations WHERE tag IN ({placeholders}) '
+                                             f'AND invalidated_at >= ?', (*tags, read_at)).fetchone()
+            if invalidated is not None:
+                return
+            connection.execute('INSERT OR REPLACE INTO response_cache (key, body, status, headers, stored_at, expires_at) '
+                               'VALUES (?, ?, ?, ?, ?, ?)', (key, body, status, json.dumps(headers), now, now + ttl))
+            connection.executemany('INSERT OR IGNORE INTO response_cache_tags (tag, key) VALUES (?, ?)',
+                                   [(tag, key) for tag in tags])
+            excess = connection.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0] - self.size
+            if excess > 0:
+                connection.execute('DELETE FROM response_cache WHERE key IN '
+                                   '(SELECT key FROM response_cache ORDER BY stored_at LIMIT ?)', (excess,))
+                connection.execute('DELETE FROM response_cache_tags WHERE key NOT IN (SELECT key FROM response_cache)')
+
+    def invalidate(self, tags: Iterable[str]):
+        tags = list(tags)
+        placeholders = ', '.join('?' * len(tags))
+        with closing(self._connect()) as connection, connection:
+            connection.executemany('INSERT OR REPLACE INTO response_cache_invalidations (tag, invalidated_at) '
+                                   'VALUES (?, ?)', [(tag, time.time()) for tag in tags])
+            connection.execute(f'DELETE FROM response_cache WHERE key IN '
+                               f'(SELECT key FROM response_cache_tags WHERE tag IN ({placeholders}))', tags)
+            connection.execute('DELETE FROM response_cache_tags WHERE key NOT IN (SELECT key FROM response_cache)')
+
+    def clear(self):
+        with closing(self._connect()) as connection, connection:
+            connection.execute('DELETE FROM response_cache')
+            connection.execute('DELETE FROM response_cache_tags')
+
+    def __len__(self) -> int:
+        with closing(self._connect()) as connection:
+            return connection.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0]
+
+
+RESPONSE_CACHE_BACKENDS = {'memory': MemoryResponseStore, 'sqlite': SQLiteResponseStore}
+
+
+class ResponseCache:
+    """
+    Cache of whole responses of public read endpoints keyed by the endpoint
+    plus its normalized view and query args, stored together with validators
+    (ETag, Last-Modified) of conditional GET, so cached responses still answer
+    304. Responses are tagged with the tables they are read from and dropped
+    when one of them is written (on commit), a response read before such
+    a write is not stored. Backend
+    (RESPONSE_CACHE_BACKEND) is sqlite (file RESPONSE_CACHE_DATABASE shared by
+    workers, so a write in one worker invalidates responses of all of them) or
+    memory (per process LRU, only for a single process - other workers would
+    serve stale responses), entries expire after RESPONSE_CACHE_TTL seconds.
+    Responses read from a replica are not stored when their tables were
+    written within REPLICA_STICKY_SECONDS (the replica may still lag behind).
+    """
+    def __init__(self, app: Flask = None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.config.setdefault('RESPONSE_CACHE_ENABLED', False)
+        app.config.setdefault('RESPONSE_CACHE_BACKEND', 'sqlite')
+        app.config.setdefault('RESPONSE_CACHE_DATABASE', None)
+        app.config.setdefault('RESPONSE_CACHE_SIZE', 1024)
+        app.config.setdefault('RESPONSE_CACHE_TTL', 60)
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+        backend = app.config['RESPONSE_CACHE_BACKEND']
+        if backend not in RESPONSE_CACHE_BACKENDS:
+            raise ValueError(f'Unsupported response cache backend {backend}, use {" or ".join(RESPONSE_CACHE_BACKENDS)}')
+        store = None
+        if app.config['RESPONSE_CACHE_ENABLED']:
+            store = RESPONSE_CACHE_BACKENDS[backend](app)
+            if backend == 'memory' and not (app.debug or app.testing):
+                app.logger.warning('Memory response cache is per process, other workers serve stale responses '
+                                   'after a write, use sqlite backend with more than one worker')
+        app.extensions['response_cache'] = {
+            'store': store,
+            'lock': Lock(),
+            'hits': Counter(),
+            'misses': Counter()
+        }
+
+    @property
+    def _state(self) -> dict:
+        return current_app.extensions['response_cache']
+
+    @staticmethod
+    def make_key(replica: bool) -> str:
+        """Responses read from replicas and from the primary (client in sticky window) are kept apart"""
+        source = 'replica' if replica else 'primary'
+        args = sorted(request.view_args.items()) + sorted(request.args.items(multi=True))
+        return f'{source}:{request.endpoint}?{urlencode(args)}'
+
+    def _count(self, name: str):
+        with self._state['lock']:
+            self._state[name][request.endpoint] += 1
+
+    def cached(self, *table_names: str) -> Callable:
+        """Serves the view from cache, table_names are the tables the response is read from"""
+        def decorator(func: Callable) -> Callable:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                store = self._state['store']
+                if store is None or not current_app.config['RESPONSE_CACHE_ENABLED']:
+                    return func(*args, **kwargs)
+                from myrent_app.replicas import get_replica_bind_key
+
+                replica = get_replica_bind_key() is not None
+                key = self.make_key(replica)
+                entry = store.get(key)
+                if entry is not None:
+                    self._count('hits')
+                    body, status, headers = entry
+                    response = current_app.response_class(body, status=status, headers=headers)
+                    response.headers['X-Cache'] = 'HIT'
+                    return response.make_conditional(request)
+
+                self._count('misses')
+                read_at = time.time()
+                if replica:  #zapis sprzed read_at mógł jeszcze nie dotrzeć do repliki
+                    read_at -= current_app.config['REPLICA_STICKY_SECONDS']
+                response = current_app.make_response(func(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    from myrent_app.utils import set_conditional_headers
+
+                    set_conditional_headers(response)
+                    headers = [(name, value) for name, value in response.headers if name.lower() != 'set-cookie']
+                    store.set(key, (response.get_data(), response.status_code, headers), table_names,
+                              current_app.config['RESPONSE_CACHE_TTL'], read_at)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    def invalidate(self, *table_names: str):
+        """Drop cached responses read from given tables (all when no tables given)"""
+        store = self._state['store']
+        if store is None:
+            return
+        if table_names:
+            store.invalidate(table_names)
+        else:
+            store.clear()
+
+    def stats(self) -> dict:
+        state = self._state
+        with state['lock']:
+            hits, misses = dict(state['hits']), dict(state['misses'])
+        endpoints = {}
+        for endpoint in sorted(set(hits) | set(misses)):
+            endpoints[endpoint] = {'hits': hits.get(endpoint, 0), 'misses': misses.get(endpoint, 0)}
+            endpoints[endpoint]['hit_ratio'] = round(endpoints[endpoint]['hits'] / sum(endpoints[endpoint].values()), 3)
+        total_hits, total_misses = sum(hits.values()), sum(misses.values())
+        return {
+            'backend': current_app.config['RESPONSE_CACHE_BACKEND'],
+            'hits': total_hits,
+            'misses': total_misses,
+            'hit_ratio': round(total_hits / (total_hits + total_misses), 3) if total_hits + total_misses else None,
+            'size': len(state['store']) if state['store'] is not None else 0,
+            'endpoints': endpoints
+        }
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of already verified JWT tokens mapped to their payloads,
+    so repeated requests with the same bearer token skip signature verification.
+    Entries are never returned after the token's exp claim.
+    """
+    def __init__(self, app: Flask = None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.config.setdefault('TOKEN_CACHE_SIZE', 1024)
+        app.extensions['token_cache'] = {'tokens': OrderedDict(), 'lock': Lock(), 'hits': 0, 'misses': 0}
+
+    @property
+    def _state(self) -> dict:
+        return current_app.extensions['token_cache']
+
+    def get(self, token: str) -> Optional[dict]:
+        state = self._state
+        with state['lock']:
+            payload = state['tokens'].get(token)
+            if payload is not None and payload.get('exp', float('inf')) <= time.time():
+                del state['tokens'][token]
+                payload = None
+            if payload is None:
+                state['misses'] += 1
+                return None
+            state['tokens'].move_to_end(token)
+            state['hits'] += 1
+            return payload
+
+    def set(self, token: str, payload: dict):
+        state = self._state
+        with state['lock']:
+            state['tokens'][token] = payload
+            state['tokens'].move_to_end(token)
+            while len(state['tokens']) > current_app.config['TOKEN_CACHE_SIZE']:
+                state['tokens'].popitem(last=False)
+
+    def invalidate(self, token: str = None):
+        """Drop given token (all tokens when no token given), it will be verified again on next use"""
+        state = self._state
+        with state['lock']:
+            if token is None:
+                state['tokens'].clear()
+            else:
+                state['tokens'].pop(token, None)
+
+    def stats(self) -> dict:
+        state = self._state
+        return {'hits': state['hits'], 'misses': state['misses'], 'size': len(state['tokens'])}
+
+
+class TokenDenylist:
+    """
+    Revoked refresh tokens - only jti and exp claims are kept, entries are
+    dropped once the token would be expired anyway. In memory by default
+    (per process), with TOKEN_DENYLIST_DATABASE set the entries are stored in
+    that SQLite file, so they are shared by all workers.
+    """
+    PURGE_INTERVAL = 60
+
+    def __init__(self, app: Flask = None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.config.setdefault('TOKEN_DENYLIST_DATABASE', None)
+        app.extensions['token_denylist'] = {'tokens': {}, 'lock': Lock(), 'purged_at': time.time()}
+        database = app.config['TOKEN_DENYLIST_DATABASE']
+        if not database and not (app.debug or app.testing):
+            app.logger.warning('Token denylist is per process, a revoked refresh token is still accepted by other '
+                               'workers, set TOKEN_DENYLIST_DATABASE with more than one worker')
+        if database:
+            with closing(sqlite3.connect(database)) as connection, connection:
+                connection.execute('CREATE TABLE IF NOT EXISTS token_denylist (jti TEXT PRIMARY KEY, exp INTEGER NOT NULL)')
+                connection.execute('CREATE INDEX IF NOT EXISTS ix_token_denylist_exp ON token_denylist (exp)')
+
+    @property
+    def _state(self) -> dict:
+        return current_app.extensions['token_denylist']
+
+    @staticmethod
+    def _connect() -> sqlite3.Connection:
+        return sqlite3.connect(current_app.config['TOKEN_DENYLIST_DATABASE'], timeout=5)
+
+    def add(self, jti: str, exp: float) -> bool:
+        """Revokes token, returns False when it was already revoked (check and add is atomic)"""
+        state = self._state
+        now = time.time()
+        purge = now - state['purged_at'] > self.PURGE_INTERVAL
+        if purge:
+            state['purged_at'] = now
+        if current_app.config['TOKEN_DENYLIST_DATABASE']:
+            with closing(self._connect()) as connection, connection:
+                if purge:
+                    connection.execute('DELETE FROM token_denylist WHERE exp < ?', (int(now),))
+                cursor = connection.execute('INSERT OR IGNORE INTO token_denylist (jti, exp) VALUES (?, ?)',
+                                            (jti, int(exp)))
+                return cursor.rowcount == 1
+        with state['lock']:
+            if purge:
+                for expired_jti in [key for key, value in state['tokens'].items() if value < now]:
+                    del state['tokens'][expired_jti]
+            if jti in state['tokens']:
+                return False
+            state['tokens'][jti] = exp
+            return True
+
+    def __contains__(self, jti: str) -> bool:
+        if current_app.config['TOKEN_DENYLIST_DATABASE']:
+            with closing(self._connect()) as connection:
+                return connection.execute('SELECT 1 FROM token_denylist WHERE jti = ?', (jti,)).fetchone() is not None
+        return jti in self._state['tokens']
+
+    def __len__(self) -> int:
+        if current_app.config['TOKEN_DENYLIST_DATABASE']:
+            with closing(self._connect()) as connection:
+                return connection.execute('SELECT COUNT(*) FROM token_denylist').fetchone()[0]
+        return len(self._state['tokens'])
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_written_tables(session: Session, flush_context):
+    if not has_app_context() or 'count_cache' not in current_app.extensions:
+        return
+    table_names = {instance.__table__.name
+                   for instance in chain(session.new, session.dirty, session.deleted)}
+    if table_names:
+        from myrent_app import count_cache
+        count_cache.invalidate(*table_names)
+        session.info.setdefault('written_tables', set()).update(table_names)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_tables(session: Session):
+    """Responses are dropped once written rows are visible to other requests"""
+    table_names = session.info.pop('written_tables', None)
+    if table_names and has_app_context() and 'response_cache' in current_app.extensions:
+        from myrent_app import response_cache
+        response_cache.invalidate(*table_names)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_written_tables(session: Session):
+    session.info.pop('written_tables', None)
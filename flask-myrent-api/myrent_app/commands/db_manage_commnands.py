@@ -1,10 +1,13 @@
 import os, json
+import click
 from shutil import copyfile
 from datetime import datetime
 from flask import current_app
 
 from myrent_app import db
 from myrent_app.commands import db_manage_bp
+from myrent_app.commands.explain import MODELS, explain_shapes
+from myrent_app.commands.purge import purge
 from myrent_app.models import Landlord, Flat, Tenant, Agreement, \
                                 Settlement, Picture
 from myrent_app.utils import generate_hashed_password
@@ -13,6 +16,7 @@ from myrent_app.utils import generate_hashed_password
 SAMPLES_DIR = 'C:\\python\\github_repos\\Python-examples\\flask-myrent-api\\samples'
 UPLOADS_DIR = 'C:\\python\\github_repos\\Python-examples\\flask-myrent-api\\uploads'
 PICTURES_LIST = ['example.JPG', 'example2.JPG', 'example3.JPG']
+PURGE_TABLES = ['pictures', 'settlements', 'agreements', 'flats', 'tenants', 'landlords']
 
 def load_json_data(filename: str) -> list:
     json_path = os.path.join(SAMPLES_DIR, filename)
@@ -85,25 +89,48 @@ def add_data():
 
 
 @db_manage.command()
-def remove_data():
+@click.option('--dry-run', is_flag=True, help='Only report number of rows which would be removed')
+@click.option('--batch-size', type=click.IntRange(min=1), help='Number of rows deleted in one transaction '
+                                                               '(when TRUNCATE is not available)')
+def remove_data(dry_run: bool, batch_size: int):
     """Remove all data from the database"""
     try:
-        db.session.execute('DELETE FROM pictures')
-        db.session.execute('ALTER TABLE pictures AUTO_INCREMENT=1')
-        db.session.execute('DELETE FROM settlements')
-        db.session.execute('ALTER TABLE settlements AUTO_INCREMENT=1')        
-        db.session.execute('DELETE FROM agreements')
-        db.session.execute('ALTER TABLE agreements AUTO_INCREMENT=1')        
-        db.session.execute('DELETE FROM flats')
-        db.session.execute('ALTER TABLE flats AUTO_INCREMENT=1')        
-        db.session.execute('DELETE FROM tenants')
-        db.session.execute('ALTER TABLE tenants AUTO_INCREMENT=1')
-        db.session.execute('DELETE FROM landlords')
-        db.session.execute('ALTER TABLE landlords AUTO_INCREMENT=1')
-
-        for file in os.listdir(UPLOADS_DIR):
-            os.remove(os.path.join(UPLOADS_DIR, file))
-
-        print('All data has been deleted') 
+        batch_size = batch_size or current_app.config.get('PURGE_BATCH_SIZE', 10000)
+        strategy, counts = purge(PURGE_TABLES, batch_size, dry_run)
+        for table_name, count in counts.items():
+            print(f'{table_name}: {count} rows')
+
+        uploads_dir = current_app.config.get('UPLOAD_FOLDER')
+        uploaded_files = os.listdir(uploads_dir) if uploads_dir and os.path.isdir(uploads_dir) else []
+        if dry_run:
+            print(f'uploaded files: {len(uploaded_files)}')
+            print(f'Dry run, data would be removed with {strategy}')
+            return
+
+        for file in uploaded_files:
+            os.remove(os.path.join(uploads_dir, file))
+
+        print(f'All data has been deleted ({strategy})')
+    except Exception as exc:
+        print(f'Unexpected error: {exc}')
+
+
+@db_manage.command()
+@click.option('--model', 'model_names', type=click.Choice(list(MODELS)), multiple=True,
+              help='Model to check, all models by default')
+@click.option('--query', 'query_strings', multiple=True,
+              help='Query string to check (e.g. "status=active&sort=-id"), common filter and sort shapes by default')
+def explain(model_names: tuple, query_strings: tuple):
+    """Show query plans of filter and sort query shapes and flag full table scans"""
+    try:
+        full_scans = checked = 0
+        for model_name in model_names or MODELS:
+            for query_string, plan, full_scan in explain_shapes(MODELS[model_name], query_strings):
+                checked += 1
+                full_scans += full_scan
+                print(f'{"FULL SCAN" if full_scan else "ok":>9}  /{model_name}?{query_string}')
+                for line in plan:
+                    print(f'{"":>11}{line}')
+        print(f'{full_scans} of {checked} query shapes scan the whole table or sort without index')
     except Exception as exc:
         print(f'Unexpected error: {exc}')
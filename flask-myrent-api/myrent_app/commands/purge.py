@@ -0,0 +1,83 @@
+from typing import Dict, Iterable, List, Tuple
+from sqlalchemy import Table, func, select
+
+from myrent_app import db, count_cache, response_cache
+
+
+TRUNCATE_DIALECTS = {'mysql', 'postgresql'}
+
+def get_purge_order(table_names: Iterable[str]) -> List[Table]:
+    """Given tables ordered so that referencing tables come before referenced ones (settlements before agreements)"""
+    table_names = set(table_names)
+    return [table for table in reversed(db.metadata.sorted_tables) if table.name in table_names]
+
+def get_strategy() -> str:
+    return 'truncate' if db.engine.dialect.name in TRUNCATE_DIALECTS else 'delete'
+
+def count_rows(tables: List[Table]) -> Dict[str, int]:
+    return {table.name: db.session.execute(select([func.count()]).select_from(table)).scalar() for table in tables}
+
+def _quote(table: Table) -> str:
+    return db.engine.dialect.identifier_preparer.format_table(table)
+
+def _truncate(tables: List[Table]):
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(f'TRUNCATE TABLE {", ".join(_quote(table) for table in tables)} RESTART IDENTITY')
+    else:
+        # TRUNCATE is refused for tables referenced by foreign keys, even empty ones
+        db.session.execute('SET FOREIGN_KEY_CHECKS = 0')
+        try:
+            for table in tables:
+                db.session.execute(f'TRUNCATE TABLE {_quote(table)}')
+        finally:
+            db.session.execute('SET FOREIGN_KEY_CHECKS = 1')
+    db.session.commit()
+
+def _delete_in_batches(table: Table, batch_size: int):
+    primary_key = list(table.primary_key.columns)[0]
+    while True:
+        batch = select([primary_key]).order_by(primary_key).limit(batch_size)
+        result = db.session.execute(table.delete().where(primary_key.in_(batch)))
+        db.session.commit()
+        if result.rowcount < batch_size:
+            return
+
+def _reset_sequences(tables: List[Table]):
+    dialect = db.engine.dialect.name
+    for table in tables:
+        if dialect == 'sqlite':
+            if db.engine.dialect.has_table(db.session.connection(), 'sqlite_sequence'):
+                db.session.execute('DELETE FROM sqlite_sequence WHERE name = :name', {'name': table.name})
+        elif dialect == 'mysql':
+            db.session.execute(f'ALTER TABLE {_quote(table)} AUTO_INCREMENT = 1')
+        elif dialect == 'postgresql':
+            for column in table.primary_key.columns:
+                db.session.execute('SELECT setval(pg_get_serial_sequence(:table, :column), 1, false)',
+                                   {'table': table.name, 'column': column.name})
+    db.session.commit()
+
+def purge(table_names: Iterable[str], batch_size: int = 10000, dry_run: bool = False) -> Tuple[str, Dict[str, int]]:
+    """
+    Functionality of removing all rows of given tables and resetting their
+    id sequences - with TRUNCATE on MySQL and PostgreSQL, otherwise with
+    batched DELETEs (each batch committed) in foreign key order. Returns used
+    strategy and row counts of the tables before the purge, dry run only
+    counts the rows.
+    """
+    tables = get_purge_order(table_names)
+    strategy = get_strategy()
+    counts = count_rows(tables)
+    if dry_run:
+        return strategy, counts
+
+    try:
+        if strategy == 'truncate':
+            _truncate(tables)
+        else:
+            for table in tables:
+                _delete_in_batches(table, batch_size)
+            _reset_sequences(tables)
+    finally:
+        count_cache.invalidate()
+        response_cache.invalidate()
+    return strategy, counts
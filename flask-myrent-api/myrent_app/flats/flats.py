@@ -1,23 +1,32 @@
 from flask import jsonify, abort
 from webargs.flaskparser import use_args
 
-from myrent_app import db
+from myrent_app import db, response_cache
 from myrent_app.flats import flats_bp
 from myrent_app.models import Flat, FlatSchema, flat_schema, Landlord
-from myrent_app.utils import apply_order, apply_filter, get_pagination, validate_json_content_type, get_schema_args, token_landlord_required
+from myrent_app.serialization import fast_dump, json_response
+from myrent_app.utils import apply_order, apply_filter, get_pagination, validate_json_content_type, get_schema_args, token_landlord_required, \
+    apply_eager_loading, apply_load_only, get_not_modified_response, commit_or_conflict
 
 
 @flats_bp.route('/flats', methods=['GET'])
+@response_cache.cached('flats', 'landlords')
 def get_all_flats():
     query = Flat.query
+    schema_args = get_schema_args(Flat)
+    schema = FlatSchema(**schema_args)
     query = apply_order(Flat, query)
     query = apply_filter(Flat, query)
+    query = apply_load_only(Flat, query, schema_args)
+    query = apply_eager_loading(Flat, query, schema)
     items, pagination = get_pagination(query, 'flats.get_all_flats')
+    not_modified = get_not_modified_response(schema, items, pagination)
+    if not_modified is not None:
+        return not_modified
     
-    schema_args = get_schema_args(Flat)
-    flats = FlatSchema(**schema_args).dump(items)
+    flats = fast_dump(schema, items)
 
-    return jsonify({
+    return json_response({
         'success': True,
         'data': flats,
         'number_of_records': len(flats),
@@ -26,8 +35,12 @@ def get_all_flats():
 
 
 @flats_bp.route('/flats/<int:flat_id>', methods=['GET'])
+@response_cache.cached('flats', 'landlords')
 def get_one_flat(flat_id: str):
     flat = Flat.query.get_or_404(flat_id, description=f'Flat with id {flat_id} not found')
+    not_modified = get_not_modified_response(flat_schema, flat)
+    if not_modified is not None:
+        return not_modified
 
     return jsonify({
         'success': True,
@@ -39,13 +52,25 @@ def get_one_flat(flat_id: str):
 def get_all_landlord_flats(landlord_id: str):
     Landlord.query.get_or_404(landlord_id, 
                             description=f'Landlord with id {landlord_id} not found')
-    flats = Flat.query.filter(Flat.landlord_id == landlord_id).all()
-    items = FlatSchema(many=True, exclude=['landlord']).dump(flats)
+    query = Flat.query.filter(Flat.landlord_id == landlord_id)
+    schema_args = get_schema_args(Flat)
+    schema = FlatSchema(exclude=['landlord'], **schema_args)
+    query = apply_order(Flat, query)
+    query = apply_filter(Flat, query)
+    query = apply_load_only(Flat, query, schema_args)
+    query = apply_eager_loading(Flat, query, schema)
+    items, pagination = get_pagination(query, 'flats.get_all_landlord_flats')
+    not_modified = get_not_modified_response(schema, items, pagination)
+    if not_modified is not None:
+        return not_modified
 
-    return jsonify({
+    flats = fast_dump(schema, items)
+
+    return json_response({
         'success': True,
-        'data': items,
-        'number_of_records': len(items)
+        'data': flats,
+        'number_of_records': len(flats),
+        'pagination': pagination
     })
 
 
@@ -55,13 +80,9 @@ def get_all_landlord_flats(landlord_id: str):
 @validate_json_content_type
 @use_args(FlatSchema(exclude=['landlord_id']), error_status_code=400)
 def create_flat(landlord_id: int, args: dict):
-    flat_identifier = Flat.query.filter(Flat.identifier == args['identifier']).first()
-    if flat_identifier is not None:
-        abort(409, description=f'Flat with identifier {args["identifier"]} already exists')
-    
     flat = Flat(landlord_id=landlord_id, **args)
     db.session.add(flat)
-    db.session.commit()
+    commit_or_conflict({'identifier': f'Flat with identifier {args["identifier"]} already exists'})
 
     return jsonify({
         'success': True,
@@ -0,0 +1,103 @@
+import hashlib
+import hmac
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from threading import BoundedSemaphore, Lock
+from typing import Callable
+from flask import Flask, current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+SCRYPT_BLOCK_SIZE = 8
+SCRYPT_PARALLELISM = 1
+SALT_CHARS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+
+def get_method(algorithm: str, work_factor: int) -> str:
+    """Method prefix of hashes made with given parameters (pbkdf2:sha256:150000, scrypt:32768:8:1)"""
+    if algorithm == 'scrypt':
+        return f'scrypt:{work_factor}:{SCRYPT_BLOCK_SIZE}:{SCRYPT_PARALLELISM}'
+    return f'{algorithm}:{work_factor}'
+
+
+def _scrypt(password: str, salt: str, n: int, r: int, p: int) -> str:
+    return hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+                          maxmem=132 * n * r * p, dklen=64).hex()
+
+
+def hash_password(password: str, method: str, salt_length: int) -> str:
+    if method.startswith('scrypt:'):
+        n, r, p = (int(value) for value in method.split(':')[1:])
+        salt = ''.join(secrets.choice(SALT_CHARS) for _ in range(salt_length))
+        return f'{method}${salt}${_scrypt(password, salt, n, r, p)}'
+    return generate_password_hash(password, method, salt_length)
+
+
+def verify_password(password_hash: str, password: str) -> bool:
+    if password_hash.startswith('scrypt:'):
+        try:
+            method, salt, hashval = password_hash.split('$', 2)
+            n, r, p = (int(value) for value in method.split(':')[1:])
+        except ValueError:
+            return False
+        return hmac.compare_digest(_scrypt(password, salt, n, r, p), hashval)
+    return check_password_hash(password_hash, password)
+
+
+class PasswordHasher:
+    """
+    Password hashing with algorithm (PASSWORD_HASH_ALGORITHM - pbkdf2:<digest>
+    or scrypt) and work factor (PASSWORD_HASH_WORK_FACTOR - iterations of
+    pbkdf2, cost n of scrypt) taken from config. Hashes use werkzeug format, so
+    hashes created before stay valid, needs_rehash tells when a stored hash was
+    made with other parameters. With PASSWORD_HASH_WORKERS > 0 hashing runs in
+    a process pool of that size, at most PASSWORD_HASH_QUEUE_SIZE hashes wait
+    for a worker, further requests block until a slot is free.
+    """
+    def __init__(self, app: Flask = None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.config.setdefault('PASSWORD_HASH_ALGORITHM', 'pbkdf2:sha256')
+        app.config.setdefault('PASSWORD_HASH_WORK_FACTOR', 150000)
+        app.config.setdefault('PASSWORD_HASH_SALT_LENGTH', 8)
+        app.config.setdefault('PASSWORD_HASH_WORKERS', 0)
+        app.config.setdefault('PASSWORD_HASH_QUEUE_SIZE', 64)
+        algorithm = app.config['PASSWORD_HASH_ALGORITHM']
+        if algorithm != 'scrypt' and not algorithm.startswith('pbkdf2:'):
+            raise ValueError(f'Unsupported password hash algorithm {algorithm}, use pbkdf2:<digest> or scrypt')
+        app.extensions['password_hasher'] = {'executor': None, 'slots': None, 'lock': Lock()}
+
+    @property
+    def method(self) -> str:
+        return get_method(current_app.config['PASSWORD_HASH_ALGORITHM'], current_app.config['PASSWORD_HASH_WORK_FACTOR'])
+
+    def _run(self, func: Callable, *args):
+        workers = current_app.config['PASSWORD_HASH_WORKERS']
+        if not workers:
+            return func(*args)
+        state = current_app.extensions['password_hasher']
+        if state['executor'] is None:
+            with state['lock']:
+                if state['executor'] is None:
+                    state['slots'] = BoundedSemaphore(workers + current_app.config['PASSWORD_HASH_QUEUE_SIZE'])
+                    state['executor'] = ProcessPoolExecutor(max_workers=workers)
+        with state['slots']:
+            return state['executor'].submit(func, *args).result()
+
+    def hash(self, password: str) -> str:
+        return self._run(hash_password, password, self.method, current_app.config['PASSWORD_HASH_SALT_LENGTH'])
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        return self._run(verify_password, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return password_hash.split('$', 1)[0] != self.method
+
+    def shutdown(self):
+        state = current_app.extensions['password_hasher']
+        with state['lock']:
+            if state['executor'] is not None:
+                state['executor'].shutdown()
+                state['executor'] = None
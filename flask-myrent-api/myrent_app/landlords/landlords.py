@@ -3,25 +3,34 @@ from flask import jsonify, abort, request
 from webargs.flaskparser import use_args
 from pathlib import Path
 
-from myrent_app import db
+from myrent_app import db, response_cache
 from myrent_app.landlords import landlords_bp
 from myrent_app.models import Landlord, LandlordSchema, landlord_schema, \
     landlord_update_password_schema
+from myrent_app.serialization import fast_dump, json_response
 from myrent_app.utils import validate_json_content_type, token_landlord_required, \
-    get_schema_args, apply_order, apply_filter, get_pagination, generate_hashed_password
+    get_schema_args, apply_order, apply_filter, get_pagination, generate_hashed_password, \
+    apply_eager_loading, apply_load_only, get_not_modified_response, commit_or_conflict
 
 
 @landlords_bp.route('/landlords', methods=['GET'])
 # @cross_origin
+@response_cache.cached('landlords', 'flats')
 def get_all_landlords():
     query = Landlord.query
+    schema_args = get_schema_args(Landlord)
+    schema = LandlordSchema(**schema_args)
     query = apply_order(Landlord, query)
     query = apply_filter(Landlord, query)
+    query = apply_load_only(Landlord, query, schema_args)
+    query = apply_eager_loading(Landlord, query, schema)
     items, pagination = get_pagination(query, 'landlords.get_all_landlords')
-    schema_args = get_schema_args(Landlord)
-    landlords = LandlordSchema(**schema_args).dump(items)
+    not_modified = get_not_modified_response(schema, items, pagination)
+    if not_modified is not None:
+        return not_modified
+    landlords = fast_dump(schema, items)
 
-    return jsonify({
+    return json_response({
         'success': True,
         'data': landlords,
         'number_of_records': len(landlords),
@@ -33,6 +42,9 @@ def get_all_landlords():
 def get_one_landlord(landlord_id: int):
     landlord = Landlord.query.get_or_404(landlord_id, 
                     description=f'Landlord with id {landlord_id} not found')
+    not_modified = get_not_modified_response(landlord_schema, landlord)
+    if not_modified is not None:
+        return not_modified
 
     return jsonify({
         'success': True,
@@ -44,23 +56,21 @@ def get_one_landlord(landlord_id: int):
 @validate_json_content_type
 @use_args(landlord_schema, error_status_code=400)
 def register_landlord(args: dict):
-    if Landlord.query.filter(Landlord.identifier == args['identifier']).first():
-        abort(409, description=f'Landlord with identifier {args["identifier"]} already exists')
-
-    if Landlord.query.filter(Landlord.email == args['email']).first():
-        abort(409, description=f'Landlord with email {args["email"]} already exists') 
-    
     args['password'] = generate_hashed_password(args['password'])
     
     new_landlord = Landlord(**args)
     db.session.add(new_landlord)
-    db.session.commit()
+    commit_or_conflict({
+        'identifier': f'Landlord with identifier {args["identifier"]} already exists',
+        'email': f'Landlord with email {args["email"]} already exists'
+    })
 
     token = new_landlord.generate_jwt()
 
     return jsonify({
         'success': True,
-        'token': token.decode()
+        'token': token.decode(),
+        'refresh_token': new_landlord.generate_refresh_token().decode()
     }), 201
 
 
@@ -76,11 +86,15 @@ def login_landlord(args: dict):
     if not landlord.is_password_valid(args['password']):
         abort(401, description='Invalid credentials')
 
+    if db.session.is_modified(landlord):
+        db.session.commit()
+
     token = landlord.generate_jwt()
 
     return jsonify({
         'success': True,
-        'token': token.decode()
+        'token': token.decode(),
+        'refresh_token': landlord.generate_refresh_token().decode()
     })
 
 
@@ -108,6 +122,7 @@ def update_landlord_password(landlord_id: str, args: dict):
         abort(401, description='Invalid password')
 
     landlord.password = generate_hashed_password(args['new_password'])
+    landlord.token_generation = Landlord.token_generation + 1  # refresh tokens issued before stop being accepted
     db.session.commit()
     
     return jsonify({
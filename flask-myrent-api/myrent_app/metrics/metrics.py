@@ -0,0 +1,26 @@
+from flask import jsonify
+
+from myrent_app import pool_metrics, profiler, response_cache
+from myrent_app.metrics import metrics_bp
+from myrent_app.utils import metrics_token_required
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+@metrics_token_required
+def get_metrics():
+    return jsonify({
+        'success': True,
+        'data': {
+            'pool': pool_metrics.stats(),
+            'response_cache': response_cache.stats()
+        }
+    })
+
+
+@metrics_bp.route('/metrics/requests', methods=['GET'])
+@metrics_token_required
+def get_request_metrics():
+    return jsonify({
+        'success': True,
+        'data': profiler.stats()
+    })
@@ -1,9 +1,9 @@
 import jwt
+import secrets
 from flask import current_app
 from datetime import datetime, timedelta
 from marshmallow import Schema, fields, validate
-from werkzeug.security import check_password_hash
-from myrent_app import db
+from myrent_app import db, password_hasher
 
 
 class TimestampMixin(object):
@@ -13,6 +13,9 @@ class TimestampMixin(object):
 
 class Landlord(TimestampMixin, db.Model):
     __tablename__ = 'landlords'
+    __table_args__ = (
+        db.Index('ix_landlords_last_name_first_name', 'last_name', 'first_name'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     identifier = db.Column(db.String(255), unique=True, nullable=False, index=True)
     email = db.Column(db.String(255), unique=True, nullable=False)
@@ -22,6 +25,7 @@ class Landlord(TimestampMixin, db.Model):
     address = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
     password = db.Column(db.String(255), nullable=False)
+    token_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0', info={'private': True})
     flats = db.relationship('Flat', back_populates='landlord')
     tenants = db.relationship('Tenant', back_populates='landlord')
 
@@ -42,8 +46,25 @@ class Landlord(TimestampMixin, db.Model):
         }
         return jwt.encode(payload, current_app.config.get('SECRET_KEY'))
 
+    def generate_refresh_token(self) -> bytes:
+        refresh_token_expired_days = current_app.config.get('REFRESH_TOKEN_EXPIRED_DAYS', 30)
+        payload = {
+            'id': self.id,
+            'model': 'landlords',
+            'type': 'refresh',
+            'jti': secrets.token_urlsafe(16),
+            'generation': self.token_generation,
+            'exp': datetime.utcnow() + timedelta(days=refresh_token_expired_days)
+        }
+        return jwt.encode(payload, current_app.config.get('SECRET_KEY'))
+
     def is_password_valid(self, password: str) -> bool:
-        return check_password_hash(self.password, password)
+        """Checks the password, hash made with outdated hasher parameters is replaced (commit is up to the caller)"""
+        if not password_hasher.verify(self.password, password):
+            return False
+        if password_hasher.needs_rehash(self.password):
+            self.password = password_hasher.hash(password)
+        return True
 
 
 class Flat(TimestampMixin, db.Model):
@@ -52,8 +73,8 @@ class Flat(TimestampMixin, db.Model):
     identifier = db.Column(db.String(255), unique=True, nullable=False)
     address = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
-    status = db.Column(db.String(50), default='active')  #active/inactive/sold
-    landlord_id = db.Column(db.Integer, db.ForeignKey('landlords.id'), nullable=False)
+    status = db.Column(db.String(50), default='active', index=True)  #active/inactive/sold
+    landlord_id = db.Column(db.Integer, db.ForeignKey('landlords.id'), nullable=False, index=True)
     landlord = db.relationship('Landlord', back_populates='flats')
     agreements = db.relationship('Agreement', back_populates='flat')
     pictures = db.relationship('Picture', back_populates='flat')
@@ -72,7 +93,7 @@ class Picture(TimestampMixin, db.Model):
     name = db.Column(db.String(50), unique=True, nullable = False)
     path = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
-    flat_id = db.Column(db.Integer, db.ForeignKey('flats.id'), nullable=False)
+    flat_id = db.Column(db.Integer, db.ForeignKey('flats.id'), nullable=False, index=True)
     flat = db.relationship('Flat', back_populates='pictures')
 
     def __repr__(self):
@@ -85,6 +106,9 @@ class Picture(TimestampMixin, db.Model):
 
 class Tenant(TimestampMixin, db.Model):
     __tablename__ = 'tenants'
+    __table_args__ = (
+        db.Index('ix_tenants_last_name_first_name', 'last_name', 'first_name'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     identifier = db.Column(db.String(255), unique=True, nullable=False, index=True)
     email = db.Column(db.String(255), unique=True, nullable=False)
@@ -94,7 +118,8 @@ class Tenant(TimestampMixin, db.Model):
     address = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
     password = db.Column(db.String(255), nullable=False)
-    landlord_id = db.Column(db.Integer, db.ForeignKey('landlords.id'), nullable=False)
+    token_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0', info={'private': True})
+    landlord_id = db.Column(db.Integer, db.ForeignKey('landlords.id'), nullable=False, index=True)
     landlord = db.relationship('Landlord', back_populates='tenants')
     agreements = db.relationship('Agreement', back_populates='tenant')
 
@@ -115,8 +140,26 @@ class Tenant(TimestampMixin, db.Model):
 
         return jwt.encode(payload, current_app.config.get('SECRET_KEY'))
 
+    def generate_refresh_token(self) -> bytes:
+        refresh_token_expired_days = current_app.config.get('REFRESH_TOKEN_EXPIRED_DAYS', 30)
+        payload = {
+            'id': self.id,
+            'model': 'tenants',
+            'type': 'refresh',
+            'jti': secrets.token_urlsafe(16),
+            'generation': self.token_generation,
+            'exp': datetime.utcnow() + timedelta(days=refresh_token_expired_days)
+        }
+
+        return jwt.encode(payload, current_app.config.get('SECRET_KEY'))
+
     def is_password_valid(self, password: str) -> bool:
-        return check_password_hash(self.password, password)
+        """Checks the password, hash made with outdated hasher parameters is replaced (commit is up to the caller)"""
+        if not password_hasher.verify(self.password, password):
+            return False
+        if password_hasher.needs_rehash(self.password):
+            self.password = password_hasher.hash(password)
+        return True
 
 
 class Agreement(TimestampMixin, db.Model):
@@ -124,15 +167,15 @@ class Agreement(TimestampMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     identifier = db.Column(db.String(50), unique=True, nullable=False, index=True)
     sign_date = db.Column(db.Date, nullable=False)
-    date_from = db.Column(db.Date, nullable=False)
-    date_to = db.Column(db.Date, nullable=False)
+    date_from = db.Column(db.Date, nullable=False, index=True)
+    date_to = db.Column(db.Date, nullable=False, index=True)
     price_value = db.Column(db.Float, nullable=False)
     price_period = db.Column(db.String(10), nullable=False)  #'day'/'month'
     payment_deadline = db.Column(db.Integer, nullable=False)
     deposit_value = db.Column(db.Float, default=0)
     description = db.Column(db.Text)
-    flat_id = db.Column(db.Integer, db.ForeignKey('flats.id'), nullable=False)
-    tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=False)
+    flat_id = db.Column(db.Integer, db.ForeignKey('flats.id'), nullable=False, index=True)
+    tenant_id = db.Column(db.Integer, db.ForeignKey('tenants.id'), nullable=False, index=True)
     flat = db.relationship('Flat', back_populates='agreements')
     tenant = db.relationship('Tenant', back_populates='agreements')
     settlements = db.relationship('Settlement', back_populates='agreement')
@@ -155,9 +198,9 @@ class Settlement(TimestampMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(50), nullable=False)
     value = db.Column(db.Float, nullable=False)
-    date = db.Column(db.Date, nullable=False, default=datetime.now().date())
+    date = db.Column(db.Date, nullable=False, default=datetime.now().date(), index=True)
     description = db.Column(db.Text)
-    agreement_id = db.Column(db.Integer, db.ForeignKey('agreements.id'), nullable=False)
+    agreement_id = db.Column(db.Integer, db.ForeignKey('agreements.id'), nullable=False, index=True)
     agreement = db.relationship('Agreement', back_populates='settlements')
 
     def __repr__(self):
@@ -293,6 +336,10 @@ class PictureSchema(Schema):
     updated = fields.DateTime(dump_only=True)                                                    
 
 
+class RefreshTokenSchema(Schema):
+    refresh_token = fields.String(required=True)
+
+
 landlord_schema = LandlordSchema()
 landlord_update_password_schema = LandlordUpdatePasswordSchema()
 flat_schema = FlatSchema()
@@ -301,3 +348,4 @@ tenant_update_password_schema = TenantUpdatePasswordSchema()
 agreement_schema = AgreementSchema()
 settlement_schema = SettlementSchema()
 picture_schema = PictureSchema()
+refresh_token_schema = RefreshTokenSchema()
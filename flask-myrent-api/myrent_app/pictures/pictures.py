@@ -4,10 +4,13 @@ from flask import jsonify, abort, current_app, send_file, request, url_for, \
 from werkzeug.utils import secure_filename
 from pathlib import Path
 
-from myrent_app import db
+from myrent_app import db, response_cache
 from myrent_app.pictures import pictures_bp
 from myrent_app.models import Picture, Flat, PictureSchema, picture_schema
-from myrent_app.utils import allowed_picture, token_landlord_required
+from myrent_app.serialization import fast_dump, json_response
+from myrent_app.utils import allowed_picture, token_landlord_required, apply_eager_loading, \
+                            get_not_modified_response, get_schema_args, apply_order, \
+                            apply_filter, apply_load_only, get_pagination
 
 
 @pictures_bp.route('/', methods=['GET', 'POST'])
@@ -21,22 +24,42 @@ def upload_test_file():
 
 
 @pictures_bp.route('/pictures', methods=['GET'])
+@response_cache.cached('pictures', 'flats')
 def get_pictures():
-    pictures = Picture.query.all()
+    schema = PictureSchema(many=True)
+    pictures = apply_eager_loading(Picture, Picture.query, schema).all()
+    not_modified = get_not_modified_response(schema, pictures)
+    if not_modified is not None:
+        return not_modified
 
     return jsonify({
         'success': True,
-        'data': PictureSchema(many=True).dump(pictures)
+        'data': schema.dump(pictures)
     })
 
 
 @pictures_bp.route('/flats/<int:flat_id>/pictures', methods=['GET'])
 def get_flat_pictures(flat_id: int):
-    flat = Flat.query.get_or_404(flat_id, description=f'Flat with id {flat_id} not found')
-
-    return jsonify({
+    Flat.query.get_or_404(flat_id, description=f'Flat with id {flat_id} not found')
+    query = Picture.query.filter(Picture.flat_id == flat_id)
+    schema_args = get_schema_args(Picture)
+    schema = PictureSchema(**schema_args)
+    query = apply_order(Picture, query)
+    query = apply_filter(Picture, query)
+    query = apply_load_only(Picture, query, schema_args)
+    query = apply_eager_loading(Picture, query, schema)
+    items, pagination = get_pagination(query, 'pictures.get_flat_pictures')
+    not_modified = get_not_modified_response(schema, items, pagination)
+    if not_modified is not None:
+        return not_modified
+
+    pictures = fast_dump(schema, items)
+
+    return json_response({
         'success': True,
-        'data': PictureSchema(many=True).dump(flat.pictures)
+        'data': pictures,
+        'number_of_records': len(pictures),
+        'pagination': pagination
     })
 
 
@@ -44,6 +67,9 @@ def get_flat_pictures(flat_id: int):
 def get_picture(picture_id: int):
     picture = Picture.query.get_or_404(picture_id, 
                 description=f'Picture with id {picture_id} not found')
+    not_modified = get_not_modified_response(picture_schema, picture)
+    if not_modified is not None:
+        return not_modified
 
     return jsonify({
         'success': True,
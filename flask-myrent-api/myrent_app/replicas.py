@@ -0,0 +1,190 @@
+import jwt
+import random
+import sqlite3
+import time
+from contextlib import closing
+from threading import Lock
+from typing import Callable, Optional
+from flask import Flask, Response, current_app, g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import URL
+
+from myrent_app.pool import get_pool_options
+
+
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+STICKY_COOKIE = 'read_primary_until'
+IDENTITY_CLAIMS = ['model', 'id']  #claims tokenu JWT identyfikujące użytkownika
+PURGE_INTERVAL = 60
+
+
+def get_identity() -> Optional[str]:
+    """Identity of the user of the bearer token, None for requests without a valid access token"""
+    from myrent_app.utils import decode_token
+
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme != 'Bearer' or not token:
+        return None
+    try:
+        payload = decode_token(token)
+    except jwt.InvalidTokenError:
+        return None
+    if payload.get('type') == 'refresh' or any(claim not in payload for claim in IDENTITY_CLAIMS):
+        return None
+    return ':'.join(str(payload[claim]) for claim in IDENTITY_CLAIMS)
+
+
+class StickyWrites:
+    """
+    Time until which a user reads from the primary after its write, keyed by
+    identity of the bearer token, so read-your-writes works for clients
+    dropping cookies. In memory (per process) when REPLICA_STICKY_DATABASE is
+    not set, otherwise stored in that SQLite file shared by all workers.
+    """
+    def __init__(self, app: Flask):
+        self.database = app.config['REPLICA_STICKY_DATABASE']
+        self.writes = {}
+        self.lock = Lock()
+        self.purged_at = time.time()
+        if self.database:
+            with closing(self._connect()) as connection, connection:
+                connection.execute('CREATE TABLE IF NOT EXISTS sticky_writes (identity TEXT PRIMARY KEY, '
+                                   'until REAL NOT NULL)')
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.database, timeout=5)
+
+    def add(self, identity: str, until: float):
+        now = time.time()
+        purge = now - self.purged_at > PURGE_INTERVAL
+        if purge:
+            self.purged_at = now
+        if self.database:
+            with closing(self._connect()) as connection, connection:
+                if purge:
+                    connection.execute('DELETE FROM sticky_writes WHERE until < ?', (now,))
+                connection.execute('INSERT OR REPLACE INTO sticky_writes (identity, until) VALUES (?, ?)',
+                                   (identity, until))
+            return
+        with self.lock:
+            if purge:
+                for expired_identity in [key for key, value in self.writes.items() if value < now]:
+                    del self.writes[expired_identity]
+            self.writes[identity] = until
+
+    def get(self, identity: str) -> float:
+        if self.database:
+            with closing(self._connect()) as connection:
+                row = connection.execute('SELECT until FROM sticky_writes WHERE identity = ?', (identity,)).fetchone()
+            return row[0] if row is not None else 0
+        return self.writes.get(identity, 0)
+
+
+def _is_sticky() -> bool:
+    """
+    Client wrote recently, so it reads from the primary - the cookie set on its
+    write response or the write recorded for the user of its bearer token
+    """
+    now = time.time()
+    sticky_seconds = current_app.config['REPLICA_STICKY_SECONDS']
+    try:
+        until = float(request.cookies.get(STICKY_COOKIE, 0))
+    except ValueError:
+        until = 0
+    if now < until <= now + sticky_seconds:
+        return True
+    identity = get_identity()
+    return identity is not None and now < current_app.extensions['replicas']['sticky_writes'].get(identity)
+
+
+def get_replica_bind_key() -> Optional[str]:
+    """
+    Bind key of the replica used by the current request (chosen once per
+    request), None when the request has to be served by the primary - no
+    replicas configured, not a safe method or client within sticky window
+    """
+    replica_bind_keys = current_app.extensions['replicas']['bind_keys']
+    if not replica_bind_keys or not has_request_context() or request.method not in SAFE_METHODS:
+        return None
+    if 'replica_bind_key' not in g:
+        g.replica_bind_key = None if _is_sticky() else random.choice(replica_bind_keys)
+    return g.replica_bind_key
+
+
+class RoutingSession(SignallingSession):
+    """Session reading from a replica on safe requests, flushes always go to the primary"""
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing:
+            replica_bind_key = get_replica_bind_key()
+            if replica_bind_key is not None:
+                return get_state(self.app).db.get_engine(self.app, bind=replica_bind_key)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """
+    SQLAlchemy extension with read replicas - every URI of SQLALCHEMY_REPLICA_URIS
+    is registered as replica_<n> bind, GET/HEAD/OPTIONS requests read from one of
+    them, other requests (writes) use SQLALCHEMY_DATABASE_URI. After a successful
+    write the client (cookie) and the user of its token read from the primary
+    for REPLICA_STICKY_SECONDS (read-your-writes). Engines are created on first use, extensions attach
+    their event listeners to them with listen_engines.
+    """
+    def init_app(self, app: Flask):
+        replica_uris = app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+        app.config.setdefault('REPLICA_STICKY_DATABASE', None)
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        bind_keys = []
+        for number, uri in enumerate(replica_uris):
+            bind_keys.append(f'replica_{number}')
+            binds[bind_keys[-1]] = uri
+        app.config['SQLALCHEMY_BINDS'] = binds or None
+        app.extensions['replicas'] = {
+            'bind_keys': bind_keys,
+            'sticky_writes': StickyWrites(app) if bind_keys else None,
+            'engines': {},
+            'listeners': [],
+            'lock': Lock()
+        }
+        super().init_app(app)
+        app.after_request(mark_write)
+
+    def create_session(self, options: dict) -> orm.sessionmaker:
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url: URL, engine_opts: dict) -> Engine:
+        return super().create_engine(sa_url, get_pool_options(sa_url, engine_opts))
+
+    @staticmethod
+    def listen_engines(app: Flask, listener: Callable[[Engine, Optional[str]], None]):
+        """listener(engine, bind_key) is called with every engine of the app right after it is created"""
+        app.extensions['replicas']['listeners'].append(listener)
+
+    def get_engine(self, app: Flask = None, bind: str = None) -> Engine:
+        app = self.get_app(app)
+        engine = super().get_engine(app, bind)
+        state = app.extensions['replicas']
+        if state['engines'].get(bind) is engine:
+            return engine
+        with state['lock']:
+            if state['engines'].get(bind) is not engine:
+                for listener in state['listeners']:
+                    listener(engine, bind)
+                state['engines'][bind] = engine
+        return engine
+
+
+def mark_write(response: Response) -> Response:
+    """After a successful write the client and the user of its token read from the primary for a while"""
+    if (current_app.extensions['replicas']['bind_keys'] and request.method not in SAFE_METHODS
+            and response.status_code < 400):
+        sticky_seconds = current_app.config['REPLICA_STICKY_SECONDS']
+        until = time.time() + sticky_seconds
+        response.set_cookie(STICKY_COOKIE, str(until), max_age=sticky_seconds, httponly=True, samesite='Lax')
+        identity = get_identity()
+        if identity is not None:
+            current_app.extensions['replicas']['sticky_writes'].add(identity, until)
+    return response
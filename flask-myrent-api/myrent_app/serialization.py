@@ -0,0 +1,105 @@
+import json
+from threading import Lock
+from typing import Any, Callable, Optional
+from flask import Response, current_app
+from marshmallow import Schema, fields, missing
+
+from myrent_app.profiling import profile_section
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), default=str).encode()
+
+
+def _orjson_dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+
+
+JSON_PROVIDERS = {'json': _json_dumps}
+if orjson is not None:
+    JSON_PROVIDERS['orjson'] = _orjson_dumps
+
+
+def dumps(obj: Any) -> bytes:
+    """Serializes obj with JSON_PROVIDER from config (orjson when installed, json otherwise)"""
+    provider = current_app.config.get('JSON_PROVIDER') or ('orjson' if orjson is not None else 'json')
+    return JSON_PROVIDERS.get(provider, _json_dumps)(obj)
+
+
+def json_response(payload: dict, status: int = 200) -> Response:
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+_serializers = {}
+_serializers_lock = Lock()
+
+
+def _get_converter(field: fields.Field) -> Optional[Callable]:
+    field_type = type(field)
+    if field_type is fields.Integer:
+        return int
+    if field_type is fields.Float:
+        return float
+    if field_type in {fields.String, fields.Email}:
+        return str
+    if field_type is fields.Date and field.format not in {None, 'iso'}:
+        return lambda value: value.strftime(field.format)
+    if field_type in {fields.Date, fields.DateTime} and field.format in {None, 'iso'}:
+        return lambda value: value.isoformat()
+    if field_type is fields.Nested and not field.schema.many:
+        return compile_serializer(field.schema)
+    if field_type is fields.List and type(field.inner) is fields.Nested and not field.inner.schema.many:
+        nested_serializer = compile_serializer(field.inner.schema)
+        return lambda values: [nested_serializer(value) for value in values]
+    return None
+
+
+def _compile(schema: Schema) -> Callable[[Any], dict]:
+    getters = []
+    for field_name, field in schema.dump_fields.items():
+        getters.append((field.data_key or field_name, field.attribute or field_name, _get_converter(field), field))
+
+    def serialize(obj: Any) -> dict:
+        data = {}
+        for key, attribute, converter, field in getters:
+            if converter is None:
+                value = field.serialize(attribute, obj)
+                if value is missing:
+                    continue
+            else:
+                value = getattr(obj, attribute)
+                if value is not None:
+                    value = converter(value)
+            data[key] = value
+        return data
+
+    return serialize
+
+
+def compile_serializer(schema: Schema) -> Callable[[Any], dict]:
+    """
+    Returns object to dict serializer generated from the schema fields (respecting
+    only/exclude), it gives the same output as schema.dump without per-field dispatch
+    of marshmallow, unsupported field types are serialized by the field itself
+    """
+    only = frozenset(schema.only) if schema.only is not None else None
+    key = (type(schema), only, frozenset(schema.exclude))
+    serializer = _serializers.get(key)
+    if serializer is None:
+        serializer = _compile(schema)
+        with _serializers_lock:
+            _serializers[key] = serializer
+    return serializer
+
+
+def fast_dump(schema: Schema, obj: Any) -> Any:
+    serializer = compile_serializer(schema)
+    with profile_section('dump'):
+        if schema.many:
+            return [serializer(item) for item in obj]
+        return serializer(obj)
@@ -4,8 +4,11 @@ from myrent_app import db
 from myrent_app.settlements import settlements_bp
 from myrent_app.models import Settlement, SettlementSchema, settlement_schema, \
                             Agreement, Flat, Landlord
+from myrent_app.serialization import fast_dump, json_response
 from myrent_app.utils import validate_json_content_type, token_landlord_required, \
-                            token_landlord_tenant_required
+                            token_landlord_tenant_required, apply_eager_loading, \
+                            get_not_modified_response, get_schema_args, apply_order, \
+                            apply_filter, apply_load_only, get_pagination
 
 
 @settlements_bp.route('/settlements', methods=['GET'])
@@ -22,7 +25,12 @@ def get_all_settlements(id_model_tuple: tuple):
                         .join(Agreement) \
                         .filter(Agreement.tenant_id == id_model_tuple[0])
 
-    settlements = SettlementSchema(many=True).dump(items)
+    schema = SettlementSchema(many=True)
+    items = apply_eager_loading(Settlement, items, schema).all()
+    not_modified = get_not_modified_response(schema, items)
+    if not_modified is not None:
+        return not_modified
+    settlements = schema.dump(items)
 
     return jsonify({
         'success': True,
@@ -46,12 +54,25 @@ def get_agreement_settlements(id_model_tuple: tuple, agreement_id: int):
         if agreement.tenant_id != id_model_tuple[0]:
             abort(404, description=f'Agreement {agreement_id} not found')
 
-    settlements = SettlementSchema(many=True).dump(agreement.settlements)
-
-    return jsonify({
+    query = Settlement.query.filter(Settlement.agreement_id == agreement_id)
+    schema_args = get_schema_args(Settlement)
+    schema = SettlementSchema(**schema_args)
+    query = apply_order(Settlement, query)
+    query = apply_filter(Settlement, query)
+    query = apply_load_only(Settlement, query, schema_args)
+    query = apply_eager_loading(Settlement, query, schema)
+    items, pagination = get_pagination(query, 'settlements.get_agreement_settlements')
+    not_modified = get_not_modified_response(schema, items, pagination)
+    if not_modified is not None:
+        return not_modified
+
+    settlements = fast_dump(schema, items)
+
+    return json_response({
         'success': True,
         'data': settlements,
-        'number_of_records': len(settlements)
+        'number_of_records': len(settlements),
+        'pagination': pagination
     })
 
 
@@ -69,6 +90,9 @@ def get_settlement(id_model_tuple: tuple, settlement_id: int):
     if id_model_tuple[1] == 'tenants':
         if settlement.agreement.tenant_id != id_model_tuple[0]:
             abort(404, description=f'Settlement {settlement_id} not found')
+    not_modified = get_not_modified_response(settlement_schema, settlement)
+    if not_modified is not None:
+        return not_modified
 
     return jsonify({
         'success': True,
@@ -4,20 +4,36 @@ from myrent_app import db
 from myrent_app.tenants import tenants_bp
 from myrent_app.models import Tenant, TenantSchema, tenant_schema, \
                             tenant_update_password_schema
+from myrent_app.serialization import fast_dump, json_response
 from myrent_app.utils import token_landlord_required, token_landlord_tenant_required, \
-                            validate_json_content_type, generate_hashed_password
+                            validate_json_content_type, generate_hashed_password, \
+                            get_not_modified_response, commit_or_conflict, get_schema_args, \
+                            apply_order, apply_filter, apply_load_only, apply_eager_loading, \
+                            get_pagination
 
 
 @tenants_bp.route('/tenants', methods=['GET'])
 @token_landlord_required
 def get_landlord_tenants(landlord_id: int):
-    tenants = Tenant.query.filter(Tenant.landlord_id == landlord_id).all()
-    items = TenantSchema(many=True, exclude=['landlord']).dump(tenants)
-
-    return jsonify({
+    query = Tenant.query.filter(Tenant.landlord_id == landlord_id)
+    schema_args = get_schema_args(Tenant)
+    schema = TenantSchema(exclude=['landlord'], **schema_args)
+    query = apply_order(Tenant, query)
+    query = apply_filter(Tenant, query)
+    query = apply_load_only(Tenant, query, schema_args)
+    query = apply_eager_loading(Tenant, query, schema)
+    items, pagination = get_pagination(query, 'tenants.get_landlord_tenants')
+    not_modified = get_not_modified_response(schema, items, pagination)
+    if not_modified is not None:
+        return not_modified
+
+    tenants = fast_dump(schema, items)
+
+    return json_response({
         'success': True,
-        'data': items,
-        'number_of_records': len(items)
+        'data': tenants,
+        'number_of_records': len(tenants),
+        'pagination': pagination
     })
 
 
@@ -28,6 +44,9 @@ def get_landlord_tenant(landlord_id: int, tenant_id: int):
                         .filter(Tenant.id == tenant_id).first()
     if tenant is None:
         abort(404, description=f'Tenant with id {tenant_id} not found')
+    not_modified = get_not_modified_response(tenant_schema, tenant)
+    if not_modified is not None:
+        return not_modified
 
     return jsonify({
         'success': True,
@@ -40,17 +59,14 @@ def get_landlord_tenant(landlord_id: int, tenant_id: int):
 @validate_json_content_type
 @use_args(TenantSchema(exclude=['landlord_id']), error_status_code=400)
 def create_tenant(landlord_id: int, args: dict):
-    if Tenant.query.filter(Tenant.identifier == args['identifier']).first():
-        abort(409, description=f'Tenant with identifier {args["identifier"]} already exists')
-
-    if Tenant.query.filter(Tenant.email == args['email']).first():
-        abort(409, description=f'Tenant with email {args["email"]} already exists') 
-    
     args['password'] = generate_hashed_password(args['password'])
     
     new_tenant = Tenant(landlord_id=landlord_id, **args)
     db.session.add(new_tenant)
-    db.session.commit()
+    commit_or_conflict({
+        'identifier': f'Tenant with identifier {args["identifier"]} already exists',
+        'email': f'Tenant with email {args["email"]} already exists'
+    })
 
     return jsonify({
         'success': True,
@@ -70,11 +86,15 @@ def login_tenant(args: dict):
     if not tenant.is_password_valid(args['password']):
         abort(401, description='Invalid credentials')
 
+    if db.session.is_modified(tenant):
+        db.session.commit()
+
     token = tenant.generate_jwt()
 
     return jsonify({
         'success': True,
-        'token': token.decode()
+        'token': token.decode(),
+        'refresh_token': tenant.generate_refresh_token().decode()
     })
 
 
@@ -114,6 +134,7 @@ def update_tenant_password(id_model_tuple: tuple, args: dict, tenant_id: int):
         abort(401, description='Invalid password')
 
     tenant.password = generate_hashed_password(args['new_password'])
+    tenant.token_generation = Tenant.token_generation + 1  # refresh tokens issued before stop being accepted
     db.session.commit()
 
     return jsonify({
@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+tokens_bp = Blueprint('tokens', __name__)
+
+from myrent_app.tokens import tokens
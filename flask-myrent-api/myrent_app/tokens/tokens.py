@@ -0,0 +1,41 @@
+from flask import abort, jsonify
+from webargs.flaskparser import use_args
+
+from myrent_app import token_denylist
+from myrent_app.tokens import tokens_bp
+from myrent_app.models import Landlord, Tenant, refresh_token_schema
+from myrent_app.utils import validate_json_content_type, decode_refresh_token
+
+
+MODELS = {'landlords': Landlord, 'tenants': Tenant}
+
+
+@tokens_bp.route('/token/refresh', methods=['POST'])
+@validate_json_content_type
+@use_args(refresh_token_schema, error_status_code=400)
+def refresh_token(args: dict):
+    payload = decode_refresh_token(args['refresh_token'])
+    model = MODELS.get(payload.get('model'))
+    item = model.query.get(payload['id']) if model is not None else None
+    if item is None or payload.get('generation', 0) != item.token_generation \
+            or not token_denylist.add(payload['jti'], payload['exp']):
+        abort(401, description='Revoked refresh token. Please login to get new token.')
+
+    return jsonify({
+        'success': True,
+        'token': item.generate_jwt().decode(),
+        'refresh_token': item.generate_refresh_token().decode()
+    })
+
+
+@tokens_bp.route('/token/revoke', methods=['POST'])
+@validate_json_content_type
+@use_args(refresh_token_schema, error_status_code=400)
+def revoke_token(args: dict):
+    payload = decode_refresh_token(args['refresh_token'])
+    token_denylist.add(payload['jti'], payload['exp'])
+
+    return jsonify({
+        'success': True,
+        'data': 'Refresh token has been revoked'
+    })
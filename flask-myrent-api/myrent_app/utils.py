@@ -1,16 +1,36 @@
+import base64
+import binascii
+import json
 import re
+import secrets
 import jwt
-from flask import request, abort, current_app, url_for
+import math
+from datetime import date, datetime
+from hashlib import md5
+from flask import request, abort, current_app, url_for, g, Response
 from flask_sqlalchemy import DefaultMeta, BaseQuery
-from functools import wraps
-from typing import Tuple
+from functools import lru_cache, wraps
+from operator import eq, ge, gt, le, lt
+from marshmallow import Schema, fields
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_, or_, false, func, text, inspect, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload, load_only
+from sqlalchemy.orm.strategy_options import Load
 from sqlalchemy.orm.attributes import InstrumentedAttribute
 from sqlalchemy.sql.expression import BinaryExpression
 from werkzeug.exceptions import UnsupportedMediaType
-from werkzeug.security import generate_password_hash
+
+from myrent_app import db, count_cache, token_cache, token_denylist, password_hasher
 
 
 COMPARISON_OPERATORS_RE = re.compile(r'(.*)\[(gte|lte|gt|lt)\]')
+COMPARISON_OPERATORS = {'==': eq, 'gte': ge, 'gt': gt, 'lte': le, 'lt': lt}
+RESERVED_PARAMS = ['fields', 'sort', 'page', 'limit', 'cursor', 'count']
+QUERY_PLAN_CACHE_SIZE = 256
+UNIQUE_VIOLATION_RE = re.compile(r"UNIQUE constraint failed: \w+\.(\w+)"
+                                 r"|Duplicate entry .* for key '(?:\w+\.)?(\w+)'"
+                                 r"|Key \((\w+)\)=")
 
 def validate_json_content_type(func):
     @wraps(func)
@@ -21,42 +41,101 @@ def validate_json_content_type(func):
         return func(*args, **kwargs)
     return wrapper
 
-def token_landlord_required(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        token = None
-        auth = request.headers.get('Authorization')
+def decode_token(token: str) -> dict:
+    """
+    Returns payload of the token, already verified tokens are taken from
+    token_cache without checking the signature again
+    """
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, current_app.config.get('SECRET_KEY'), algorithms=['HS256'])
+        token_cache.set(token, payload)
+    return payload
 
-        if auth:
-            token = auth.split(' ')[1]
-        if token is None:
-            abort(401, description='Missing landlord token. Please login or register as landlord.')
+def get_token_payload(missing_message: str, expired_message: str, invalid_message: str) -> dict:
+    """
+    Shared implementation of token decorators, returns payload of bearer token
+    from Authorization header or aborts with 401 and given message
+    """
+    token = None
+    auth = request.headers.get('Authorization')
 
-        try:
-            payload = jwt.decode(token, current_app.config.get('SECRET_KEY'), 
-                                algorithms=['HS256'])
+    if auth and len(auth.split(' ')) == 2:
+        token = auth.split(' ')[1]
+    if token is None:
+        abort(401, description=missing_message)
 
+    try:
+        payload = decode_token(token)
+    except jwt.ExpiredSignatureError:
+        abort(401, description=expired_message)
+    except jwt.InvalidTokenError:
+        abort(401, description=invalid_message)
+    if payload.get('type') == 'refresh':
+        abort(401, description=invalid_message)
+    return payload
+
+def decode_refresh_token(token: str) -> dict:
+    """
+    Functionality of checking refresh token, returns payload of valid and
+    not revoked refresh token or aborts with 401
+    """
+    try:
+        payload = jwt.decode(token, current_app.config.get('SECRET_KEY'), algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        abort(401, description='Expired refresh token. Please login to get new token.')
+    except jwt.InvalidTokenError:
+        abort(401, description='Invalid refresh token. Please login or register.')
+    if payload.get('type') != 'refresh' or 'jti' not in payload:
+        abort(401, description='Invalid refresh token. Please login or register.')
+    if payload['jti'] in token_denylist:
+        abort(401, description='Revoked refresh token. Please login to get new token.')
+    return payload
+
+def metrics_token_required(func):
+    """
+    Functionality of protecting metrics - METRICS_TOKEN as bearer token (for
+    scrapers), or landlord token when METRICS_TOKEN is not set
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        metrics_token = current_app.config.get('METRICS_TOKEN')
+        if not metrics_token:
+            payload = get_token_payload(
+                'Missing landlord token. Please login or register as landlord.',
+                'Expired token. Please login as landlord to get new token.',
+                'Invalid token. Please login or register as landlord.'
+            )
             if payload['model'] != 'landlords':
                 abort(401, description='Only landlord functionality')
-        except jwt.ExpiredSignatureError:
-            abort(401, description='Expired token. Please login as landlord to get new token.')
-        except jwt.InvalidTokenError:
-            abort(401, description='Invalid token. Please login or register as landlord.')
+            return func(*args, **kwargs)
+        auth = request.headers.get('Authorization', '')
+        if not secrets.compare_digest(auth, f'Bearer {metrics_token}'):
+            abort(401, description='Invalid metrics token.')
+        return func(*args, **kwargs)
+    return wrapper
+
+def token_landlord_required(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        payload = get_token_payload(
+            'Missing landlord token. Please login or register as landlord.',
+            'Expired token. Please login as landlord to get new token.',
+            'Invalid token. Please login or register as landlord.'
+        )
+        if payload['model'] != 'landlords':
+            abort(401, description='Only landlord functionality')
         return func(payload['id'], *args, **kwargs)
     return wrapper
 
 def token_landlord_tenant_required(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        token = None
-        auth = request.headers.get('Authorization')
-        
-        if auth:
-            token = auth.split(' ')[1]
-        if token is None:
-            abort(401, description='Missing token. Please login or register.')
-        payload = jwt.decode(token, current_app.config.get('SECRET_KEY'), algorithms=['HS256'])
-        
+        payload = get_token_payload(
+            'Missing token. Please login or register.',
+            'Expired token. Please login to get new token.',
+            'Invalid token. Please login or register.'
+        )
         return func((payload['id'], payload['model']), *args, **kwargs)
     return wrapper
 
@@ -64,90 +143,385 @@ def get_schema_args(model: DefaultMeta) -> dict:
     fields = request.args.get('fields')
     schema_args = {'many': True}
     if fields:
-        schema_args['only'] = [field for field in fields.split(',') if field in model.__table__.columns]
+        columns = model.__table__.columns
+        schema_args['only'] = [field for field in fields.split(',')
+                               if field in columns and not columns[field].info.get('private')]
     return schema_args
 
+def apply_load_only(model: DefaultMeta, query: BaseQuery, schema_args: dict) -> BaseQuery:
+    """
+    Functionality of selecting only the columns requested with fields
+    parameter, primary and foreign keys, timestamps (ETag, Last-Modified) and
+    sort keys (keyset cursors) are always loaded (example: fields=id,identifier)
+    """
+    if 'only' not in schema_args:
+        return query
+    column_names = set(schema_args['only'])
+    column_names.update(column.key for column in model.__table__.columns
+                        if column.primary_key or column.foreign_keys 
+                        or column.key in ['created', 'updated'])
+    column_names.update(column_attr.key for column_attr, _ in _get_sort_keys(model))
+    return query.options(load_only(*column_names))
+
+def _get_loader_options(model: DefaultMeta, schema: Schema, parent: Load = None) -> List[Load]:
+    options = []
+    relationships = inspect(model).relationships
+    for field_name, field in schema.dump_fields.items():
+        attribute = field.attribute or field_name
+        if attribute not in relationships:
+            continue
+        if isinstance(field, fields.List):
+            field = field.inner
+        if not isinstance(field, fields.Nested):
+            continue
+        relationship = relationships[attribute]
+        # collections are loaded with one extra SELECT ... IN, many-to-one with a JOIN
+        if relationship.uselist:
+            loader = selectinload if parent is None else parent.selectinload
+        else:
+            loader = joinedload if parent is None else parent.joinedload
+        option = loader(getattr(model, attribute))
+        options.append(option)
+        options.extend(_get_loader_options(relationship.mapper.class_, field.schema, option))
+    return options
+
+def apply_eager_loading(model: DefaultMeta, query: BaseQuery, schema: Schema) -> BaseQuery:
+    """
+    Eager loads every relationship the schema is going to dump (respecting
+    only/exclude), so a page of results is dumped without lazy loads (N+1)
+    """
+    options = _get_loader_options(model, schema)
+    return query.options(*options) if options else query
+
+@lru_cache(maxsize=QUERY_PLAN_CACHE_SIZE)
+def _compile_sort_plan(model: DefaultMeta, sort: str) -> Tuple[tuple, tuple]:
+    sort_keys = []
+    for key in sort.split(','):
+        desc = False
+        if key.startswith('-'):
+            key = key[1:]
+            desc = True
+        if key in model.__table__.columns:
+            sort_keys.append((getattr(model, key), desc))
+    order_by = tuple(column_attr.desc() if desc else column_attr for column_attr, desc in sort_keys)
+    return tuple(sort_keys), order_by
+
+def _get_sort_keys(model: DefaultMeta) -> Tuple[Tuple[InstrumentedAttribute, bool], ...]:
+    sort = request.args.get('sort')
+    return _compile_sort_plan(model, sort)[0] if sort else ()
+
 def apply_order(model: DefaultMeta, query: BaseQuery) -> BaseQuery: 
     """
     Functionality of sorting resources, returns sort arguments to query
-    (example: sort=-id,last_name).
+    (example: sort=-id,last_name). Order clauses are compiled once per
+    model and sort parameter.
     """        
     sort_keys = request.args.get('sort')        
     if sort_keys:
-        for key in sort_keys.split(','):
-            desc = False
-            if key.startswith('-'):
-                key = key[1:]
-                desc = True
-            column_attr = getattr(model, key, None)
-            if column_attr is not None:
-                query = query.order_by(column_attr.desc()) if desc else query.order_by(column_attr)   
+        order_by = _compile_sort_plan(model, sort_keys)[1]
+        if order_by:
+            query = query.order_by(*order_by)
     return query
 
-def _get_filter_argument(column_name: InstrumentedAttribute, 
-                        value: str, 
-                        operator: str) -> BinaryExpression:
-    operator_mapping = {
-        '==': column_name == value,
-        'gte': column_name >= value,
-        'gt': column_name > value,
-        'lte': column_name <= value,
-        'lt': column_name < value,
-    }
-    return operator_mapping[operator]
+@lru_cache(maxsize=QUERY_PLAN_CACHE_SIZE)
+def _compile_filter_plan(model: DefaultMeta, params: Tuple[str, ...]) -> Tuple[tuple, ...]:
+    """
+    Filter plan for the shape of the request (names and operators of filter
+    parameters) - (parameter, column name, bound parameter key, expression)
+    tuples, values are bound per request
+    """
+    plan = []
+    for param in params:
+        column_name, operator = param, '=='
+        match = COMPARISON_OPERATORS_RE.match(param)
+        if match is not None:
+            column_name, operator = match.groups()
+        if column_name in model.__table__.columns:
+            key = f'filter_{len(plan)}'
+            filter_argument = COMPARISON_OPERATORS[operator](getattr(model, column_name), 
+                                                            bindparam(key))
+            plan.append((param, column_name, key, filter_argument))
+    return tuple(plan)
 
 def apply_filter(model: DefaultMeta, query: BaseQuery) -> BaseQuery:
     """
     Functionality of filtering resources, returns filter arguments to query
-    (example: id[gte]=3)
-    """
-    params = request.args.items()
-    if params:
-        for param, value in params:
-            if param not in ['fields', 'sort', 'page', 'limit']:
-                operator = '=='
-                match = COMPARISON_OPERATORS_RE.match(param)
-                if match is not None:
-                    param, operator = match.groups()
-                column_attr = getattr(model, param, None)
-                if column_attr is not None:
-                    value = model.additional_validation(param, value)
-                    if value is None:
-                        continue
-                    filter_argument = _get_filter_argument(column_attr, value, operator)
-                    query = query.filter(filter_argument)
+    (example: id[gte]=3). Filter expressions are compiled once per model and
+    parameter names, only values are bound per request.
+    """
+    # sorted, so the same filter set always builds the same WHERE clause
+    params = tuple(sorted(param for param in request.args if param not in RESERVED_PARAMS))
+    filter_arguments = []
+    values = {}
+    for param, column_name, key, filter_argument in _compile_filter_plan(model, params):
+        value = model.additional_validation(column_name, request.args[param])
+        if value is None:
+            continue
+        filter_arguments.append(filter_argument)
+        values[key] = value
+    if filter_arguments:
+        query = query.filter(*filter_arguments).params(**values)
     return query
 
+def _get_keyset_columns(model: DefaultMeta) -> List[Tuple[InstrumentedAttribute, bool]]:
+    columns = list(_get_sort_keys(model))
+    if not any(column_attr.key == 'id' for column_attr, _ in columns):
+        columns.append((model.id, False))
+    return columns
+
+def _encode_cursor(item: Any, columns: list, direction: str) -> str:
+    values = [getattr(item, column_attr.key) for column_attr, _ in columns]
+    data = json.dumps({'values': values, 'direction': direction}, default=str)
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+def _decode_cursor(cursor: str, columns: list) -> Tuple[list, str]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        values, direction = data['values'], data['direction']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        abort(400, description='Invalid cursor')
+    if len(values) != len(columns) or direction not in ['next', 'prev']:
+        abort(400, description='Invalid cursor')
+
+    decoded_values = []
+    for (column_attr, _), value in zip(columns, values):
+        python_type = column_attr.type.python_type
+        if value is not None and python_type is date:
+            value = date.fromisoformat(value)
+        elif value is not None and python_type is datetime:
+            value = datetime.fromisoformat(value)
+        decoded_values.append(value)
+    return decoded_values, direction
+
+def _get_seek_argument(column_attr: InstrumentedAttribute, value: Any, after: bool) -> BinaryExpression:
+    # NULLs are ordered before any other value (SQLite and MySQL behaviour)
+    if value is None:
+        return column_attr.isnot(None) if after else false()
+    if after:
+        return column_attr > value
+    return or_(column_attr < value, column_attr.is_(None))
+
+def _get_keyset_filter(columns: list, values: list, backwards: bool) -> BinaryExpression:
+    conditions = []
+    for index, ((column_attr, desc), value) in enumerate(zip(columns, values)):
+        equal_arguments = [
+            prev_column_attr.is_(None) if prev_value is None else prev_column_attr == prev_value
+            for (prev_column_attr, _), prev_value in zip(columns[:index], values[:index])
+        ]
+        seek_argument = _get_seek_argument(column_attr, value, after=desc == backwards)
+        conditions.append(and_(*equal_arguments, seek_argument))
+    return or_(*conditions)
+
+def get_keyset_pagination(query: BaseQuery, func_name: str) -> Tuple[list, dict]:
+    """
+    Functionality of keyset (cursor) pagination - seeks on the active sort
+    keys plus id instead of using OFFSET, and does not count the records
+    (example: cursor=<value of next_cursor>, empty cursor for the first page)
+    """
+    model = query.column_descriptions[0]['type']
+    limit = request.args.get('limit', current_app.config.get('PER_PAGE', 5), type=int)
+    if limit < 1:  # an empty page without next_cursor would read as the end of the collection
+        abort(400, description='Limit must be a positive integer')
+    cursor = request.args.get('cursor')
+    params = {**request.view_args, **{key: value for key, value in request.args.items() 
+                                      if key not in ['page', 'cursor']}}
+    columns = _get_keyset_columns(model)
+
+    direction = 'next'
+    if cursor:
+        values, direction = _decode_cursor(cursor, columns)
+        query = query.filter(_get_keyset_filter(columns, values, direction == 'prev'))
+
+    backwards = direction == 'prev'
+    ordering = [column_attr.desc() if desc != backwards else column_attr.asc()
+                for column_attr, desc in columns]
+    items = query.order_by(None).order_by(*ordering).limit(limit + 1).all()
+
+    has_more = len(items) > limit
+    items = items[:limit]
+    if backwards:
+        items.reverse()
+
+    pagination = {
+        'current_page': url_for(func_name, cursor=cursor or '', **params)
+    }
+
+    has_next = has_more if not backwards else True
+    has_prev = has_more if backwards else bool(cursor)
+    if items and has_next:
+        next_cursor = _encode_cursor(items[-1], columns, 'next')
+        pagination['next_cursor'] = url_for(func_name, cursor=next_cursor, **params)
+    if items and has_prev:
+        prev_cursor = _encode_cursor(items[0], columns, 'prev')
+        pagination['prev_cursor'] = url_for(func_name, cursor=prev_cursor, **params)
+
+    return items, pagination
+
+
+def _estimate_total_records(query: BaseQuery) -> int:
+    model = query.column_descriptions[0]['type']
+    bind = query.session.get_bind()
+    if bind.dialect.name == 'mysql':
+        total = query.session.execute(
+            text('SELECT TABLE_ROWS FROM information_schema.TABLES '
+                 'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name'),
+            {'table_name': model.__tablename__}
+        ).scalar()
+    else:
+        total = query.session.query(func.max(model.id)).scalar()
+    return total or 0
+
+
+def get_total_records(query: BaseQuery) -> Optional[int]:
+    """
+    Returns number of records matching the query according to count parameter
+    (exact - always run COUNT, estimate - any cached count or table statistics,
+    none - skip counting, by default counts are cached for COUNT_CACHE_TTL seconds)
+    """
+    count = request.args.get('count')
+    if count not in [None, 'exact', 'estimate', 'none']:
+        abort(400, description='Allowed count values: exact, estimate, none')
+    if count == 'none':
+        return None
+
+    key = count_cache.make_key(query)
+    total = None
+    if count == 'estimate':
+        total = count_cache.get(key)
+        if total is None and query.whereclause is None:
+            return _estimate_total_records(query)
+    elif count is None:
+        total = count_cache.get(key, ttl=current_app.config.get('COUNT_CACHE_TTL', 60))
+
+    if total is None:
+        total = query.order_by(None).count()
+        count_cache.set(key, query, total)
+    return total
+
 
 def get_pagination(query: BaseQuery, func_name: str) -> Tuple[list, dict]:
     """
     Functionality of paginating response, returns modified query
     page - page number to return
     limit - number of items in one page to return
+    count - exact/estimate/none, see get_total_records
+    cursor - keyset pagination instead of pages, see get_keyset_pagination
     """        
-    page = request.args.get('page', 1, type=int)
+    if 'cursor' in request.args:
+        return get_keyset_pagination(query, func_name)
+
+    page = max(request.args.get('page', 1, type=int), 1)
     limit = request.args.get('limit', current_app.config.get('PER_PAGE', 5), type=int)
-    params = {key: value for key, value in request.args.items() if key != 'page'}
-    paginate_obj = query.paginate(page, limit, False)
+    if limit < 0:
+        limit = 20
+    params = {**request.view_args, **{key: value for key, value in request.args.items() if key != 'page'}}
+    total = get_total_records(query)
 
-    pagination = {
-        'total_pages': paginate_obj.pages,
-        'total_records': paginate_obj.total,
-        'current_page': url_for(func_name, page=page, **params)
-    }
+    if total is None:
+        items = query.limit(limit + 1).offset((page - 1) * limit).all()
+        has_next = len(items) > limit
+        items = items[:limit]
+        pagination = {}
+    else:
+        items = query.limit(limit).offset((page - 1) * limit).all()
+        total_pages = math.ceil(total / limit) if limit else 0
+        has_next = page < total_pages
+        pagination = {
+            'total_pages': total_pages,
+            'total_records': total
+        }
 
-    if paginate_obj.has_next:
+    pagination['current_page'] = url_for(func_name, page=page, **params)
+    if has_next:
         pagination['next_page'] = url_for(func_name, page=page+1, **params)
-    if paginate_obj.has_prev:
+    if page > 1:
         pagination['previous_page'] = url_for(func_name, page=page-1, **params)
     
-    return paginate_obj.items, pagination
+    return items, pagination
+
+
+def _collect_versions(schema: Schema, obj: Any, versions: list):
+    versions.append((obj.__tablename__, obj.id, obj.updated or obj.created))
+    for field_name, field in schema.dump_fields.items():
+        if isinstance(field, fields.List):
+            field = field.inner
+        if not isinstance(field, fields.Nested):
+            continue
+        value = getattr(obj, field.attribute or field_name)
+        for nested_obj in value if isinstance(value, list) else [value]:
+            if nested_obj is not None:
+                _collect_versions(field.schema, nested_obj, versions)
+
+def get_not_modified_response(schema: Schema, obj: Any, *extra: Any) -> Optional[Response]:
+    """
+    Functionality of conditional GET - computes weak ETag (from query string,
+    timestamps of dumped objects and extra values like pagination) and 
+    Last-Modified (the latest updated/created timestamp), returns 304 response
+    if client's copy is fresh (If-None-Match/If-Modified-Since) before 
+    running the dump, otherwise validators are added to the response 
+    by set_conditional_headers. Collections get only the ETag - deleted rows
+    or rows leaving the page don't change the latest timestamp.
+    """
+    versions = []
+    for item in obj if schema.many else [obj]:
+        _collect_versions(schema, item, versions)
+    etag = md5(repr((request.full_path, versions, extra)).encode()).hexdigest()
+    last_modified = None if schema.many else max((version[2] for version in versions), default=None)
+    g.etag, g.last_modified = etag, last_modified
+
+    if request.if_none_match:
+        is_fresh = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified is not None:
+        is_fresh = last_modified.replace(microsecond=0) <= request.if_modified_since
+    else:
+        is_fresh = False
+
+    if not is_fresh:
+        return None
+    response = Response(status=304)
+    return set_conditional_headers(response)
+
+def set_conditional_headers(response: Response) -> Response:
+    if 'etag' in g and response.status_code in [200, 304]:
+        response.set_etag(g.etag, weak=True)
+        if g.last_modified is not None:
+            response.last_modified = g.last_modified
+    return response
 
 
 def generate_hashed_password(password: str) -> str:
-    return generate_password_hash(password)
+    return password_hasher.hash(password)
 
 
 def allowed_picture(filename: str) -> bool:
     return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in current_app.config.get('ALLOWED_EXTENSIONS')    
+           filename.rsplit('.', 1)[1].lower() in current_app.config.get('ALLOWED_EXTENSIONS')
+
+def get_unique_violation(exc: IntegrityError) -> Optional[str]:
+    """
+    Functionality of reading the column (or unique index) named in the unique
+    violation message of SQLite, MySQL or PostgreSQL
+    """
+    match = UNIQUE_VIOLATION_RE.search(str(exc.orig))
+    if match is None:
+        return None
+    return next(group for group in match.groups() if group)
+
+def commit_or_conflict(messages: Dict[str, str]):
+    """
+    Functionality of committing the session relying on unique constraints
+    instead of looking for duplicates before the write (one round trip, no
+    race between check and insert). Violation of a unique column from
+    messages aborts with 409 and the column's message, other integrity
+    errors are raised.
+    """
+    try:
+        db.session.commit()
+    except IntegrityError as exc:
+        db.session.rollback()
+        violation = get_unique_violation(exc)
+        if violation is not None:
+            for column_name, message in messages.items():
+                if violation == column_name or violation.endswith(f'_{column_name}'):
+                    abort(409, description=message)
+        raise
@@ -1,5 +1,6 @@
 import pytest
 import os
+from sqlalchemy import event
 from myrent_app import create_app, db
 from myrent_app.commands.db_manage_commnands import add_data
 
@@ -21,6 +22,65 @@ def client(app):
         yield client
 
 
+@pytest.fixture
+def sql_statements(app):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@pytest.fixture
+def count_queries(client, sql_statements):
+    """
+    Number of SQL statements executed by GET request of the test client and
+    the response - the request is sent twice and the second one is counted, so
+    token and record count caches filled by the first one do not skew counts
+    (responses are not cached)
+    """
+    app = client.application
+    app.config['RESPONSE_CACHE_ENABLED'] = False
+
+    def count(url, headers=None):
+        client.get(url, headers=headers)
+        sql_statements.clear()
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        return len(sql_statements), response
+
+    return count
+
+
+@pytest.fixture
+def assert_no_n_plus_one(app, count_queries):
+    """
+    Fails when the number of SQL statements of a list endpoint grows with the
+    number of returned rows - seed(numbers) adds a row for every number of the
+    range, url is requested after seeding 5 and 50 rows
+    """
+    def check(url, seed, headers=None, sizes=(5, 50)):
+        counts = []
+        seeded = 0
+        for size in sizes:
+            with app.app_context():
+                seed(range(seeded, size))
+                db.session.commit()
+            seeded = size
+            statements, response = count_queries(url, headers)
+            assert len(response.get_json()['data']) == size
+            counts.append(statements)
+        assert counts[0] == counts[-1], \
+            f'{url}: {counts[0]} SQL statements for {sizes[0]} rows, {counts[-1]} for {sizes[-1]} rows (N+1 queries)'
+
+    return check
+
+
 @pytest.fixture
 def landlord(client):
     landlord = {
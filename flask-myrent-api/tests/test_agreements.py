@@ -400,3 +400,20 @@ def test_delete_agreement(client, agreement, landlord_token):
     assert response.status_code == 200
     assert response_data['success'] is True
     assert response_data['data'] == 'Agreement with id 1 has been deleted'
+
+
+def test_get_agreement_settlements_filtered(client, landlord_token, agreement):
+    headers = {'Authorization': f'Bearer {landlord_token}'}
+    for settlement_type, value, date in [('charge', 3000, '10-01-2020'), ('payment', 3000, '05-01-2020'),
+                                         ('charge', 3000, '10-02-2020')]:
+        client.post('/api/v1/agreements/1/settlements', headers=headers,
+                    json={'type': settlement_type, 'value': value, 'date': date})
+
+    response = client.get('/api/v1/agreements/1/settlements?type=charge&sort=-date&fields=date,type',
+                          headers=headers)
+    response_data = response.get_json()
+
+    assert response.status_code == 200
+    assert response_data['data'] == [{'date': '10-02-2020', 'type': 'charge'},
+                                     {'date': '10-01-2020', 'type': 'charge'}]
+    assert response_data['pagination']['total_records'] == 2
@@ -0,0 +1,55 @@
+from myrent_app.commands.db_manage_commnands import explain, remove_data
+from myrent_app.commands.explain import explain_shapes, get_query_shapes
+from myrent_app.commands.purge import get_purge_order
+from myrent_app.models import Landlord, Flat, Tenant, Agreement
+
+
+def test_purge_order(app):
+    with app.app_context():
+        order = [table.name for table in get_purge_order(['landlords', 'flats', 'tenants', 'agreements', 'settlements'])]
+
+    assert order[:2] == ['settlements', 'agreements']
+    assert set(order[2:4]) == {'flats', 'tenants'}
+    assert order[4] == 'landlords'
+
+
+def test_remove_data_dry_run(app, agreement):
+    runner = app.test_cli_runner()
+    result = runner.invoke(remove_data, ['--dry-run'])
+
+    assert 'agreements: 1 rows' in result.output
+    assert 'landlords: 1 rows' in result.output
+    assert 'Dry run, data would be removed with delete' in result.output
+    with app.app_context():
+        assert Agreement.query.count() == 1
+
+
+def test_remove_data(app, agreement):
+    runner = app.test_cli_runner()
+    result = runner.invoke(remove_data, ['--batch-size', '1'])
+
+    assert 'All data has been deleted (delete)' in result.output
+    with app.app_context():
+        for model in [Landlord, Flat, Tenant, Agreement]:
+            assert model.query.count() == 0
+
+
+def test_explain_query_shapes_use_indexes(app):
+    assert {'landlord_id=1', 'status=x', 'sort=status'} <= set(get_query_shapes(Flat))
+    assert 'description=x' not in get_query_shapes(Flat)
+
+    with app.app_context():
+        report = explain_shapes(Agreement, ['flat_id=1', 'tenant_id=1', 'date_from[gte]=01-01-2020&sort=date_from',
+                                            'price_value[gte]=1'])
+
+    assert [full_scan for _, _, full_scan in report] == [False, False, False, True]
+    assert 'ix_agreements_flat_id' in report[0][1][0]
+
+
+def test_explain_command(app):
+    runner = app.test_cli_runner()
+    result = runner.invoke(explain, ['--model', 'flats', '--query', 'status=active', '--query', 'address=x'])
+
+    assert '      ok  /flats?status=active' in result.output
+    assert 'FULL SCAN  /flats?address=x' in result.output
+    assert '1 of 2 query shapes scan the whole table or sort without index' in result.output
@@ -1,5 +1,7 @@
 ﻿import pytest
 
+from myrent_app.models import Flat, FlatSchema
+
 
 def test_get_all_flats_no_records(client):
     response = client.get('/api/v1/flats')
@@ -65,6 +67,82 @@ def test_get_all_flats_with_params(client, sample_data):
         ]
 
 
+def test_get_all_flats_count(client, flat, flat_2_data, landlord_token):
+    response = client.get('/api/v1/flats')
+    response_data = response.get_json()
+
+    assert response_data['pagination']['total_records'] == 1
+
+    client.post('/api/v1/flats',
+                json=flat_2_data,
+                headers={
+                    'Authorization': f'Bearer {landlord_token}'
+                })
+    response = client.get('/api/v1/flats')
+    response_data = response.get_json()
+
+    assert response_data['pagination']['total_records'] == 2
+
+    response = client.get('/api/v1/flats?count=none&limit=1')
+    response_data = response.get_json()
+
+    assert response.status_code == 200
+    assert response_data['number_of_records'] == 1
+    assert response_data['pagination'] == {
+        'current_page': '/api/v1/flats?page=1&count=none&limit=1',
+        'next_page': '/api/v1/flats?page=2&count=none&limit=1'
+    }
+
+
+def test_get_all_flats_fields_load_only(client, flat, sql_statements):
+    sql_statements.clear()
+    response = client.get('/api/v1/flats?fields=id,identifier&count=none')
+    response_data = response.get_json()
+
+    assert response_data['data'] == [{'id': 1, 'identifier': 'testidentifier'}]
+    assert len(sql_statements) == 1
+    assert 'flats.landlord_id' in sql_statements[0]
+    assert 'flats.description' not in sql_statements[0]
+
+
+def test_get_all_flats_cursor_fields_load_sort_keys(client, flat, flat_2_data, landlord_token, count_queries):
+    client.post('/api/v1/flats', json=flat_2_data, headers={'Authorization': f'Bearer {landlord_token}'})
+    client.post('/api/v1/flats', json={**flat_2_data, 'identifier': 'testidentifier3'},
+                headers={'Authorization': f'Bearer {landlord_token}'})
+
+    statements, response = count_queries('/api/v1/flats?cursor=&fields=id&sort=address&limit=2')
+
+    assert statements == 1
+    assert response.get_json()['data'] == [{'id': 1}, {'id': 2}]
+    assert 'next_cursor' in response.get_json()['pagination']
+
+
+def test_get_all_flats_filter_values(client, flat, flat_2_data, landlord_token):
+    client.post('/api/v1/flats',
+                json=flat_2_data,
+                headers={
+                    'Authorization': f'Bearer {landlord_token}'
+                })
+
+    for identifier, id in [('testidentifier', 1), ('testidentifier2', 2), ('testidentifier', 1)]:
+        response = client.get(f'/api/v1/flats?identifier={identifier}&fields=id')
+        response_data = response.get_json()
+
+        assert response_data['data'] == [{'id': id}]
+        assert response_data['pagination']['total_records'] == 1
+
+
+def test_get_all_flats_fast_serialization(app, client, flat):
+    response = client.get('/api/v1/flats')
+    response_data = response.get_json()
+
+    with app.app_context():
+        expected_data = FlatSchema(many=True).dump(Flat.query.all())
+
+    assert response.status_code == 200
+    assert response_data['data'] == expected_data
+
+
 def test_get_one_flat(client, sample_data):
     response = client.get('/api/v1/flats/1')
     response_data = response.get_json()
@@ -91,6 +169,79 @@ def test_get_all_landlord_flats(client, sample_data):
     assert len(response_data['data']) == 2
 
 
+def test_get_all_flats_conditional_after_delete(client, flat, flat_2_data, landlord_token):
+    headers = {'Authorization': f'Bearer {landlord_token}'}
+    client.post('/api/v1/flats', json=flat_2_data, headers=headers)
+    response = client.get('/api/v1/flats')
+    etag = response.headers['ETag']
+
+    assert 'Last-Modified' not in response.headers
+
+    client.delete('/api/v1/flats/2', headers=headers)
+    response = client.get('/api/v1/flats', headers={'If-None-Match': etag,
+                                                    'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+
+    assert response.status_code == 200
+    assert response.get_json()['number_of_records'] == 1
+
+    response = client.get('/api/v1/flats', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+
+    assert response.status_code == 200
+
+
+def test_get_one_flat_conditional(client, flat, flat_2_data, landlord_token):
+    response = client.get('/api/v1/flats/1')
+    etag = response.headers['ETag']
+    last_modified = response.headers['Last-Modified']
+
+    assert response.status_code == 200
+    assert etag.startswith('W/')
+
+    response = client.get('/api/v1/flats/1', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    response = client.get('/api/v1/flats/1', headers={'If-Modified-Since': last_modified})
+
+    assert response.status_code == 304
+
+    client.put('/api/v1/flats/1',
+               json={**flat_2_data, 'identifier': 'changedidentifier'},
+               headers={
+                   'Authorization': f'Bearer {landlord_token}'
+               })
+    response = client.get('/api/v1/flats/1', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['data']['identifier'] == 'changedidentifier'
+
+
+def test_get_all_flats_conditional(client, flat, flat_2_data, landlord_token):
+    response = client.get('/api/v1/flats')
+    etag = response.headers['ETag']
+
+    response = client.get('/api/v1/flats', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+
+    response = client.get('/api/v1/flats?fields=id', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+
+    client.post('/api/v1/flats',
+                json=flat_2_data,
+                headers={
+                    'Authorization': f'Bearer {landlord_token}'
+                })
+    response = client.get('/api/v1/flats', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.get_json()['number_of_records'] == 2
+
+
 def test_create_flat(client, landlord, flat_data, landlord_token):
     response = client.post('/api/v1/flats', 
                         json=flat_data,
@@ -308,3 +459,64 @@ def test_delete_flat_missing_token(client, landlord_token, flat_data):
     assert response_data['success'] is False
     alert = 'Missing landlord token. Please login or register as landlord.'
     assert alert in response_data['message']
+
+
+def test_get_all_landlord_flats_paginated(client, landlord_token, flat_data):
+    for number in range(1, 5):
+        client.post('/api/v1/flats', headers={'Authorization': f'Bearer {landlord_token}'},
+                    json={**flat_data, 'identifier': f'flat{number}'})
+
+    response = client.get('/api/v1/landlords/1/flats?limit=3&sort=-identifier&fields=identifier')
+    response_data = response.get_json()
+
+    assert response.status_code == 200
+    assert [item['identifier'] for item in response_data['data']] == ['flat4', 'flat3', 'flat2']
+    assert response_data['pagination']['total_records'] == 4
+    assert response_data['pagination']['next_page'].startswith('/api/v1/landlords/1/flats?page=2')
+
+    response = client.get('/api/v1/landlords/1/flats?cursor=&limit=3&sort=-identifier')
+    first_page = response.get_json()
+    second_page = client.get(first_page['pagination']['next_cursor']).get_json()
+
+    assert [item['identifier'] for item in first_page['data'] + second_page['data']] == \
+        ['flat4', 'flat3', 'flat2', 'flat1']
+    assert 'next_cursor' not in second_page['pagination']
+
+
+@pytest.mark.parametrize('limit', [0, -1])
+def test_get_all_landlord_flats_cursor_invalid_limit(client, flat, limit):
+    response = client.get(f'/api/v1/landlords/1/flats?cursor=&limit={limit}')
+    response_data = response.get_json()
+
+    assert response.status_code == 400
+    assert response_data['success'] is False
+    assert response_data['message'] == 'Limit must be a positive integer'
+
+
+def test_get_all_flats_response_cache(client, flat, flat_2_data, landlord_token, sql_statements):
+    response = client.get('/api/v1/flats?sort=-id&limit=1')
+    assert response.headers['X-Cache'] == 'MISS'
+    sql_statements.clear()
+
+    response = client.get('/api/v1/flats?limit=1&sort=-id')
+    assert response.headers['X-Cache'] == 'HIT'
+    assert response.get_json()['data'][0]['identifier'] == 'testidentifier'
+    assert sql_statements == []
+
+    client.post('/api/v1/flats', json=flat_2_data, headers={'Authorization': f'Bearer {landlord_token}'})
+
+    response = client.get('/api/v1/flats?sort=-id&limit=1')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['data'][0]['identifier'] == flat_2_data['identifier']
+
+
+def test_get_one_flat_response_cache(client, flat, landlord_token):
+    etag = client.get('/api/v1/flats/1').headers['ETag']
+
+    response = client.get('/api/v1/flats/1', headers={'If-None-Match': etag})
+    assert response.headers['X-Cache'] == 'HIT'
+    assert response.status_code == 304
+
+    client.delete('/api/v1/flats/1', headers={'Authorization': f'Bearer {landlord_token}'})
+    assert client.get('/api/v1/flats/1').status_code == 404
+
@@ -1,4 +1,8 @@
 import pytest
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+from myrent_app.models import Landlord, LandlordSchema
 
 
 def test_get_landlords_no_records(client):
@@ -35,6 +39,36 @@ def test_get_landlords(client, sample_data):
         }
 
 
+def test_get_landlords_statements_count(client, flat, flat_2_data, landlord_token, 
+                                        sql_statements):
+    client.post('/api/v1/flats',
+                json=flat_2_data,
+                headers={
+                    'Authorization': f'Bearer {landlord_token}'
+                })
+    sql_statements.clear()
+    response = client.get('/api/v1/landlords?count=exact')
+    response_data = response.get_json()
+
+    assert len(response_data['data'][0]['flats']) == 2
+    assert len(sql_statements) == 3
+
+
+@pytest.mark.parametrize('provider', ['json', 'orjson'])
+def test_get_landlords_fast_serialization(app, client, flat, provider):
+    app.config['JSON_PROVIDER'] = provider
+    response = client.get('/api/v1/landlords')
+    response_data = response.get_json()
+
+    with app.app_context():
+        expected_data = LandlordSchema(many=True).dump(Landlord.query.all())
+
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'application/json'
+    assert response_data['data'] == expected_data
+    assert response_data['data'][0]['flats'][0]['identifier'] == flat['identifier']
+
+
 def test_get_one_landlord(client, sample_data):
     response = client.get('/api/v1/landlords/1')
     response_data = response.get_json()
@@ -326,3 +360,73 @@ def test_update_landlord_data(client, landlord_token):
     assert response_data['data']['last_name'] == updated_landlord['last_name']
     assert response_data['data']['phone'] == updated_landlord['phone']
     assert response_data['data']['description'] == updated_landlord['description']
+
+
+def test_login_landlord_rehash_password(app, client, landlord):
+    app.config['PASSWORD_HASH_ALGORITHM'] = 'scrypt'
+    app.config['PASSWORD_HASH_WORK_FACTOR'] = 1024
+    credentials = {'identifier': landlord['identifier'], 'password': landlord['password']}
+    response = client.post('/api/v1/landlords/login', json=credentials)
+
+    assert response.status_code == 200
+    with app.app_context():
+        assert Landlord.query.first().password.startswith('scrypt:1024:8:1$')
+
+    response = client.post('/api/v1/landlords/login', json={**credentials, 'password': 'invalid'})
+    assert response.status_code == 401
+    response = client.post('/api/v1/landlords/login', json=credentials)
+    assert response.status_code == 200
+
+
+def test_register_landlord_concurrent_requests(app):
+    clients = 8
+    barrier = Barrier(clients)
+
+    def register(number: int):
+        client = app.test_client()
+        barrier.wait()
+        response = client.post('/api/v1/landlords/register',
+                               json={
+                                   'address': 'address',
+                                   'email': 'racer@wp.pl',
+                                   'first_name': 'first_name',
+                                   'identifier': f'racer{number}',
+                                   'last_name': 'last_name',
+                                   'phone': 'phone',
+                                   'password': 'password'
+                               })
+        return response.status_code, response.get_json()
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(register, range(clients)))
+
+    assert sorted(status_code for status_code, _ in results) == [201] + [409] * (clients - 1)
+    assert {data['message'] for status_code, data in results if status_code == 409} == \
+        {'Landlord with email racer@wp.pl already exists'}
+    with app.app_context():
+        assert Landlord.query.filter(Landlord.email == 'racer@wp.pl').count() == 1
+
+
+def test_get_landlords_response_cache(client, landlord):
+    client.get('/api/v1/landlords')
+    assert client.get('/api/v1/landlords').headers['X-Cache'] == 'HIT'
+
+    client.post('/api/v1/landlords/register', json={**landlord, 'identifier': 'newlandlord',
+                                                    'email': 'newlandlord@wp.pl'})
+
+    response = client.get('/api/v1/landlords')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['number_of_records'] == 2
+
+
+
+def test_get_landlords_response_cache_invalidated_by_flats(client, landlord_token, flat_data):
+    client.get('/api/v1/landlords')
+    assert client.get('/api/v1/landlords').headers['X-Cache'] == 'HIT'
+
+    response = client.post('/api/v1/flats', json=flat_data, headers={'Authorization': f'Bearer {landlord_token}'})
+    assert response.status_code == 201
+
+    response = client.get('/api/v1/landlords')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert [flat['identifier'] for flat in response.get_json()['data'][0]['flats']] == [flat_data['identifier']]
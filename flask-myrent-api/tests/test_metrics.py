@@ -0,0 +1,209 @@
+import re
+import pytest
+from sqlalchemy.pool import QueuePool
+
+from config import DevelopmentConfig, TestingConfig
+from myrent_app import create_app, db
+
+
+@pytest.fixture
+def pooled_app(monkeypatch):
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_ENGINE_OPTIONS', {
+        'poolclass': QueuePool,
+        'pool_size': 1,
+        'max_overflow': 0,
+        'pool_timeout': 0.1
+    })
+    app = create_app('testing')
+    app.config['METRICS_TOKEN'] = 'metrics-secret'
+    with app.app_context():
+        db.create_all()
+
+    yield app
+
+    with app.app_context():
+        db.engine.dispose()
+    app.config['DB_FILE_PATH'].unlink()
+
+
+@pytest.fixture
+def profiled_app(monkeypatch):
+    monkeypatch.setattr(TestingConfig, 'PROFILING_ENABLED', True)
+    app = create_app('testing')
+    app.config['METRICS_TOKEN'] = 'metrics-secret'
+    with app.app_context():
+        db.create_all()
+
+    yield app
+
+    app.config['DB_FILE_PATH'].unlink()
+
+
+def test_get_metrics_landlord_token(client, landlord_token, tenant_token):
+    response = client.get('/api/v1/metrics', headers={'Authorization': f'Bearer {tenant_token}'})
+    assert response.status_code == 401
+
+    response = client.get('/api/v1/metrics', headers={'Authorization': f'Bearer {landlord_token}'})
+    data = response.get_json()['data']['pool']
+    assert response.status_code == 200
+    assert data['checkouts'] >= 1
+    assert data['checked_out'] == 0
+
+
+def test_pool_options_skipped_for_sqlite(monkeypatch, tmp_path):
+    monkeypatch.setattr(DevelopmentConfig, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{tmp_path / "dev.db"}')
+    app = create_app('development')
+
+    with app.app_context():
+        assert type(db.engine.pool).__name__ == 'NullPool'
+        assert db.session.execute('SELECT 1').scalar() == 1
+    assert app.extensions['pool_metrics']['connects'] == 1
+
+
+def test_get_metrics_pool(pooled_app):
+    client = pooled_app.test_client()
+    client.get('/api/v1/flats')
+
+    response = client.get('/api/v1/metrics', headers={'Authorization': 'Bearer metrics-secret'})
+    pool = response.get_json()['data']['pool']
+
+    assert pool['pool']['class'] == 'QueuePool'
+    assert pool['pool']['size'] == 1
+    assert pool['checkouts'] == pool['checkins'] >= 1
+    assert pool['connects'] == 1
+
+
+def test_pool_timeout(pooled_app):
+    client = pooled_app.test_client()
+    with pooled_app.app_context():
+        connection = db.engine.connect()
+        response = client.get('/api/v1/flats')
+        connection.close()
+
+    assert response.status_code == 503
+
+    response = client.get('/api/v1/metrics', headers={'Authorization': 'Bearer metrics-secret'})
+    assert response.get_json()['data']['pool']['timeouts'] == 1
+
+
+def test_server_timing_disabled_by_default(client):
+    response = client.get('/api/v1/flats')
+
+    assert response.status_code == 200
+    assert 'Server-Timing' not in response.headers
+
+
+def test_server_timing(profiled_app):
+    client = profiled_app.test_client()
+    response = client.get('/api/v1/flats')
+    server_timing = response.headers['Server-Timing']
+
+    assert response.status_code == 200
+    assert re.fullmatch(r'app;dur=[\d.]+, sql;dur=[\d.]+;desc="[1-9]\d* queries", dump;dur=[\d.]+', server_timing)
+
+
+def test_server_timing_replica_engine_created_lazily(monkeypatch, tmp_path):
+    monkeypatch.setattr(TestingConfig, 'PROFILING_ENABLED', True)
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_REPLICA_URIS', [f'sqlite:///{tmp_path / "replica.db"}'])
+    app = create_app('testing')
+    assert app.extensions['replicas']['engines'] == {}
+    with app.app_context():
+        db.create_all()
+        db.Model.metadata.create_all(bind=db.get_engine(app, bind='replica_0'))
+
+    response = app.test_client().get('/api/v1/flats')
+
+    assert re.search(r'sql;dur=[\d.]+;desc="[1-9]\d* queries"', response.headers['Server-Timing'])
+    app.config['DB_FILE_PATH'].unlink()
+
+
+def test_get_request_metrics(profiled_app):
+    client = profiled_app.test_client()
+    headers = {'Authorization': 'Bearer metrics-secret'}
+    for _ in range(3):
+        client.get('/api/v1/flats')
+    client.get('/api/v1/landlords')
+
+    response = client.get('/api/v1/metrics/requests', headers=headers)
+    data = response.get_json()['data']
+    flats = data['endpoints']['flats.get_all_flats']
+
+    assert response.status_code == 200
+    assert data['enabled'] is True
+    assert flats['requests'] == flats['window'] == 3
+    assert flats['sql_count']['max'] >= 1
+    assert flats['size']['mean'] > 0
+    assert flats['duration']['p50'] <= flats['duration']['p99'] <= flats['duration']['max']
+    assert sum(flats['histogram'].values()) == 3
+    assert data['endpoints']['landlords.get_all_landlords']['requests'] == 1
+
+
+def test_get_request_metrics_window(profiled_app):
+    profiled_app.config['PROFILING_WINDOW'] = 2
+    client = profiled_app.test_client()
+    for _ in range(5):
+        client.get('/api/v1/flats')
+
+    response = client.get('/api/v1/metrics/requests', headers={'Authorization': 'Bearer metrics-secret'})
+    flats = response.get_json()['data']['endpoints']['flats.get_all_flats']
+
+    assert flats['requests'] == 5
+    assert flats['window'] == 2
+
+
+def test_get_request_metrics_missing_token(profiled_app):
+    response = profiled_app.test_client().get('/api/v1/metrics/requests')
+
+    assert response.status_code == 401
+
+
+def test_get_metrics_response_cache(client, landlord_token):
+    for _ in range(3):
+        client.get('/api/v1/flats')
+    client.get('/api/v1/landlords')
+
+    response = client.get('/api/v1/metrics', headers={'Authorization': f'Bearer {landlord_token}'})
+    data = response.get_json()['data']['response_cache']
+
+    assert data['backend'] == 'memory'
+    assert data['hits'] == 2
+    assert data['misses'] == 2
+    assert data['hit_ratio'] == 0.5
+    assert data['size'] == 2
+    assert data['endpoints']['flats.get_all_flats'] == {'hits': 2, 'misses': 1, 'hit_ratio': 0.667}
+
+
+def test_response_cache_sqlite_backend(monkeypatch, tmp_path, flat_data):
+    monkeypatch.setattr(TestingConfig, 'RESPONSE_CACHE_BACKEND', 'sqlite')
+    monkeypatch.setattr(TestingConfig, 'RESPONSE_CACHE_DATABASE', str(tmp_path / 'response_cache.db'))
+    worker_1, worker_2 = create_app('testing'), create_app('testing')
+    with worker_1.app_context():
+        db.create_all()
+
+    assert worker_1.test_client().get('/api/v1/flats').headers['X-Cache'] == 'MISS'
+    response = worker_2.test_client().get('/api/v1/flats')
+    assert response.headers['X-Cache'] == 'HIT'
+    assert response.get_json()['data'] == []
+
+    client = worker_2.test_client()
+    client.post('/api/v1/landlords/register', json={
+        'identifier': 'landlord', 'email': 'landlord@wp.pl', 'first_name': 'first_name', 'last_name': 'last_name',
+        'phone': 'phone', 'address': 'address', 'password': 'password'
+    })
+    token = client.post('/api/v1/landlords/login',
+                        json={'identifier': 'landlord', 'password': 'password'}).get_json()['token']
+    client.post('/api/v1/flats', json=flat_data, headers={'Authorization': f'Bearer {token}'})
+
+    response = worker_1.test_client().get('/api/v1/flats')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['number_of_records'] == 1
+
+    worker_1.config['DB_FILE_PATH'].unlink()
+
+
+def test_response_cache_unsupported_backend(monkeypatch):
+    monkeypatch.setattr(TestingConfig, 'RESPONSE_CACHE_BACKEND', 'redis')
+
+    with pytest.raises(ValueError):
+        create_app('testing')
+
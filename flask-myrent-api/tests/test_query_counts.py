@@ -0,0 +1,104 @@
+from datetime import date
+
+from myrent_app import db
+from myrent_app.models import Landlord, Flat, Picture, Tenant, Agreement, Settlement
+
+
+def add_landlord(number: int) -> Landlord:
+    landlord = Landlord(identifier=f'landlord{number}', email=f'landlord{number}@example.com',
+                        first_name='First', last_name=f'Last{number}', phone='123456789',
+                        address='address', password='password')
+    db.session.add(landlord)
+    db.session.flush()
+    return landlord
+
+
+def add_flat(number: int, landlord_id: int) -> Flat:
+    flat = Flat(identifier=f'flat{number}', address='address', landlord_id=landlord_id)
+    db.session.add(flat)
+    return flat
+
+
+def add_tenant(number: int, landlord_id: int) -> Tenant:
+    tenant = Tenant(identifier=f'tenant{number}', email=f'tenant{number}@example.com', first_name='First',
+                    last_name=f'Last{number}', phone='123456789', address='address', password='password',
+                    landlord_id=landlord_id)
+    db.session.add(tenant)
+    return tenant
+
+
+def add_agreement(number: int, landlord_id: int) -> Agreement:
+    agreement = Agreement(identifier=f'agreement{number}', sign_date=date(2020, 1, 1), date_from=date(2020, 1, 1),
+                          date_to=date(2020, 12, 31), price_value=1000, price_period='month', payment_deadline=10,
+                          flat=add_flat(number, landlord_id), tenant=add_tenant(number, landlord_id))
+    db.session.add(agreement)
+    return agreement
+
+
+def add_settlement(number: int, agreement: Agreement) -> Settlement:
+    settlement = Settlement(type='payment', value=number, date=date(2020, 1, 1), agreement=agreement)
+    db.session.add(settlement)
+    return settlement
+
+
+def test_get_all_flats_query_count(assert_no_n_plus_one):
+    def seed(numbers):
+        for number in numbers:
+            add_flat(number, add_landlord(number).id)
+
+    assert_no_n_plus_one('/api/v1/flats?limit=100', seed)
+
+
+def test_get_all_landlord_flats_query_count(landlord_token, assert_no_n_plus_one):
+    def seed(numbers):
+        for number in numbers:
+            add_flat(number, 1)
+
+    assert_no_n_plus_one('/api/v1/landlords/1/flats?limit=100', seed)
+
+
+def test_get_landlord_tenants_query_count(landlord_token, assert_no_n_plus_one):
+    def seed(numbers):
+        for number in numbers:
+            add_tenant(number, 1)
+
+    assert_no_n_plus_one('/api/v1/tenants?limit=100', seed,
+                         headers={'Authorization': f'Bearer {landlord_token}'})
+
+
+def test_get_agreements_query_count(landlord_token, assert_no_n_plus_one):
+    def seed(numbers):
+        for number in numbers:
+            add_agreement(number, 1)
+
+    assert_no_n_plus_one('/api/v1/agreements', seed, headers={'Authorization': f'Bearer {landlord_token}'})
+
+
+def test_get_all_settlements_query_count(landlord_token, assert_no_n_plus_one):
+    def seed(numbers):
+        for number in numbers:
+            add_settlement(number, add_agreement(number, 1))
+
+    assert_no_n_plus_one('/api/v1/settlements', seed, headers={'Authorization': f'Bearer {landlord_token}'})
+
+
+def test_get_agreement_settlements_query_count(app, landlord_token, assert_no_n_plus_one):
+    with app.app_context():
+        add_agreement(0, 1)
+        db.session.commit()
+
+    def seed(numbers):
+        agreement = Agreement.query.get(1)
+        for number in numbers:
+            add_settlement(number, agreement)
+
+    assert_no_n_plus_one('/api/v1/agreements/1/settlements?limit=100', seed,
+                         headers={'Authorization': f'Bearer {landlord_token}'})
+
+
+def test_get_pictures_query_count(landlord_token, assert_no_n_plus_one):
+    def seed(numbers):
+        for number in numbers:
+            db.session.add(Picture(name=f'picture{number}.jpg', path='path', flat=add_flat(number, 1)))
+
+    assert_no_n_plus_one('/api/v1/pictures', seed)
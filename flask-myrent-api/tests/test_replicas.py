@@ -0,0 +1,70 @@
+import pytest
+
+from config import TestingConfig
+from myrent_app import create_app, db
+
+
+@pytest.fixture
+def replica_app(monkeypatch, tmp_path):
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_REPLICA_URIS', [f'sqlite:///{tmp_path / "replica.db"}'])
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.Model.metadata.create_all(bind=db.get_engine(app, bind='replica_0'))
+
+    yield app
+
+    app.config['DB_FILE_PATH'].unlink()
+
+
+def test_reads_from_replica(replica_app, flat_data):
+    client = replica_app.test_client()
+    landlord = {
+        'address': 'testaddress',
+        'description': 'testdescription',
+        'email': 'testmail@wp.pl',
+        'first_name': 'testfirst_name',
+        'identifier': 'testidentifier',
+        'last_name': 'testlast_name',
+        'phone': 'testphone',
+        'password': 'testpassword'
+    }
+    client.post('/api/v1/landlords/register', json=landlord)
+    response = client.post('/api/v1/landlords/login', json={
+        'identifier': landlord['identifier'],
+        'password': landlord['password']
+    })
+    token = response.get_json()['token']
+
+    response = client.post('/api/v1/flats', json=flat_data, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 201
+    assert 'read_primary_until' in response.headers['Set-Cookie']
+
+    response = client.get('/api/v1/flats?count=exact')
+    assert response.get_json()['number_of_records'] == 1
+
+    response = replica_app.test_client().get('/api/v1/flats?count=exact')
+    assert response.get_json()['number_of_records'] == 0
+
+
+def test_reads_from_primary_after_write_of_token_user(replica_app, flat_data):
+    client = replica_app.test_client()
+    client.post('/api/v1/landlords/register', json={
+        'address': 'testaddress',
+        'email': 'testmail@wp.pl',
+        'first_name': 'testfirst_name',
+        'identifier': 'testidentifier',
+        'last_name': 'testlast_name',
+        'phone': 'testphone',
+        'password': 'testpassword'
+    })
+    response = client.post('/api/v1/landlords/login', json={'identifier': 'testidentifier', 'password': 'testpassword'})
+    headers = {'Authorization': f'Bearer {response.get_json()["token"]}'}
+    client.post('/api/v1/flats', json=flat_data, headers=headers)
+
+    client_without_cookies = replica_app.test_client(use_cookies=False)
+    response = client_without_cookies.get('/api/v1/flats?count=exact', headers=headers)
+    assert response.get_json()['number_of_records'] == 1
+
+    response = client_without_cookies.get('/api/v1/flats?count=exact')
+    assert response.get_json()['number_of_records'] == 0
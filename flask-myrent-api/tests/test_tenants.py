@@ -1,5 +1,8 @@
 import pytest
 
+from myrent_app import token_cache
+from myrent_app.models import Tenant
+
 
 def test_get_landlord_tenants_no_records_no_token(client):
     response = client.get('/api/v1/tenants')
@@ -39,7 +42,12 @@ def test_get_landlord_tenants_no_records_landlord_registered(client, landlord_to
     expected_result = {
         'success': True,
         'data': [],
-        'number_of_records': 0
+        'number_of_records': 0,
+        'pagination': {
+            'total_pages': 0,
+            'total_records': 0,
+            'current_page': '/api/v1/tenants?page=1'
+        }
     }
 
     assert response.status_code == 200
@@ -104,6 +112,31 @@ def test_get_landlord_tenant(client, sample_data):
                                                 }
 
 
+def test_get_current_tenant_token_cache(app, client, tenant_token, landlord_token):
+    with app.app_context():
+        token_cache.invalidate()
+
+    for token in [tenant_token, tenant_token, landlord_token, tenant_token]:
+        client.get('/api/v1/tenants/me', headers={'Authorization': f'Bearer {token}'})
+
+    with app.app_context():
+        stats = token_cache.stats()
+        token_cache.invalidate(tenant_token)
+
+        assert stats['hits'] >= 2
+        assert stats['size'] == 2
+        assert token_cache.stats()['size'] == 1
+
+
+def test_get_current_tenant_invalid_token(client, tenant_token):
+    response = client.get('/api/v1/tenants/me', 
+                          headers={'Authorization': f'Bearer {tenant_token}x'})
+    response_data = response.get_json()
+
+    assert response.status_code == 401
+    assert response_data['message'] == 'Invalid token. Please login or register.'
+
+
 def test_create_tenant_without_token(client):
     tenant = {
         "address": "testaddress",
@@ -564,3 +597,23 @@ def test_delete_tenant_by_tenant(client, tenant, tenant_token):
     assert response.headers['Content-Type'] == 'application/json'
     assert response_data['success'] is False
     assert response_data['message'] == 'Only landlord functionality'
+
+
+def test_login_tenant_rehash_password(app, client, tenant):
+    app.config['PASSWORD_HASH_WORK_FACTOR'] = 2000
+    credentials = {'identifier': tenant['identifier'], 'password': tenant['password']}
+    response = client.post('/api/v1/tenants/login', json=credentials)
+
+    assert response.status_code == 200
+    with app.app_context():
+        assert Tenant.query.first().password.startswith('pbkdf2:sha256:2000$')
+
+
+def test_get_landlord_tenants_filtered(client, landlord_token, tenant, tenant2):
+    response = client.get('/api/v1/tenants?last_name=testlast_name2&fields=identifier',
+                          headers={'Authorization': f'Bearer {landlord_token}'})
+    response_data = response.get_json()
+
+    assert response.status_code == 200
+    assert response_data['data'] == [{'identifier': 'testtenant2'}]
+    assert response_data['pagination']['total_records'] == 1
@@ -0,0 +1,114 @@
+import pytest
+
+from myrent_app import token_denylist
+
+
+@pytest.fixture
+def landlord_refresh_token(client, landlord):
+    response = client.post('/api/v1/landlords/login', json={
+        'identifier': landlord['identifier'],
+        'password': landlord['password']
+    })
+    return response.get_json()['refresh_token']
+
+
+@pytest.fixture
+def tenant_refresh_token(client, tenant):
+    response = client.post('/api/v1/tenants/login', json={
+        'identifier': tenant['identifier'],
+        'password': tenant['password']
+    })
+    return response.get_json()['refresh_token']
+
+
+def test_refresh_landlord_token(client, landlord_refresh_token):
+    response = client.post('/api/v1/token/refresh', json={'refresh_token': landlord_refresh_token})
+    response_data = response.get_json()
+
+    assert response.status_code == 200
+    assert response_data['refresh_token'] != landlord_refresh_token
+    response = client.get('/api/v1/landlords/me', headers={'Authorization': f'Bearer {response_data["token"]}'})
+    assert response.status_code == 200
+
+    response = client.post('/api/v1/token/refresh', json={'refresh_token': landlord_refresh_token})
+    assert response.status_code == 401
+    assert response.get_json()['message'] == 'Revoked refresh token. Please login to get new token.'
+
+
+def test_refresh_tenant_token(client, tenant_refresh_token):
+    response = client.post('/api/v1/token/refresh', json={'refresh_token': tenant_refresh_token})
+    response_data = response.get_json()
+
+    assert response.status_code == 200
+    response = client.get('/api/v1/tenants/me', headers={'Authorization': f'Bearer {response_data["token"]}'})
+    assert response.status_code == 200
+
+
+def test_refresh_token_not_accepted_as_access_token(client, landlord_refresh_token):
+    response = client.get('/api/v1/landlords/me', headers={'Authorization': f'Bearer {landlord_refresh_token}'})
+
+    assert response.status_code == 401
+
+
+def test_access_token_not_accepted_as_refresh_token(client, landlord_token):
+    response = client.post('/api/v1/token/refresh', json={'refresh_token': landlord_token})
+
+    assert response.status_code == 401
+    assert response.get_json()['message'] == 'Invalid refresh token. Please login or register.'
+
+
+def test_landlord_password_update_revokes_refresh_tokens(client, landlord, landlord_token, landlord_refresh_token):
+    response = client.put('/api/v1/landlords/password', headers={'Authorization': f'Bearer {landlord_token}'},
+                          json={'current_password': landlord['password'], 'new_password': 'newlandlordpassword'})
+    assert response.status_code == 200
+
+    response = client.post('/api/v1/token/refresh', json={'refresh_token': landlord_refresh_token})
+    assert response.status_code == 401
+    assert response.get_json()['message'] == 'Revoked refresh token. Please login to get new token.'
+
+    response = client.post('/api/v1/landlords/login', json={
+        'identifier': landlord['identifier'],
+        'password': 'newlandlordpassword'
+    })
+    response = client.post('/api/v1/token/refresh', json={'refresh_token': response.get_json()['refresh_token']})
+    assert response.status_code == 200
+
+
+def test_tenant_password_update_revokes_refresh_tokens(client, tenant, landlord_token, tenant_refresh_token):
+    response = client.put('/api/v1/tenants/1/password', headers={'Authorization': f'Bearer {landlord_token}'},
+                          json={'current_password': tenant['password'], 'new_password': 'newtenantpassword'})
+    assert response.status_code == 200
+
+    response = client.post('/api/v1/token/refresh', json={'refresh_token': tenant_refresh_token})
+    assert response.status_code == 401
+    assert response.get_json()['message'] == 'Revoked refresh token. Please login to get new token.'
+
+
+def test_token_generation_not_selectable_with_fields(client, landlord_token):
+    response = client.get('/api/v1/landlords?fields=token_generation',
+                          headers={'Authorization': f'Bearer {landlord_token}'})
+
+    assert response.status_code == 200
+    assert response.get_json()['data'] == [{}]
+
+
+def test_revoke_refresh_token(app, client, tenant_refresh_token, tmp_path):
+    app.config['TOKEN_DENYLIST_DATABASE'] = str(tmp_path / 'denylist.db')
+    token_denylist.init_app(app)
+
+    response = client.post('/api/v1/token/revoke', json={'refresh_token': tenant_refresh_token})
+    assert response.status_code == 200
+
+    response = client.post('/api/v1/token/refresh', json={'refresh_token': tenant_refresh_token})
+    assert response.status_code == 401
+    with app.app_context():
+        assert len(token_denylist) == 1
+
+
+def test_token_denylist_memory_warning(app, caplog):
+    token_denylist.init_app(app)
+    assert 'TOKEN_DENYLIST_DATABASE' not in caplog.text
+
+    app.debug = app.testing = False
+    token_denylist.init_app(app)
+    assert 'TOKEN_DENYLIST_DATABASE' in caplog.text